@@ -0,0 +1,54 @@
+# coding=utf-8
+"""
+Body extraction benchmark on multi-megabyte HTML newsletters: the previous
+regex over the newline-stripped document versus `qreu.html.get_body_html`.
+
+    python -m benchmarks.bench_body_html --size 8
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import re
+import timeit
+
+from qreu.html import get_body_html
+
+
+def get_body_html_regex(html):
+    body = re.findall(
+        '<body[^>]*>(.*)</body>',
+        html.replace('\r\n', '').replace('\n', '')
+    )
+    return body and body[0].strip() or html.strip()
+
+
+def newsletter(megabytes):
+    row = (
+        '<tr>\n  <td class="item"><a href="https://example.com/p">Product'
+        '</a></td>\n  <td>Lorem ipsum dolor sit amet</td>\n</tr>\n'
+    )
+    rows = row * (megabytes * 1024 * 1024 // len(row))
+    return (
+        '<!DOCTYPE html>\n<html>\n<head><title>News</title></head>\n'
+        '<body style="margin:0">\n<table>\n' + rows + '</table>\n</body>\n'
+        '</html>\n'
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=8,
+                        help='Size of the HTML in MB (default 8)')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    html = newsletter(args.size)
+    for name, func in [('regex', get_body_html_regex),
+                       ('scan', get_body_html)]:
+        best = min(timeit.repeat(
+            lambda: func(html), number=1, repeat=args.repeat))
+        print('{0:<6} {1:>4} MB: {2:8.4f}s ({3:8.1f} MB/s)'.format(
+            name, args.size, best, args.size / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""
+Header encoding microbenchmark: microseconds per `Email.add_header` call
+with ASCII and non ASCII values and recipient lists, and per
+`Email.add_recipients` call with (name, address) pairs.
+
+    python -m benchmarks.bench_headers -n 1000
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import timeit
+
+from qreu import Email
+
+
+def recipients(number, name):
+    return ['{0} {1} <user{1}@example.com>'.format(name, idx)
+            for idx in range(number)]
+
+
+def pairs(number, name):
+    return [('{} {}'.format(name, idx), 'user{}@example.com'.format(idx))
+            for idx in range(number)]
+
+
+def cases(number):
+    ascii_rcpt = recipients(number, 'Destinatari')
+    accents_rcpt = recipients(number, 'Destinatària')
+    return [
+        ('Subject ASCII', 'Subject', 'Monthly invoice #1234'),
+        ('Subject non ASCII', 'Subject', 'Factura elèctrica del mes de març'),
+        ('Message-ID', 'Message-ID', '<1234.5678@example.com>'),
+        ('To 1 ASCII', 'to', ascii_rcpt[:1]),
+        ('To 1 non ASCII', 'to', accents_rcpt[:1]),
+        ('To {} ASCII'.format(number), 'to', ascii_rcpt),
+        ('To {} non ASCII'.format(number), 'to', accents_rcpt),
+        ('Bcc {} non ASCII'.format(number), 'bcc', accents_rcpt),
+    ]
+
+
+def bulk_cases(number):
+    return [
+        ('Bulk {} ASCII'.format(number), pairs(number, 'Destinatari'), None),
+        ('Bulk {} non ASCII'.format(number), pairs(number, 'Destinatària'),
+         None),
+        ('Bulk {} 50 visible'.format(number), pairs(number, 'Destinatària'),
+         50),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=1000,
+                        help='Recipients of the big lists (default 1000)')
+    parser.add_argument('-l', '--loops', type=int, default=20,
+                        help='Calls per repetition (default 20)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Repetitions, the best one is shown (default 3)')
+    args = parser.parse_args(argv)
+    for name, header, value in cases(args.number):
+        best = min(timeit.repeat(
+            lambda: Email().add_header(header, value),
+            number=args.loops, repeat=args.repeat))
+        print('{0:<26} {1:12.1f} us/call'.format(
+            name, best / args.loops * 1e6))
+    for name, recipients, max_visible in bulk_cases(args.number):
+        best = min(timeit.repeat(
+            lambda: Email().add_recipients('to', recipients, max_visible),
+            number=args.loops, repeat=args.repeat))
+        print('{0:<26} {1:12.1f} us/call'.format(
+            name, best / args.loops * 1e6))
+
+
+if __name__ == '__main__':
+    main()
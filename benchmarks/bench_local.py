@@ -0,0 +1,72 @@
+# coding=utf-8
+"""
+Context locals microbenchmark: nanoseconds per operation of `Local`,
+`LocalStack`, `ContextStack`, `LocalProxy` and `get_current_sender`.
+
+    python -m benchmarks.bench_local -n 1000000
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import timeit
+
+from qreu import local
+from qreu.sendcontext import Sender, get_current_sender
+
+
+class Target(object):
+    value = 42
+
+
+def cases():
+    loc = local.Local()
+    loc.value = Target()
+    stack = local.LocalStack()
+    stack.push(Target())
+    stack_proxy = stack()
+    name_proxy = loc('value')
+
+    def push_pop():
+        stack.push(1)
+        stack.pop()
+
+    result = [
+        ('Local getattr', lambda: loc.value),
+        ('Local setattr', lambda: setattr(loc, 'other', 1)),
+        ('LocalStack.top', lambda: stack.top),
+        ('LocalStack push+pop', push_pop),
+        ('LocalProxy (stack) attr', lambda: stack_proxy.value),
+        ('LocalProxy (name) attr', lambda: name_proxy.value),
+    ]
+    if local.ContextVar is not None:
+        context_stack = local.ContextStack('bench')
+        context_stack.push(Target())
+
+        def context_push_pop():
+            context_stack.push(1)
+            context_stack.pop()
+        result.extend([
+            ('ContextStack.top', lambda: context_stack.top),
+            ('ContextStack push+pop', context_push_pop),
+        ])
+    result.append(('get_current_sender', get_current_sender))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=1000000,
+                        help='Operations per case (default 1000000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Repetitions, the best one is shown (default 3)')
+    args = parser.parse_args(argv)
+    with Sender():
+        for name, func in cases():
+            best = min(timeit.repeat(
+                func, number=args.number, repeat=args.repeat))
+            print('{0:<26} {1:8.1f} ns/op'.format(
+                name, best / args.number * 1e9))
+
+
+if __name__ == '__main__':
+    main()
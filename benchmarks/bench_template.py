@@ -0,0 +1,80 @@
+# coding=utf-8
+"""
+Mail merge benchmark: messages/second building one `Email` per recipient
+from scratch versus stamping them out of an `EmailTemplate`.
+
+    python -m benchmarks.bench_template -n 100000
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import time
+from io import BytesIO
+
+from qreu import Email
+from qreu.template import EmailTemplate
+
+HTML = (
+    '<html><body><h1>Monthly newsletter</h1>'
+    + '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>' * 40
+    + '</body></html>'
+)
+ATTACHMENT = os.urandom(256 * 1024)
+FIELDS = {
+    'from': 'Newsletter <news@example.com>',
+    'subject': 'Newsletter: novetats del mes',
+    'body_html': HTML,
+}
+
+
+def recipients(number):
+    for idx in range(number):
+        yield 'Recipient {0} <recipient{0}@example.com>'.format(idx)
+
+
+def build_from_scratch(number, serialize=False):
+    for recipient in recipients(number):
+        kwargs = dict(FIELDS, to=recipient)
+        mail = Email(**kwargs)
+        mail.add_attachment(BytesIO(ATTACHMENT), attname='conditions.pdf')
+        if serialize:
+            mail.mime_string
+
+
+def build_from_template(number, serialize=False):
+    template = EmailTemplate(**FIELDS)
+    template.add_attachment(BytesIO(ATTACHMENT), attname='conditions.pdf')
+    for recipient in recipients(number):
+        mail = template.render(to=recipient)
+        if serialize:
+            mail.mime_string
+
+
+def run(func, number, serialize):
+    start = time.time()
+    func(number, serialize)
+    elapsed = time.time() - start
+    return elapsed, number / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='Number of recipients (default 100000)')
+    parser.add_argument('--serialize', action='store_true',
+                        help='Also render each message with mime_string')
+    parser.add_argument('--skip-scratch', action='store_true',
+                        help='Only run the template benchmark')
+    args = parser.parse_args(argv)
+    cases = [('template', build_from_template)]
+    if not args.skip_scratch:
+        cases.insert(0, ('scratch', build_from_scratch))
+    for name, func in cases:
+        elapsed, rate = run(func, args.number, args.serialize)
+        print('{0:<10} {1:>8} messages in {2:8.2f}s: {3:10.1f} msg/s'.format(
+            name, args.number, elapsed, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# coding=utf-8
+"""
+Synthetic, reproducible corpus of messages for the benchmarks: varied
+charsets, recipient counts, attachment sizes and nested multiparts.
+
+    python -m benchmarks.corpus -n 20 --output /tmp/corpus
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import random
+from email.mime.application import MIMEApplication
+from email.mime.message import MIMEMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from io import BytesIO
+
+from qreu import Email
+
+# (charset, sample text encodable with it)
+TEXTS = [
+    ('us-ascii', 'The quick brown fox jumps over the lazy dog'),
+    ('iso-8859-1', 'Factura elèctrica del mes de març: àçèéíïòóúü'),
+    ('iso-8859-15', 'Lectura del comptador, import 12,50 € amb IVA'),
+    ('windows-1252', 'Resumen “mensual” de consumos – período anterior'),
+    ('koi8-r', 'Счёт за электроэнергию за прошлый месяц'),
+    ('utf-8', 'Notificació ✉ 電気料金のお知らせ 🔌'),
+]
+#: Recipient counts, weighted to the usual case
+RECIPIENTS = [1] * 6 + [3, 10, 50, 200, 1000]
+#: Attachment sizes in bytes
+ATTACHMENT_SIZES = [0, 0, 0, 2 * 1024, 64 * 1024, 512 * 1024, 2 * 1024 * 1024]
+DOMAINS = ['example.com', 'example.org', 'exemple.cat', 'correu.example.es']
+
+
+def _paragraphs(text, count):
+    return '\n\n'.join([text] * count)
+
+
+class MessageSpec(object):
+    """Description of a synthetic message"""
+    __slots__ = (
+        'idx', 'charset', 'text', 'recipients', 'attachments', 'html',
+        'nested'
+    )
+
+    def __init__(self, idx, charset, text, recipients, attachments, html,
+                 nested):
+        self.idx = idx
+        self.charset = charset
+        self.text = text
+        self.recipients = recipients
+        self.attachments = attachments
+        self.html = html
+        self.nested = nested
+
+    def __repr__(self):
+        return '<MessageSpec {} {} rcpt={} att={} nested={}>'.format(
+            self.idx, self.charset, len(self.recipients),
+            [size for _, size in self.attachments], self.nested)
+
+    @property
+    def subject(self):
+        return '{} #{}'.format(self.text[:40], self.idx)
+
+    @property
+    def body_text(self):
+        return _paragraphs(self.text, 20)
+
+    @property
+    def body_html(self):
+        if not self.html:
+            return False
+        return '<html><body>{}</body></html>'.format(''.join(
+            '<p>{}</p>'.format(self.text) for _ in range(20)))
+
+    def attachment_contents(self):
+        rnd = random.Random(self.idx)
+        for name, size in self.attachments:
+            yield name, bytearray(
+                rnd.getrandbits(8) for _ in range(min(size, 4096))
+            ) * (size // 4096 or 1)
+
+
+def generate_specs(number, seed=0):
+    """
+    :param number:  Number of messages
+    :param seed:    Random seed, the same seed gives the same corpus
+    :return:        `list` of `MessageSpec`
+    """
+    rnd = random.Random(seed)
+    specs = []
+    for idx in range(number):
+        charset, text = rnd.choice(TEXTS)
+        recipients = [
+            'Destinatari {0} <user{0}@{1}>'.format(
+                rcpt, DOMAINS[rcpt % len(DOMAINS)])
+            for rcpt in range(rnd.choice(RECIPIENTS))
+        ]
+        attachments = [
+            ('document{}.pdf'.format(att), size)
+            for att, size in enumerate(
+                [rnd.choice(ATTACHMENT_SIZES) for _ in range(3)]) if size
+        ]
+        specs.append(MessageSpec(
+            idx, charset, text, recipients, attachments,
+            html=rnd.random() < 0.7, nested=rnd.random() < 0.2))
+    return specs
+
+
+def build_email(spec):
+    """
+    :param spec:    `MessageSpec`
+    :return:        `qreu.Email` built with the qreu API
+    """
+    mail = Email(**{
+        'from': 'Remitent <sender@example.com>',
+        'to': spec.recipients[:1],
+        'cc': spec.recipients[1:],
+        'subject': spec.subject,
+        'body_text': spec.body_text,
+        'body_html': spec.body_html,
+    })
+    mail.add_header('Message-ID', make_msgid())
+    for name, content in spec.attachment_contents():
+        mail.add_attachment(BytesIO(bytes(content)), attname=name)
+    return mail
+
+
+def build_raw(spec):
+    """
+    :param spec:    `MessageSpec`
+    :return:        Raw message (str) with the text parts in `spec.charset`,
+                    built with `email.mime`
+    """
+    alternative = MIMEMultipart('alternative')
+    alternative.attach(MIMEText(spec.body_text, 'plain', spec.charset))
+    if spec.html:
+        alternative.attach(MIMEText(spec.body_html, 'html', spec.charset))
+    message = MIMEMultipart('mixed')
+    message.attach(alternative)
+    for name, content in spec.attachment_contents():
+        part = MIMEApplication(bytes(content), 'pdf')
+        part.add_header('Content-Disposition', 'attachment', filename=name)
+        message.attach(part)
+    if spec.nested:
+        inner = MIMEMultipart('mixed')
+        inner['Subject'] = 'Original message'
+        inner.attach(MIMEText(spec.body_text, 'plain', spec.charset))
+        message.attach(MIMEMessage(inner))
+    message['From'] = 'Remitent <sender@example.com>'
+    message['To'] = ', '.join(spec.recipients)
+    message['Subject'] = Email(subject=spec.subject).email['Subject']
+    message['Date'] = formatdate()
+    message['Message-ID'] = make_msgid()
+    return message.as_string()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=20,
+                        help='Number of messages (default 20)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True,
+                        help='Directory to write the .eml files to')
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    for spec in generate_specs(args.number, args.seed):
+        path = os.path.join(args.output, '{:05d}.eml'.format(spec.idx))
+        with open(path, 'w') as writer:
+            writer.write(build_raw(spec))
+        print(path, spec)
+
+
+if __name__ == '__main__':
+    main()
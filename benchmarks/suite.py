@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+Benchmark suite of the build, parse and send paths over a synthetic corpus,
+with timings, peak memory and JSON output to compare runs.
+
+    python -m benchmarks.suite -n 50 --output results.json
+    python -m benchmarks.suite -n 50 --compare results.json
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from io import BytesIO
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from qreu import Email
+from qreu.sendcontext import FileSender, SMTPSender
+from qreu.testing import SMTPSink
+
+from benchmarks.corpus import build_email, build_raw, generate_specs
+
+
+class Corpus(object):
+    """Specs of the corpus with their emails and raw messages prebuilt"""
+
+    def __init__(self, number, seed):
+        self.specs = generate_specs(number, seed)
+        self.emails = [build_email(spec) for spec in self.specs]
+        self.raws = [build_raw(spec) for spec in self.specs]
+        self.sink = None
+        self.tmpdir = None
+
+    def __len__(self):
+        return len(self.specs)
+
+
+def op_build(corpus):
+    for spec in corpus.specs:
+        Email(**{
+            'from': 'Remitent <sender@example.com>',
+            'to': spec.recipients,
+            'subject': spec.subject,
+            'body_text': spec.body_text,
+            'body_html': spec.body_html,
+        })
+
+
+def op_add_header(corpus):
+    for spec in corpus.specs:
+        mail = Email()
+        mail.add_header('to', spec.recipients)
+        mail.add_header('subject', spec.subject)
+
+
+def op_add_attachment(corpus):
+    for spec in corpus.specs:
+        mail = Email()
+        for name, content in spec.attachment_contents():
+            mail.add_attachment(BytesIO(bytes(content)), attname=name)
+
+
+def op_mime_string(corpus):
+    for mail in corpus.emails:
+        mail.mime_string
+
+
+def op_parse(corpus):
+    for raw in corpus.raws:
+        Email.parse(raw)
+
+
+def op_body_parts(corpus):
+    for mail in corpus.emails:
+        mail.body_parts
+
+
+def op_forward(corpus):
+    for mail in corpus.emails:
+        mail.forward(to='forward@example.com')
+
+
+def op_send_smtp(corpus):
+    with SMTPSender(host=corpus.sink.host, port=corpus.sink.port) as sender:
+        for mail in corpus.emails:
+            sender.send(mail)
+
+
+def op_send_file(corpus):
+    filename = os.path.join(corpus.tmpdir, 'mail.eml')
+    with FileSender(filename) as sender:
+        for mail in corpus.emails:
+            sender.send(mail)
+
+
+OPERATIONS = OrderedDict([
+    ('build', op_build),
+    ('add_header', op_add_header),
+    ('add_attachment', op_add_attachment),
+    ('mime_string', op_mime_string),
+    ('parse', op_parse),
+    ('body_parts', op_body_parts),
+    ('forward', op_forward),
+    ('send_smtp', op_send_smtp),
+    ('send_file', op_send_file),
+])
+
+
+def measure(operation, corpus, repeat, memory=True):
+    """
+    :return: `dict` with the timings of `repeat` runs of `operation` and
+             the peak of memory allocated by one run (if tracemalloc is
+             available)
+    """
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        operation(corpus)
+        timings.append(default_timer() - start)
+        if corpus.sink is not None:
+            corpus.sink.clear()
+    peak = None
+    if memory and tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            operation(corpus)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    best = min(timings)
+    return OrderedDict([
+        ('runs', repeat),
+        ('messages', len(corpus)),
+        ('best', best),
+        ('mean', sum(timings) / len(timings)),
+        ('per_message_ms', best / len(corpus) * 1000),
+        ('peak_bytes', peak),
+    ])
+
+
+def metadata(args):
+    return OrderedDict([
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', sys.version.split()[0]),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('messages', args.number),
+        ('seed', args.seed),
+        ('repeat', args.repeat),
+    ])
+
+
+def run(names, args):
+    corpus = Corpus(args.number, args.seed)
+    results = OrderedDict()
+    corpus.tmpdir = tempfile.mkdtemp()
+    try:
+        with SMTPSink() as corpus.sink:
+            for name in names:
+                results[name] = measure(
+                    OPERATIONS[name], corpus, args.repeat,
+                    memory=not args.no_memory)
+                print_result(name, results[name])
+    finally:
+        shutil.rmtree(corpus.tmpdir)
+    return results
+
+
+def print_result(name, result, previous=None):
+    line = '{0:<16} {1:10.3f} ms/msg'.format(name, result['per_message_ms'])
+    if result['peak_bytes'] is not None:
+        line += ' {0:12.1f} KiB peak'.format(result['peak_bytes'] / 1024.0)
+    if previous:
+        change = result['best'] / previous['best'] - 1
+        line += ' {0:+8.1%} vs previous'.format(change)
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--number', type=int, default=50,
+                        help='Messages in the corpus (default 50)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the corpus (default 0)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Timed runs, the best one is kept (default 3)')
+    parser.add_argument('--only', default='',
+                        help='Comma separated operations ({})'.format(
+                            ', '.join(OPERATIONS)))
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Skip the peak memory run')
+    parser.add_argument('--output', help='Write the results to this JSON')
+    parser.add_argument('--compare', help='JSON of a previous run')
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.only.split(',') if name] or list(OPERATIONS)
+    unknown = [name for name in names if name not in OPERATIONS]
+    if unknown:
+        parser.error('Unknown operations: {}'.format(', '.join(unknown)))
+    results = run(names, args)
+    report = OrderedDict([('meta', metadata(args)), ('results', results)])
+    if args.compare:
+        with open(args.compare) as reader:
+            previous = json.load(reader)['results']
+        print('\nCompared with {}:'.format(args.compare))
+        for name, result in results.items():
+            print_result(name, result, previous.get(name))
+    if args.output:
+        with open(args.output, 'w') as writer:
+            json.dump(report, writer, indent=2)
+
+
+if __name__ == '__main__':
+    main()
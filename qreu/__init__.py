@@ -1,2 +1,8 @@
 # coding=utf-8
-from .email import Email
\ No newline at end of file
+import os
+
+from .email import Email
+
+if os.environ.get('QREU_PROFILE'):
+    from .profiling import enable_from_env
+    enable_from_env()
@@ -1,7 +1,8 @@
 # coding: utf-8
 from __future__ import absolute_import, unicode_literals
 
-from collections import namedtuple
+import re
+from weakref import WeakValueDictionary
 
 import six
 
@@ -18,14 +19,186 @@ def getaddresses(fieldvalues):
     fixed_fieldvalues = [x.replace(";", ",") for x in fieldvalues]
     return getaddresses_email(fixed_fieldvalues)
 
-BaseAddress = namedtuple('Address', ['display_name', 'address'])
+#: Loose check of an addr-spec: a local part and a domain without spaces
+ADDR_SPEC = re.compile(r'^[^@\s<>,;"]+@[^@\s<>,;"()\[\]]+$')
+
+#: Maximum number of distinct addresses kept in the intern table
+INTERN_MAX_SIZE = 100000
+
+_INTERNED = WeakValueDictionary()
+
+
+def normalize_address(addr):
+    """Build the comparison key of an email address.
+
+    The local part and the domain are lowercased and the domain is converted
+    to its IDNA (ASCII) form, so `User@Bücher.example` and
+    `user@xn--bcher-kva.example` share the same key.
+
+    :param addr: Email address (without display name)
+    :type addr:  str
+    :return:     Normalized address
+    :rtype:      str
+    """
+    if not addr:
+        return ''
+    if isinstance(addr, six.binary_type):
+        addr = addr.decode('utf-8')
+    addr = addr.strip()
+    local_part, sep, domain = addr.rpartition('@')
+    if not sep:
+        return addr.lower()
+    try:
+        domain.encode('ascii')
+    except UnicodeError:
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+    return '{}@{}'.format(local_part.lower(), domain.lower())
+
+
+def validate_address(addr):
+    """Check that `addr` looks like an email address (without display name)
+
+    :param addr: Email address
+    :type addr:  str
+    :return:     The address
+    :rtype:      str
+    :raises:     ValueError
+    """
+    if not addr or not ADDR_SPEC.match(addr):
+        raise ValueError('Invalid email address: {!r}'.format(addr))
+    return addr
+
+
+def idna_address(addr):
+    """Email address with its domain in IDNA (ASCII) form, to use it in an
+    envelope without SMTPUTF8. The local part is kept as it is.
+
+    :param addr: Email address (without display name)
+    :type addr:  str
+    :return:     ASCII email address
+    :rtype:      str
+    :raises:     UnicodeError if the local part is not ASCII
+    """
+    local_part, sep, domain = addr.rpartition('@')
+    local_part.encode('ascii')
+    try:
+        domain.encode('ascii')
+    except UnicodeError:
+        domain = domain.encode('idna').decode('ascii')
+    return '{}{}{}'.format(local_part, sep, domain)
+
+
+class Address(object):
+    """Immutable email address with a display name.
+
+    Instances are interned: creating an `Address` with the same display name
+    and address as a live one returns the existing object. Equality, hash
+    and ordering are based on the normalized address (see
+    `normalize_address`), so addresses differing only on case or domain
+    encoding are the same recipient. It unpacks and indexes as the
+    (display_name, address) namedtuple it replaces, but it is not a tuple:
+    it is never equal to one (use `tuple(address)` to compare them).
+    """
+    __slots__ = ('display_name', 'address', 'key', '_display', '__weakref__')
+    _fields = ('display_name', 'address')
+
+    def __new__(cls, display_name='', address=''):
+        cache_key = (cls, display_name, address)
+        try:
+            return _INTERNED[cache_key]
+        except KeyError:
+            pass
+        instance = super(Address, cls).__new__(cls)
+        object.__setattr__(instance, 'display_name', display_name)
+        object.__setattr__(instance, 'address', address)
+        object.__setattr__(instance, 'key', normalize_address(address))
+        object.__setattr__(instance, '_display', None)
+        if len(_INTERNED) < INTERN_MAX_SIZE:
+            _INTERNED[cache_key] = instance
+        return instance
+
+    def __setattr__(self, name, value):
+        raise AttributeError("can't set attribute")
+
+    def __delattr__(self, name):
+        raise AttributeError("can't delete attribute")
+
+    def __reduce__(self):
+        return self.__class__, (self.display_name, self.address)
+
+    def __iter__(self):
+        yield self.display_name
+        yield self.address
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self.display_name, self.address)[index]
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
+
+    def __eq__(self, other):
+        if isinstance(other, Address):
+            return self.key == other.key
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, Address):
+            return self.key != other.key
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Address):
+            return self.key < other.key
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Address):
+            return self.key <= other.key
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Address):
+            return self.key > other.key
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Address):
+            return self.key >= other.key
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'Address(display_name={!r}, address={!r})'.format(
+            self.display_name, self.address)
+
+    def _asdict(self):
+        return {'display_name': self.display_name, 'address': self.address}
+
+    def _replace(self, **kwargs):
+        values = self._asdict()
+        values.update(kwargs)
+        return Address(**values)
 
-class Address(BaseAddress):
     @property
     def display(self):
-        if self.display_name:
-            return '"{display_name}" <{address}>'.format(**self._asdict())
-        return self.address
+        display = self._display
+        if display is None:
+            if self.display_name:
+                display = '"{display_name}" <{address}>'.format(
+                    **self._asdict())
+            else:
+                display = self.address
+            object.__setattr__(self, '_display', display)
+        return display
 
     @staticmethod
     def parse(header):
@@ -56,6 +229,28 @@ class AddressList(UserList):
     def addresses(self):
       return [x[1] for x in getaddresses(self.data) if x[1]]
 
+    @property
+    def address_objects(self):
+        """
+        :return: `list` of interned `Address` objects of the list
+        """
+        return [Address(*x) for x in getaddresses(self.data) if x[1]]
+
+    @property
+    def unique_addresses(self):
+        """
+        Email addresses deduplicated by their normalized key, keeping the
+        first spelling found and the original order
+        :return: `list` of email addresses
+        """
+        seen = set()
+        result = []
+        for addr in self.address_objects:
+            if addr.key not in seen:
+                seen.add(addr.key)
+                result.append(addr.address)
+        return result
+
 
 def normalize_display_address(addr_string):
     """
@@ -0,0 +1,231 @@
+# coding=utf-8
+"""
+Attachment descriptors with streaming access to the decoded content.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import binascii
+import io
+import shutil
+
+import six
+
+#: Size of the encoded chunks decoded on each read
+CHUNK_SIZE = 64 * 1024
+
+
+def _to_bytes(text):
+    if isinstance(text, six.binary_type):
+        return text
+    try:
+        return text.encode('ascii', 'surrogateescape')
+    except (UnicodeError, LookupError):
+        return text.encode('raw-unicode-escape')
+
+
+class DecodingReader(io.RawIOBase):
+    """
+    Read-only raw stream decoding an encoded payload chunk by chunk, so the
+    whole decoded content is never held in memory.
+
+    Subclasses implement `_decode(text, final)` returning the decoded bytes
+    of `text` and the trailing text that could not be decoded yet.
+
+    :param payload:         Encoded payload, or a file object to read it
+                            from in chunks
+    :type payload:          str
+    :param close_stream:    Close the file object when the reader is closed
+    :type close_stream:     bool
+    """
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, payload, close_stream=False):
+        super(DecodingReader, self).__init__()
+        self._stream = None
+        self._close_stream = close_stream
+        self._lookahead = None
+        if hasattr(payload, 'read'):
+            self._stream = payload
+            payload = ''
+        self._payload = payload or ''
+        self._pos = 0
+        self._pending = b''
+        self._tail = ''
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if self._close_stream and self._stream is not None:
+            self._stream.close()
+        super(DecodingReader, self).close()
+
+    def _decode(self, text, final):
+        return _to_bytes(text), ''
+
+    def _next_chunk(self):
+        """
+        :return: Tuple as (next encoded chunk, is the last one)
+        """
+        if self._stream is None:
+            chunk = self._payload[self._pos:self._pos + self.chunk_size]
+            self._pos += len(chunk)
+            return chunk, self._pos >= len(self._payload)
+        chunk = self._lookahead
+        if chunk is None:
+            chunk = self._stream.read(self.chunk_size)
+        self._lookahead = self._stream.read(self.chunk_size) if chunk else ''
+        return chunk, not self._lookahead
+
+    def readinto(self, buff):
+        while not self._pending:
+            chunk, final = self._next_chunk()
+            if not chunk and not self._tail:
+                return 0
+            self._pending, self._tail = self._decode(self._tail + chunk, final)
+            if final and not self._pending:
+                self._tail = ''
+                return 0
+        size = min(len(buff), len(self._pending))
+        buff[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class Base64Reader(DecodingReader):
+    """`DecodingReader` for base64 payloads"""
+
+    def _decode(self, text, final):
+        text = ''.join(text.split())
+        if final:
+            text += '=' * (-len(text) % 4)
+            return binascii.a2b_base64(_to_bytes(text)), ''
+        cut = len(text) - len(text) % 4
+        return binascii.a2b_base64(_to_bytes(text[:cut])), text[cut:]
+
+
+class QuotedPrintableReader(DecodingReader):
+    """`DecodingReader` for quoted-printable payloads"""
+
+    def _decode(self, text, final):
+        cut = len(text) if final else text.rfind('\n') + 1
+        return binascii.a2b_qp(_to_bytes(text[:cut])), text[cut:]
+
+
+READERS = {
+    'base64': Base64Reader,
+    'quoted-printable': QuotedPrintableReader,
+}
+
+
+class Attachment(object):
+    """
+    Lightweight descriptor of an attachment MIME part.
+
+    :param part:    MIME part of the attachment
+    :type part:     email.message.Message
+    """
+    __slots__ = ('part', 'name', 'content_type', 'encoding')
+
+    def __init__(self, part):
+        self.part = part
+        self.name = part.get_filename()
+        self.content_type = part.get_content_type()
+        self.encoding = str(
+            part.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+
+    def __repr__(self):
+        return '<Attachment {} ({}, {} bytes)>'.format(
+            self.name, self.content_type, self.encoded_size)
+
+    @property
+    def payload(self):
+        """
+        :return: Encoded payload of the part as a string
+        """
+        payload = self.part.get_payload()
+        return payload.decode() if isinstance(payload, bytes) else payload
+
+    @property
+    def spooled(self):
+        """
+        :return: True if the payload of the part is in a spool file
+        """
+        return getattr(self.part, 'spooled', False)
+
+    @property
+    def encoded_size(self):
+        """
+        :return: Size of the encoded payload
+        """
+        if self.spooled:
+            return self.part.payload_size
+        return len(self.part.get_payload() or '')
+
+    def _spooled_base64_size(self):
+        newlines, last = 0, ''
+        with self.part.open_payload() as stream:
+            chunk = stream.read(CHUNK_SIZE)
+            while chunk:
+                newlines += chunk.count('\n') + chunk.count('\r')
+                last = (last + chunk)[-4:]
+                chunk = stream.read(CHUNK_SIZE)
+        padding = last.rstrip()[-2:].count('=')
+        return max(
+            (self.part.payload_size - newlines) * 3 // 4 - padding, 0)
+
+    @property
+    def size(self):
+        """
+        Estimation of the decoded size, without decoding the payload.
+        Exact for base64 payloads, an upper bound for quoted-printable ones.
+        :return: Size in bytes
+        """
+        if self.spooled:
+            if self.encoding == 'base64':
+                return self._spooled_base64_size()
+            return self.encoded_size
+        payload = self.payload or ''
+        if self.encoding == 'base64':
+            # New lines are not encoded data
+            encoded_size = (
+                len(payload) - payload.count('\n') - payload.count('\r'))
+            padding = payload[-4:].rstrip()[-2:].count('=')
+            return max(encoded_size * 3 // 4 - padding, 0)
+        return len(payload)
+
+    def open(self):
+        """
+        Open the decoded content of the attachment as a binary file-like
+        object. The payload is decoded incrementally while reading.
+        :return: `io.BufferedReader`
+        """
+        reader = READERS.get(self.encoding)
+        if reader is None:
+            return io.BytesIO(self.part.get_payload(decode=True) or b'')
+        if self.spooled:
+            # Decoded straight from the spool file
+            return io.BufferedReader(
+                reader(self.part.open_payload(), close_stream=True),
+                CHUNK_SIZE)
+        return io.BufferedReader(reader(self.part.get_payload()), CHUNK_SIZE)
+
+    def read(self):
+        """
+        :return: Decoded content of the attachment
+        :rtype:  bytes
+        """
+        with self.open() as reader:
+            return reader.read()
+
+    def save_to(self, path):
+        """
+        Stream the decoded content of the attachment to `path`
+        :param path:    Path of the file to write
+        :type path:     str
+        :return:        Path of the written file
+        """
+        with self.open() as reader:
+            with open(path, 'wb') as writer:
+                shutil.copyfileobj(reader, writer, CHUNK_SIZE)
+        return path
@@ -0,0 +1,160 @@
+# coding=utf-8
+"""
+Column oriented extraction of header fields from many raw messages, for
+reporting and exports.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from array import array
+from collections import OrderedDict
+
+from qreu import address
+from qreu.email import FW_PATTERNS, RE_PATTERNS, clean_subject
+from qreu.summary import decoded_header, parse_headers
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Field name: header needed to compute it
+FIELD_HEADERS = OrderedDict([
+    ('message_id', 'Message-ID'),
+    ('date', 'Date'),
+    ('from', 'From'),
+    ('from_name', 'From'),
+    ('to', 'To'),
+    ('cc', 'Cc'),
+    ('raw_subject', 'Subject'),
+    ('subject', 'Subject'),
+    ('in_reply_to', 'In-Reply-To'),
+    ('references', 'References'),
+    ('is_reply', 'Subject'),
+    ('is_forwarded', 'Subject'),
+    ('is_auto_generated', 'Auto-Submitted'),
+])
+
+#: Fields extracted by default
+DEFAULT_FIELDS = (
+    'message_id', 'date', 'from', 'to', 'cc', 'subject', 'is_reply',
+    'is_forwarded', 'is_auto_generated',
+)
+
+FLAG_FIELDS = ('is_reply', 'is_forwarded', 'is_auto_generated')
+
+ARRAY_TYPES = ('list', 'array', 'numpy', 'auto')
+
+
+def _join_addresses(value):
+    return ', '.join(
+        addr[1] for addr in address.getaddresses([value]) if addr[1])
+
+
+def _from(value):
+    return address.parse(address.normalize_display_address(value))
+
+
+def _to_array(values, flag, array_type):
+    if array_type == 'numpy':
+        if flag:
+            return numpy.array(values, dtype=bool)
+        # Filled one by one so sequences are kept as single items
+        column = numpy.empty(len(values), dtype=object)
+        for idx, value in enumerate(values):
+            column[idx] = value
+        return column
+    if array_type == 'array' and flag:
+        return array(str('b'), values)
+    return values
+
+
+def extract_columns(raw_messages, fields=DEFAULT_FIELDS, array_type='list'):
+    """
+    Extract `fields` of many raw messages as columns.
+
+    Only the header block of each message is parsed and each header needed
+    is decoded once; the reply and forward flags are computed afterwards
+    over the whole subject column.
+
+    Available fields: message_id, date, from (address), from_name, to, cc
+    (comma separated addresses), raw_subject, subject (clean), in_reply_to,
+    references, is_reply, is_forwarded and is_auto_generated.
+
+    :param raw_messages:    Iterable of raw messages (bytes or str)
+    :param fields:          Names of the fields to extract
+    :type fields:           list
+    :param array_type:      Type of the columns: 'list', 'array' (flags as
+                            `array.array`), 'numpy' (requires numpy) or
+                            'auto' (numpy if available, else 'array')
+    :type array_type:       str
+    :return:                `OrderedDict` as {field: column}
+    :raises:                ValueError
+    """
+    unknown = [field for field in fields if field not in FIELD_HEADERS]
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+    if array_type not in ARRAY_TYPES:
+        raise ValueError('Unknown array type: {}'.format(array_type))
+    if array_type == 'auto':
+        array_type = 'numpy' if numpy is not None else 'array'
+    if array_type == 'numpy' and numpy is None:
+        raise ValueError('numpy is required for numpy arrays')
+
+    needed = set(fields)
+    if needed & {'is_reply', 'is_forwarded'}:
+        needed.add('raw_subject')
+    if 'is_reply' in needed:
+        needed.add('in_reply_to')
+    header_names = []
+    for field in FIELD_HEADERS:
+        name = FIELD_HEADERS[field]
+        if field in needed and name not in header_names:
+            header_names.append(name)
+
+    # Decode each needed header once per message
+    raw_columns = dict((name, []) for name in header_names)
+    for raw_message in raw_messages:
+        headers = parse_headers(raw_message, with_body=False)[0]
+        for name in header_names:
+            raw_columns[name].append(decoded_header(headers, name))
+
+    subjects = raw_columns.get('Subject')
+    columns = {}
+    if 'raw_subject' in needed:
+        columns['raw_subject'] = subjects
+    if 'subject' in needed:
+        columns['subject'] = [clean_subject(value) for value in subjects]
+    if needed & {'is_reply', 'is_forwarded'}:
+        match = FW_PATTERNS.match
+        forwarded = [match(value) is not None for value in subjects]
+        columns['is_forwarded'] = forwarded
+    if 'is_reply' in needed:
+        match = RE_PATTERNS.match
+        columns['is_reply'] = [
+            not fw and (bool(in_reply_to) or match(subject) is not None)
+            for fw, in_reply_to, subject in zip(
+                forwarded, raw_columns['In-Reply-To'], subjects)
+        ]
+    if 'is_auto_generated' in needed:
+        columns['is_auto_generated'] = [
+            value == 'auto-generated'
+            for value in raw_columns['Auto-Submitted']
+        ]
+    if needed & {'from', 'from_name'}:
+        froms = [_from(value) for value in raw_columns['From']]
+        columns['from'] = [addr.address for addr in froms]
+        columns['from_name'] = [addr.display_name for addr in froms]
+    for field, transform in [
+            ('message_id', None), ('date', None), ('in_reply_to', None),
+            ('to', _join_addresses), ('cc', _join_addresses),
+            ('references', lambda value: value.split())]:
+        if field in needed:
+            values = raw_columns[FIELD_HEADERS[field]]
+            if transform:
+                values = [transform(value) for value in values]
+            columns[field] = values
+
+    return OrderedDict(
+        (field, _to_array(columns[field], field in FLAG_FIELDS, array_type))
+        for field in fields
+    )
@@ -0,0 +1,119 @@
+# coding=utf-8
+"""
+Content type resolution for attachments: a precomputed extension table
+(system mime types plus the Office ones) and content sniffing.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import mimetypes
+import os
+
+#: Default content type for unknown files
+DEFAULT_TYPE = 'application/octet-stream'
+
+#: Number of bytes needed by `sniff_content_type`
+SNIFF_SIZE = 16
+
+# Ensure common Microsoft Office MIME types are available (especially for
+# Python 2.7)
+OFFICE_TYPES = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.doc': 'application/msword',
+    '.xls': 'application/vnd.ms-excel',
+    '.ppt': 'application/vnd.ms-powerpoint',
+}
+
+# (magic bytes, content type, trusted over the file extension)
+# Container formats (zip, ole, gzip) are shared by many file types, so they
+# are only used when the extension is unknown.
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf', True),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', True),
+    (b'\xff\xd8\xff', 'image/jpeg', True),
+    (b'GIF87a', 'image/gif', True),
+    (b'GIF89a', 'image/gif', True),
+    (b'PK\x03\x04', 'application/zip', False),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage', False),
+    (b'\x1f\x8b', 'application/gzip', False),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed', False),
+    (b'Rar!\x1a\x07', 'application/vnd.rar', False),
+    (b'II*\x00', 'image/tiff', False),
+    (b'MM\x00*', 'image/tiff', False),
+    (b'BM', 'image/bmp', False),
+]
+
+_TYPES_TABLE = None
+_EXTENSION_CACHE = {}
+
+
+def _types_table():
+    global _TYPES_TABLE
+    if _TYPES_TABLE is None:
+        if not mimetypes.inited:
+            mimetypes.init()
+        table = dict(
+            (ext.lower(), content_type)
+            for ext, content_type in mimetypes.types_map.items()
+        )
+        for ext, content_type in OFFICE_TYPES.items():
+            table.setdefault(ext, content_type)
+        _TYPES_TABLE = table
+    return _TYPES_TABLE
+
+
+def extension_content_type(filename):
+    """
+    Content type for the extension of `filename`
+    :param filename:    Name of the file
+    :type filename:     str
+    :return:            Content type or None if unknown
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    if not ext:
+        return None
+    try:
+        return _EXTENSION_CACHE[ext]
+    except KeyError:
+        pass
+    content_type = _types_table().get(ext)
+    if content_type is None:
+        content_type = mimetypes.guess_type('file' + ext)[0]
+    _EXTENSION_CACHE[ext] = content_type
+    return content_type
+
+
+def sniff_content_type(head):
+    """
+    Detect the content type from the first bytes of a file
+    :param head:    First bytes of the file (at least `SNIFF_SIZE`)
+    :type head:     bytes
+    :return:        Tuple as (content type, trusted) or (None, False)
+    """
+    if head:
+        for magic, content_type, trusted in SIGNATURES:
+            if head.startswith(magic):
+                return content_type, trusted
+    return None, False
+
+
+def guess_content_type(filename, head=None, default=DEFAULT_TYPE):
+    """
+    Guess the content type of a file from its name and, if `head` is given,
+    from its first bytes. A trusted signature wins over a misleading
+    extension; other signatures are only used for unknown extensions.
+
+    :param filename:    Name of the file
+    :type filename:     str
+    :param head:        First bytes of the file
+    :type head:         bytes
+    :param default:     Content type if it can not be guessed
+    :return:            Content type
+    :rtype:             str
+    """
+    content_type = extension_content_type(filename)
+    sniffed, trusted = sniff_content_type(head)
+    if sniffed and (trusted or not content_type):
+        return sniffed
+    return content_type or default
@@ -0,0 +1,154 @@
+# coding=utf-8
+"""
+Date header helpers: tolerant parsing to aware datetimes and a cached
+RFC 2822 formatter.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import math
+import re
+from datetime import datetime, timedelta, tzinfo
+from email.utils import formatdate, parsedate_tz
+
+from six import PY2
+
+EPOCH = datetime(1970, 1, 1)
+
+# Zone names not known by `email.utils.parsedate_tz` (offset in hours)
+EXTRA_ZONES = {
+    'CET': 1, 'CEST': 2, 'MET': 1, 'MEST': 2, 'WET': 0, 'WEST': 1,
+    'EET': 2, 'EEST': 3, 'BST': 1,
+}
+ZONE_NAME = re.compile(r'\s([A-Z]{3,4})\s*(?:\([^)]*\))?\s*$')
+ISO_DATE = re.compile(
+    r'^\s*(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?'
+    r'\s*(Z|[+-]\d{2}:?\d{2})?\s*$', re.IGNORECASE)
+
+#: Max number of formatted seconds kept by `format_date`
+FORMAT_CACHE_SIZE = 1024
+
+_FORMAT_CACHE = {}
+
+
+class FixedOffset(tzinfo):
+    """Fixed offset timezone (datetime.timezone is not available on PY2)"""
+
+    def __init__(self, seconds):
+        self._offset = timedelta(seconds=seconds)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        seconds = int(self._offset.total_seconds())
+        sign = '-' if seconds < 0 else '+'
+        hours, minutes = divmod(abs(seconds) // 60, 60)
+        # Native str, datetime rejects unicode names on PY2
+        return str('{}{:02d}{:02d}'.format(sign, hours, minutes))
+
+    def __repr__(self):
+        return 'FixedOffset({})'.format(self.tzname(None))
+
+    def __reduce__(self):
+        return self.__class__, (int(self._offset.total_seconds()),)
+
+
+UTC = FixedOffset(0)
+
+
+def _parse_iso(value):
+    match = ISO_DATE.match(value)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    offset = 0
+    if zone and zone.upper() != 'Z':
+        zone = zone.replace(':', '')
+        offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+        if zone[0] == '-':
+            offset = -offset
+    try:
+        return datetime(
+            int(year), int(month), int(day), int(hour), int(minute),
+            int(second or 0), tzinfo=FixedOffset(offset))
+    except ValueError:
+        return None
+
+
+def parse_date(value):
+    """
+    Parse a Date header value to a timezone aware datetime.
+
+    Tolerates the usual malformations: missing weekday or seconds, two
+    digit years, trailing comments, zone names instead of offsets and
+    ISO 8601 dates. Dates without timezone are considered UTC.
+
+    :param value:   Date header value
+    :type value:    str
+    :return:        `datetime` or None if it can not be parsed
+    """
+    if not value:
+        return None
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return _parse_iso(value)
+    offset = parsed[9]
+    if not offset:
+        zone = ZONE_NAME.search(value)
+        if zone and zone.group(1) in EXTRA_ZONES:
+            offset = EXTRA_ZONES[zone.group(1)] * 3600
+    try:
+        return datetime(*parsed[:6], tzinfo=FixedOffset(offset or 0))
+    except ValueError:
+        return None
+
+
+def timestamp(date_time):
+    """
+    :param date_time:   Naive (local time) or aware datetime
+    :type date_time:    datetime
+    :return:            POSIX timestamp
+    :rtype:             float
+    """
+    if PY2:
+        if date_time.utcoffset() is not None:
+            utc_naive = (
+                date_time.replace(tzinfo=None) - date_time.utcoffset())
+            return (utc_naive - EPOCH).total_seconds()
+        return (date_time - EPOCH).total_seconds()
+    return date_time.timestamp()
+
+
+def format_timestamp(seconds):
+    """
+    Format a POSIX timestamp as an RFC 2822 date (UTC, "-0000" zone).
+    The result of each second is cached, so messages generated in the
+    same second share the formatting.
+
+    :param seconds: POSIX timestamp
+    :type seconds:  float
+    :return:        Date string
+    :rtype:         str
+    """
+    second = int(math.floor(seconds))
+    try:
+        return _FORMAT_CACHE[second]
+    except KeyError:
+        pass
+    if len(_FORMAT_CACHE) >= FORMAT_CACHE_SIZE:
+        _FORMAT_CACHE.clear()
+    result = _FORMAT_CACHE[second] = formatdate(second)
+    return result
+
+
+def format_date(date_time):
+    """
+    Parses a datetime object to a string with the standard Datetime prompt
+    If no datetime provided, returns the parameter
+    """
+    if not isinstance(date_time, datetime):
+        return date_time
+    return format_timestamp(timestamp(date_time))
@@ -1,17 +1,16 @@
 # coding=utf-8
 from __future__ import absolute_import, unicode_literals
 
+import base64
 import email
-import mimetypes
 from email.header import decode_header, Header
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.utils import formatdate, make_msgid
+from email.mime.nonmultipart import MIMENonMultipart
+from email.utils import make_msgid
 from datetime import datetime
 
 import six
-from html2text import html2text
 from six import PY2
 if PY2:
     from StringIO import StringIO
@@ -21,8 +20,15 @@ else:
 
 import re
 
-from qreu import address
+from qreu import address, transfer
+from qreu.attachment import Attachment
+from qreu.contenttype import SNIFF_SIZE, guess_content_type
+from qreu.dates import format_date, parse_date
+from qreu.store import StoredPart
+from qreu.html import get_body_html, html_to_text
+from qreu.parser import EmailFeedParser
 from qreu.sendcontext import get_current_sender
+from qreu.spool import DEFAULT_SPOOL_THRESHOLD
 
 
 RE_PATTERNS = re.compile('({0})'.format('|'.join(
@@ -62,9 +68,235 @@ FW_PATTERNS = re.compile('({0})'.format('|'.join(
     ])), re.IGNORECASE)
 
 
-def get_body_html(html):
-    body = re.findall('<body[^>]*>(.*)</body>', html.replace('\r\n', '').replace('\n', ''))
-    return body and body[0].strip() or html.strip()
+# Line breaks of a folded header
+FOLDING = re.compile(r'\r?\n(?=[ \t])')
+
+
+def decode_header_value(header_value):
+    """
+    Decode a (RFC 2047 encoded) header value to Unicode
+
+    :param header_value: Raw header value
+    :type header_value:  str
+    :return:             Decoded header value
+    :rtype:              str
+    """
+    if isinstance(header_value, six.string_types):
+        # Unfold (RFC 5322 2.2.3)
+        header_value = FOLDING.sub('', header_value)
+        if PY2 and isinstance(header_value, six.text_type):
+            # decode_header calls str() on the value
+            header_value = header_value.encode('utf-8')
+    result = []
+    for part in decode_header(header_value):
+        if part[1] == 'unknown-8bit':
+            # Raw UTF-8 of a parsed SMTPUTF8 message (RFC 6532)
+            encoded = part[0].decode('utf-8', 'replace')
+        elif part[1]:
+            encoded = part[0].decode(part[1])
+        elif isinstance(part[0], bytes):
+            # Python 3 returns the unencoded parts as raw-unicode-escape
+            encoded = part[0].decode('utf-8' if PY2 else 'raw-unicode-escape')
+        else:
+            encoded = part[0]
+        result.append(encoded.strip())
+    return ' '.join(result)
+
+
+# Characters forcing a quoted display name (RFC 5322 specials)
+SPECIALS = re.compile(r'[][\\()<>@,:;".]')
+# Bytes kept as they are in Q encoded words (RFC 2047 5.3)
+Q_SAFE = frozenset(
+    bytearray(b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+              b'0123456789!*+-/'))
+#: Max length of an encoded word
+ENCODED_WORD_MAX = 75
+#: Max length of the header lines folded by qreu (RFC 5322 2.1.1)
+MAX_LINE_LENGTH = 78
+
+
+def is_ascii(value):
+    """
+    :return: True if `value` (str or bytes) only has ASCII characters
+    """
+    try:
+        if isinstance(value, six.text_type):
+            value.encode('ascii')
+        else:
+            value.decode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+def _q_encode(data):
+    return ''.join(
+        chr(byte) if byte in Q_SAFE else '_' if byte == 32
+        else '={:02X}'.format(byte)
+        for byte in bytearray(data)
+    )
+
+
+def encode_words(text, charset='utf-8'):
+    """
+    Encode `text` as RFC 2047 encoded words with the shortest of the Q and
+    B encodings, splitting it in words of at most `ENCODED_WORD_MAX`
+    characters without breaking multibyte characters.
+
+    :param text:    Text to encode
+    :type text:     str
+    :return:        Encoded words separated by folding white space
+    :rtype:         str
+    """
+    data = text.encode(charset)
+    q_length = sum(
+        1 if byte in Q_SAFE or byte == 32 else 3 for byte in bytearray(data))
+    b_length = (len(data) + 2) // 3 * 4
+    encoding = 'b' if b_length < q_length else 'q'
+    prefix = '=?{}?{}?'.format(charset, encoding)
+    room = ENCODED_WORD_MAX - len(prefix) - 2
+    if min(q_length, b_length) <= room:
+        # Short text, a single word
+        chunks = [data]
+    else:
+        if encoding == 'b':
+            room = room // 4 * 3
+        chunks = _split_chunks(text, charset, encoding, room)
+
+    words = []
+    for chunk in chunks:
+        if encoding == 'b':
+            encoded = base64.b64encode(chunk).decode('ascii')
+        else:
+            encoded = _q_encode(chunk)
+        words.append('{}{}?='.format(prefix, encoded))
+    return '\n '.join(words)
+
+
+def _split_chunks(text, charset, encoding, room):
+    # Split by characters, so each word decodes on its own
+    chunks, current, current_length = [], b'', 0
+    for char in text:
+        char_data = char.encode(charset)
+        if encoding == 'b':
+            length = len(char_data)
+        else:
+            length = len(_q_encode(char_data))
+        if current and current_length + length > room:
+            chunks.append(current)
+            current, current_length = b'', 0
+        current += char_data
+        current_length += length
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def format_address(display_name, addr, encode=True):
+    """
+    Format an address for a header. ASCII display names are quoted if
+    needed, the others are RFC 2047 encoded (or left decoded if not
+    `encode`).
+
+    :param display_name:    Display name
+    :param addr:            Email address
+    :param encode:          Encode non ASCII display names
+    :return:                str
+    """
+    if not display_name:
+        return addr
+    if is_ascii(display_name) or not encode:
+        if SPECIALS.search(display_name):
+            display_name = '"{}"'.format(
+                display_name.replace('\\', '\\\\').replace('"', '\\"'))
+        return '{} <{}>'.format(display_name, addr)
+    # decode_header method in PY2 does not look for closed items
+    # so a ' ' separator is required between items of a Header
+    base_addr = '{} <{}>' if PY2 else '{}<{}>'
+    words = encode_words(display_name)
+    if len(words) - words.rfind('\n') + len(addr) + 2 > MAX_LINE_LENGTH:
+        # The address does not fit after the last word on a folded line
+        base_addr = '{}\n <{}>'
+    return base_addr.format(words, addr)
+
+
+def fold_items(header, items, separator=','):
+    """
+    Join header items (e.g. formatted addresses) folding the value between
+    items, so no line exceeds `MAX_LINE_LENGTH` unless an item alone does.
+
+    :param header:      Header name, to count its length on the first line
+    :param items:       Iterable of str, they may be already folded
+    :param separator:   Separator of the items
+    :return:            Folded header value
+    :rtype:             str
+    """
+    parts = []
+    column = len(header) + 2
+    for item in items:
+        first, _, last = item.partition('\n')
+        if not parts and column + len(first) > MAX_LINE_LENGTH:
+            # Not even the first item fits after the header name
+            parts.append('\n ')
+            column = 1
+        elif parts:
+            if column + len(separator) + 1 + len(first) > MAX_LINE_LENGTH:
+                parts.append(separator + '\n ')
+                column = 1
+            else:
+                parts.append(separator)
+                column += len(separator)
+        parts.append(item)
+        if last:
+            column = len(item) - item.rfind('\n') - 1
+        else:
+            column += len(first)
+    return ''.join(parts)
+
+
+def fold_ascii(header, value):
+    """
+    Fold an ASCII header value at its white space, so no line exceeds
+    `MAX_LINE_LENGTH`
+
+    :param header:  Header name, to count its length on the first line
+    :param value:   ASCII header value
+    :return:        Folded header value or None if a word alone is too long
+    :rtype:         str
+    """
+    folded = Header(
+        value, header_name=header, maxlinelen=MAX_LINE_LENGTH).encode()
+    lines = folded.split('\n')
+    if (len(header) + 2 + len(lines[0]) > MAX_LINE_LENGTH
+            or any(len(line) > MAX_LINE_LENGTH for line in lines[1:])):
+        return None
+    return folded
+
+
+def is_forwarded_subject(subject):
+    """
+    :param subject: Decoded subject
+    :return:        True if the subject matches a forward pattern
+    """
+    return bool(re.match(FW_PATTERNS, subject))
+
+
+def is_reply_subject(subject):
+    """
+    :param subject: Decoded subject
+    :return:        True if the subject matches a reply pattern
+    """
+    return bool(re.match(RE_PATTERNS, subject))
+
+
+def clean_subject(subject):
+    """
+    :param subject: Decoded subject
+    :return:        Subject without reply and forward abbreviations
+    """
+    subject = re.sub(RE_PATTERNS, '', subject)
+    subject = re.sub(FW_PATTERNS, '', subject)
+    return subject.strip()
 
 
 class Email(object):
@@ -76,6 +308,7 @@ class Email(object):
     def __init__(self, **kwargs):
         self.email = MIMEMultipart()
         self.bccs = []
+        self.envelope_recipients = []
         for header_name in ['subject', 'from', 'to', 'cc', 'bcc']:
             value = kwargs.get(header_name, False)
             if not value:
@@ -94,31 +327,82 @@ class Email(object):
         Parses a datetime object to a string with the standard Datetime prompt
         If no datetime provided, returns the parameter
         """
-        if not isinstance(date_time, datetime):
-            return date_time
-        else:
-            if PY2:
-                if date_time.tzname():
-                    utc_naive = (
-                        date_time.replace(tzinfo=None) - date_time.utcoffset())
-                    t = (utc_naive - datetime(1970, 1, 1)).total_seconds()
-                else:
-                    t = (date_time - datetime(1970, 1, 1)).total_seconds()
-                return formatdate(t)
-            else:
-                return formatdate(date_time.timestamp())        
+        return format_date(date_time)
 
     @staticmethod
-    def parse(raw_message):
+    def parse(raw_message, spool_threshold=None):
+        """
+        :param raw_message:     Raw message
+        :type raw_message:      str or bytes
+        :param spool_threshold: Keep the part payloads bigger than this in
+                                temporary files (default in memory)
+        :type spool_threshold:  int
+        :return:                `Email`
+        """
+        if spool_threshold is not None:
+            parser = EmailFeedParser(spool_threshold)
+            parser.feed(raw_message)
+            return parser.close()
         mail = Email()
-        mail.email = email.message_from_string(raw_message)
+        if not PY2 and isinstance(raw_message, bytes):
+            # Keep the 8bit parts as they are (see `mime_bytes`)
+            mail.email = email.message_from_bytes(raw_message)
+        else:
+            mail.email = email.message_from_string(raw_message)
         return mail
 
+    @staticmethod
+    def parse_file(input_file, spool_threshold=DEFAULT_SPOOL_THRESHOLD):
+        """
+        Parse the message of a file reading it in chunks, the part payloads
+        bigger than `spool_threshold` are kept in temporary files until the
+        `Email` is closed or discarded
+        :param input_file:      Path or binary file object of the message
+        :param spool_threshold: Size threshold (None to keep all the
+                                payloads in memory)
+        :type spool_threshold:  int
+        :return:                `Email`
+        """
+        parser = EmailFeedParser(spool_threshold)
+        if isinstance(input_file, six.string_types):
+            with open(input_file, 'rb') as reader:
+                parser.feed_file(reader)
+        else:
+            parser.feed_file(input_file)
+        return parser.close()
+
+    @staticmethod
+    def feed_parser(spool_threshold=DEFAULT_SPOOL_THRESHOLD):
+        """
+        Incremental parser for messages received in chunks: feed it the
+        chunks as they arrive and get the `Email` on close
+        :param spool_threshold: Payloads bigger than this are kept in
+                                temporary files (None to keep them in memory)
+        :type spool_threshold:  int
+        :return:                `qreu.parser.EmailFeedParser`
+        """
+        return EmailFeedParser(spool_threshold)
+
+    def close(self):
+        """
+        Remove the temporary files of the spooled part payloads (see
+        `parse_file`), they can not be read anymore
+        """
+        close = getattr(self.email, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.close()
+
     def send(self):
         """
         Send himself using the current sendercontext
         """
-        return get_current_sender().sendmail(self)
+        return get_current_sender().deliver(self)
 
     def forward(self, **kwargs):
         fmail = Email.parse(self.mime_string)
@@ -164,7 +448,7 @@ class Email(object):
         if body_text:
             body_text = body_text.format(original=original_plain)
         elif body_html:
-            body_text = html2text(body_html)
+            body_text = html_to_text(body_html)
 
         # Update the body parts
         for part in fmail.email.walk():
@@ -174,11 +458,9 @@ class Email(object):
             elif maintype == 'text':
                 charset = part.get_content_charset()
                 if subtype == 'plain' and body_text:
-                    part.replace_header('Content-Transfer-Encoding', 'quoted-printable')
-                    part.set_payload(body_text, charset=charset)
+                    transfer.set_text_payload(part, body_text, charset)
                 elif subtype == 'html' and body_html:
-                    part.replace_header('Content-Transfer-Encoding', 'quoted-printable')
-                    part.set_payload(body_html, charset=charset)
+                    transfer.set_text_payload(part, body_html, charset)
 
         return fmail
 
@@ -234,18 +516,9 @@ class Email(object):
         :param default: Default result if header is not found
         :return: Header value
         """
-        result = []
         header_value = self.email.get(header, default)
         if header_value:
-            for part in decode_header(header_value):
-                if part[1]:
-                    encoded = part[0].decode(part[1])
-                elif isinstance(part[0], bytes):
-                    encoded = part[0].decode('utf-8')
-                else:
-                    encoded = part[0]
-                result.append(encoded.strip())
-            header_value = ' '.join(result)
+            header_value = decode_header_value(header_value)
 
         return header_value
 
@@ -264,69 +537,94 @@ class Email(object):
             raise ValueError('Header not provided!')
         if header.lower() == 'date':
             return False
-        recipients_headers = ['to', 'cc', 'bcc']
-        if header.lower() in recipients_headers or header.lower() == 'from':
+        header = Email.fix_header_name(header) or header
+        if header.lower() in ('to', 'cc', 'bcc', 'from'):
             if not isinstance(value, list):
                 value = [value]
-            header_value = []
-            for addr in value:
-                # For each address in the recipients headers
-                # Do the Header Object
-                # PY3 works fine with Header(values, charset='utf-8')
-                # PY2:
-                # - Does not escape correctly the unicode values
-                # - Must encode the display name as a HEADER
-                #    so the item is encoded properly
-                # - The encoded display name and the address are joined
-                #    into the Header of the email
-                mail_addr = address.parse(addr)
-                display_name = Header(
-                    mail_addr.display_name, charset='utf-8').encode()
-                if display_name:
-                    # decode_header method in PY2 does not look for closed items
-                    # so a ' ' separator is required between items of a Header
-                    if PY2:
-                        base_addr = '{} <{}>'
-                    else:
-                        base_addr = '{}<{}>'
-                    header_value.append(
-                        base_addr.format(
-                            display_name,
-                            mail_addr.address
-                        ).strip()
-                    )
-                else:
-                    header_value.append(mail_addr.address)
-            header_value = ','.join(header_value)
-        else:
-            header_value = Header(value, charset='utf-8').encode()
-        # Get correct header name or add the one provided if custom header key
-        header = Email.fix_header_name(header) or header
+            return self._set_addresses(
+                header, [address.parse(addr) for addr in value])
+        header_value = None
+        if (isinstance(value, six.string_types) and is_ascii(value)
+                and '=?' not in value and '\n' not in value
+                and '\r' not in value):
+            # Nothing to encode
+            if len(header) + 2 + len(value) <= MAX_LINE_LENGTH:
+                header_value = value
+            else:
+                header_value = fold_ascii(header, value)
+        if header_value is None:
+            header_value = Header(
+                value, charset='utf-8', header_name=header).encode()
+        self.email[header] = header_value
+        return header_value
+
+    def _set_addresses(self, header, addresses):
         if header.lower() == 'bcc':
-            result = []
-            for part in decode_header(header_value):
-                if part[1]:
-                    encoded = part[0].decode(part[1])
-                elif isinstance(part[0], bytes):
-                    encoded = part[0].decode('utf-8')
-                else:
-                    encoded = part[0]
-                result.append(encoded.strip())
-            header_value = ' '.join(result)
-            self.bccs = header_value
-        else:
-            self.email[header] = header_value
+            # Bcc is never written, keep it decoded
+            self.bccs = ','.join(
+                format_address(display_name, addr, encode=False)
+                for display_name, addr in addresses)
+            return self.bccs
+        header_value = fold_items(header, (
+            format_address(display_name, addr)
+            for display_name, addr in addresses))
+        self.email[header] = header_value
         return header_value
 
-    def add_body_text(self, body_plain=False, body_html=False):
+    def add_recipients(self, header, recipients, max_visible=None):
+        """
+        Add a big list of recipients to a header at once. The addresses are
+        validated and encoded in one pass and the header is folded to lines
+        of `MAX_LINE_LENGTH`.
+        Recipients beyond `max_visible` are not written in the header, they
+        are only added to `envelope_recipients`, so they receive the message
+        but the header keeps small.
+        :param header:      Recipients header: to, cc or bcc
+        :type header:       str
+        :param recipients:  Iterable of `address.Address`, (name, address)
+                            pairs or address strings
+        :param max_visible: Max recipients written in the header (None to
+                            write all of them)
+        :type max_visible:  int
+        :return:            New Header Value
+        :raises:            ValueError
+        """
+        header = Email.fix_header_name(header) or header
+        if header.lower() not in ('to', 'cc', 'bcc'):
+            raise ValueError('Not a recipients header: {}'.format(header))
+        addresses = []
+        for recipient in recipients:
+            if isinstance(recipient, six.string_types):
+                recipient = address.parse(recipient)
+            display_name, addr = recipient
+            addresses.append((display_name or '', address.validate_address(
+                addr.strip())))
+        if not addresses:
+            raise ValueError('Recipients not provided!')
+        if max_visible is not None:
+            self.envelope_recipients.extend(
+                addr for _, addr in addresses[max_visible:])
+            addresses = addresses[:max_visible]
+            if not addresses:
+                return ''
+        return self._set_addresses(header, addresses)
+
+    def add_body_text(self, body_plain=False, body_html=False,
+                      allow_8bit=False):
         """
         Add the Body Text to Email.
+        Each part is encoded as 7bit, quoted-printable or base64 depending on
+        its content (see `qreu.transfer.choose_transfer_encoding`).
         Rises AttributeError if email already has a body text.
         Rises ValueError if no body_plain or body_html provided.
         :param body_plain:  Plain Text for the Body
         :type body_plain:   str
         :param body_html:   HTML Text for the Body
         :type body_html:    str
+        :param allow_8bit:  Keep non ASCII text as 8bit. `mime_string` still
+                            renders it 7bit, `mime_bytes` and the senders
+                            with 8BITMIME send it as is
+        :type allow_8bit:   bool
         :return:            True if updated, Raises an exception if failed.
         :rtype:             bool
         """
@@ -338,23 +636,27 @@ class Email(object):
             # TODO: create a new "local" email to replace the SELF with new body
         if not (body_html or body_plain):
             raise ValueError('No HTML or TEXT provided')
-        body_plain = body_plain or html2text(body_html)
-        msg_plain = MIMEText(body_plain, _subtype='plain', _charset='utf-8')
+        body_plain = body_plain or html_to_text(body_html)
         msg_part = MIMEMultipart(_subtype='alternative')
-        msg_part.attach(msg_plain)
+        msg_part.attach(self._text_part(body_plain, 'plain', allow_8bit))
         if body_html:
-            msg_html = MIMEText(body_html, _subtype='html', _charset='utf-8')
-            msg_part.attach(msg_html)
+            msg_part.attach(self._text_part(body_html, 'html', allow_8bit))
         self.email.attach(msg_part)
         return True
 
+    @staticmethod
+    def _text_part(text, subtype, allow_8bit=False):
+        part = MIMENonMultipart('text', subtype)
+        transfer.set_text_payload(part, text, 'utf-8', allow_8bit=allow_8bit)
+        return part
+
     def remove_accent(self, text):
         from unidecode import unidecode
         return unidecode(text)
 
 
     def add_attachment(self, input_buff, attname=False, disposition='attachment',
-                       content_id=None):
+                       content_id=None, store=None):
         """
         Add an attachment file to the email
         :param input_buff:  Buffer of the file to attach (something to read)
@@ -365,11 +667,13 @@ class Email(object):
         :type disposition: str
         :param content_id: Content-ID header value, without surrounding <>
         :type content_id:  str
+        :param store:      Keep the content in this attachment store instead
+                           of the email, encoded only when rendered
+        :type store:       qreu.store.AttachmentStore
         :return:           True if Added, Exception if failed
         :rtype:            bool
         """
         from os.path import basename
-        import base64
 
         try:
             filename = attname or input_buff.name
@@ -381,37 +685,17 @@ class Email(object):
         if isinstance(content, six.text_type):  # Check for text/unicode type in both Python 2 and 3
             content = content.encode('utf-8')
 
-        # Base64 encode
-
-        # attachment_str = base64.b64encode(content).decode('ascii')
-        if six.PY2:
-            attachment_str = base64.encodestring(content).decode('ascii')
-        else:
-            attachment_str = base64.encodebytes(content).decode('ascii')
-
         # Guess MIME type
-        filetype = mimetypes.guess_type(filename)[0]
-        
-        # Ensure common Microsoft Office MIME types are available (especially for Python 2.7)
-        if not filetype:
-            office_extensions = {
-                '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-                '.doc': 'application/msword',
-                '.xls': 'application/vnd.ms-excel',
-                '.ppt': 'application/vnd.ms-powerpoint'
-            }
-            file_ext = filename.lower().split('.')[-1] if '.' in filename else ''
-            if '.' + file_ext in office_extensions:
-                filetype = office_extensions['.' + file_ext]
-        
-        maintype, subtype = 'application', 'octet-stream'
-        if filetype:
-            maintype, subtype = filetype.split('/')
+        maintype, subtype = guess_content_type(
+            filename, content[:SNIFF_SIZE]).split('/')
 
         # Create MIME part
-        attachment = MIMEBase(maintype, subtype)
+        if store is not None:
+            # Only a reference to the stored content is kept
+            attachment = StoredPart(
+                store, store.put(content), maintype, subtype)
+        else:
+            attachment = MIMEBase(maintype, subtype)
         attachment.add_header(
             'Content-Disposition',
             '%s; filename="%s"' % (
@@ -421,7 +705,8 @@ class Email(object):
         )
         if content_id:
             attachment.add_header('Content-ID', '<%s>' % content_id)
-        attachment.set_payload(attachment_str)
+        if store is None:
+            attachment.set_payload(transfer.encode_base64(content))
         attachment.add_header('Content-Transfer-Encoding', 'base64')
 
         self.email.attach(attachment)
@@ -439,7 +724,7 @@ class Email(object):
         """
         return (not self.is_forwarded and (
             bool(self.header('In-Reply-To'))
-            or bool(re.match(RE_PATTERNS, self.header('Subject', '')))
+            or is_reply_subject(self.header('Subject', ''))
         ))
 
     @property
@@ -450,7 +735,7 @@ class Email(object):
         https://en.wikipedia.org/wiki/List_of_email_subject_abbreviations
         :return: bool
         """
-        return bool(re.match(FW_PATTERNS, self.header('Subject', '')))
+        return is_forwarded_subject(self.header('Subject', ''))
 
     @property
     def is_auto_generated(self):
@@ -462,9 +747,20 @@ class Email(object):
         Clean subject without abbreviations
         :return: str
         """
-        subject = re.sub(RE_PATTERNS, '', self.header('Subject', ''))
-        subject = re.sub(FW_PATTERNS, '', subject)
-        return subject.strip()
+        return clean_subject(self.header('Subject', ''))
+
+    @property
+    def date(self):
+        """
+        Date header as a timezone aware datetime, parsed once while the
+        header does not change
+        :return: `datetime` or None if missing or not parseable
+        """
+        raw_date = self.email.get('Date')
+        cached = self.__dict__.get('_date_cache')
+        if cached is None or cached[0] != raw_date:
+            cached = self._date_cache = (raw_date, parse_date(raw_date))
+        return cached[1]
 
     @property
     def references(self):
@@ -523,16 +819,19 @@ class Email(object):
     @property
     def recipients(self):
         """
-        :return: `address.AddressList` with all recipients
+        :return: `address.AddressList` with all recipients, including the
+                 envelope only ones (see `add_recipients`)
         """
-        return self.to + self.cc + self.bcc
+        return (self.to + self.cc + self.bcc +
+                address.AddressList(self.envelope_recipients))
 
     @property
     def recipients_addresses(self):
         """
-        :return: `list` with all email addresses of the recipients in a list
+        :return: `list` with all email addresses of the recipients in a list,
+                 without duplicates (case and IDNA insensitive)
         """
-        return list(set(self.recipients.addresses))
+        return self.recipients.unique_addresses
 
     @property
     def body_parts(self):
@@ -565,19 +864,44 @@ class Email(object):
         base64 based string
         :return: Returns a Tuple generator as (AttachName, AttachContent)
         """
+        for attachment in self.attachment_parts:
+            # Not decoded: the content is the base64 encoded payload
+            yield {
+                'type': attachment.content_type,
+                'name': attachment.name,
+                'content': attachment.payload
+            }
+
+    @property
+    def attachment_parts(self):
+        """
+        Get all attachments of the email as descriptors giving streaming
+        access to the decoded content (see `qreu.attachment.Attachment`)
+        :return: Generator of `Attachment`
+        """
         for part in self.email.walk():
-            filename = part.get_filename()
-            if filename:
-                # Removed part.get_payload(decode=True)
-                # If we use decode=True content is b64decoded which is a raw content
-                payload = part.get_payload()
-                payload = payload.decode() if isinstance(payload, bytes) else payload
-                yield {
-                    'type': part.get_content_type(),
-                    'name': filename,
-                    'content': payload
-                }
+            if part.get_filename():
+                yield Attachment(part)
 
     @property
     def mime_string(self):
-        return self.email.as_string()
+        """
+        :return: The message as str, with the 8bit parts encoded to 7bit
+        """
+        return transfer.downgrade_8bit(self.email).as_string()
+
+    @property
+    def mime_bytes(self):
+        """
+        :return: The message as bytes, keeping the 8bit parts and the non
+                 ASCII addresses as they are (the transport needs 8BITMIME
+                 or SMTPUTF8)
+        """
+        return transfer.as_bytes(self.email)
+
+    @property
+    def has_8bit(self):
+        """
+        :return: True if the message has 8bit parts (see `mime_bytes`)
+        """
+        return transfer.has_8bit_parts(self.email)
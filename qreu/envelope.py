@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+Envelope planning for SMTP delivery: deduplicate the envelope recipients,
+group them by domain and split them in RCPT batches.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from collections import OrderedDict
+
+from qreu.address import normalize_address
+
+#: RFC 5321 (4.5.3.1.8) minimum number of recipients a server must accept
+DEFAULT_MAX_RECIPIENTS = 100
+
+
+class RecipientBatch(object):
+    """
+    Group of envelope recipients sent in the same SMTP transaction
+
+    :param domain:      Domain of the recipients, `None` if mixed domains
+    :type domain:       str
+    :param recipients:  Email addresses of the batch
+    :type recipients:   list
+    """
+    __slots__ = ('domain', 'recipients')
+
+    def __init__(self, domain, recipients):
+        self.domain = domain
+        self.recipients = recipients
+
+    def __len__(self):
+        return len(self.recipients)
+
+    def __iter__(self):
+        return iter(self.recipients)
+
+    def __repr__(self):
+        return '<RecipientBatch {} ({} recipients)>'.format(
+            self.domain, len(self.recipients))
+
+
+def dedup_recipients(addresses):
+    """
+    Remove duplicated addresses comparing their normalized form
+    (see `qreu.address.normalize_address`), keeping the first spelling and
+    the original order. Empty addresses are discarded.
+
+    :param addresses:   Email addresses
+    :type addresses:    list
+    :return:            `list` of email addresses
+    """
+    seen = set()
+    result = []
+    for addr in addresses:
+        key = normalize_address(addr)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(addr.strip())
+    return result
+
+
+def group_by_domain(addresses):
+    """
+    Group addresses by their normalized domain, keeping the order of the
+    first appearance of each domain.
+
+    :param addresses:   Email addresses
+    :type addresses:    list
+    :return:            `OrderedDict` as {domain: [addresses]}
+    """
+    groups = OrderedDict()
+    for addr in addresses:
+        domain = normalize_address(addr).rpartition('@')[2]
+        groups.setdefault(domain, []).append(addr)
+    return groups
+
+
+def split_batches(addresses, max_recipients=DEFAULT_MAX_RECIPIENTS,
+                  domain=None):
+    """
+    Split addresses in `RecipientBatch` of at most `max_recipients`
+
+    :param addresses:       Email addresses
+    :type addresses:        list
+    :param max_recipients:  Max recipients on each batch (no limit if falsy)
+    :type max_recipients:   int
+    :param domain:          Domain of the addresses, if any
+    :type domain:           str
+    :return:                `list` of `RecipientBatch`
+    """
+    if not max_recipients or max_recipients < 1:
+        max_recipients = len(addresses) or 1
+    return [
+        RecipientBatch(domain, addresses[i:i + max_recipients])
+        for i in range(0, len(addresses), max_recipients)
+    ]
+
+
+def plan_envelope(addresses, max_recipients=DEFAULT_MAX_RECIPIENTS,
+                  group_domains=True):
+    """
+    Build the RCPT batches to deliver a message to `addresses`.
+    Addresses are deduplicated and sorted by domain. If `group_domains`,
+    batches never mix recipients of different domains.
+
+    :param addresses:       Envelope recipients
+    :type addresses:        list
+    :param max_recipients:  Max recipients on each batch
+    :type max_recipients:   int
+    :param group_domains:   Group recipients by domain
+    :type group_domains:    bool
+    :return:                `list` of `RecipientBatch`
+    """
+    groups = group_by_domain(dedup_recipients(addresses))
+    if not group_domains:
+        addresses = [addr for group in groups.values() for addr in group]
+        return split_batches(addresses, max_recipients)
+    batches = []
+    for domain, group in groups.items():
+        batches.extend(split_batches(group, max_recipients, domain=domain))
+    return batches
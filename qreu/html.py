@@ -0,0 +1,187 @@
+# coding=utf-8
+"""
+HTML helpers: body extraction and cached HTML to plain text conversion.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import six
+from html2text import html2text
+
+BODY_OPEN_TAG = re.compile(r'<body(?:\s[^>]*)?>', re.IGNORECASE)
+BODY_CLOSE_TAG = re.compile(r'</body\s*>', re.IGNORECASE)
+HTML_CLOSE_TAG = re.compile(r'</html\s*>', re.IGNORECASE)
+
+
+def get_body_html(html):
+    """
+    Get the contents of the <body> element of an HTML document.
+
+    The document is scanned once, case insensitively, and only the body is
+    copied, keeping its new lines. If there is no closing tag the body ends
+    at the closing </html> tag or at the end of the document.
+    If there is no <body> the whole document is returned.
+
+    :param html:    HTML document
+    :type html:     str
+    :return:        Contents of the body, stripped
+    :rtype:         str
+    """
+    start = BODY_OPEN_TAG.search(html)
+    if not start:
+        return html.strip()
+    begin = start.end()
+    # Last closing tag, in any case: scan the closing tags backwards from
+    # the end, where it usually is
+    end = None
+    tag = len(html)
+    while True:
+        tag = html.rfind('</', begin, tag)
+        if tag < 0:
+            break
+        if BODY_CLOSE_TAG.match(html, tag):
+            end = tag
+            break
+    if end is None:
+        end_tag = HTML_CLOSE_TAG.search(html, begin)
+        end = end_tag.start() if end_tag else len(html)
+    return html[begin:end].strip()
+
+
+#: Default number of conversions kept by the cache
+DEFAULT_CACHE_SIZE = 128
+
+
+class HTMLTextCache(object):
+    """
+    Bounded LRU cache of HTML to plain text conversions, keyed on a content
+    hash of the HTML.
+
+    :param maxsize:     Max number of conversions kept (0 disables the cache)
+    :type maxsize:      int
+    :param converter:   Callable converting an HTML string to plain text
+                        (`html2text.html2text` by default)
+    :type converter:    callable
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, converter=None):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.maxsize = maxsize
+        self.converter = converter or html2text
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(html):
+        if isinstance(html, six.text_type):
+            try:
+                html = html.encode('utf-8')
+            except UnicodeEncodeError:
+                html = html.encode('utf-8', 'surrogatepass')
+        return hashlib.sha1(html).digest()
+
+    def convert(self, html):
+        """
+        Convert `html` to plain text, reusing a previous conversion of the
+        same HTML if available
+        :param html:    HTML text
+        :type html:     str
+        :return:        Plain text
+        :rtype:         str
+        """
+        if not self.maxsize:
+            with self._lock:
+                self.misses += 1
+            return self.converter(html)
+        key = self._key(html)
+        with self._lock:
+            try:
+                text = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self._data[key] = text
+                self.hits += 1
+                return text
+            converter = self.converter
+        text = converter(html)
+        with self._lock:
+            self._data[key] = text
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return text
+
+    def resize(self, maxsize):
+        """
+        Change the max number of conversions kept, dropping the least
+        recently used ones if needed
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > max(maxsize, 0):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all the cached conversions and reset the stats"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    @property
+    def stats(self):
+        """
+        :return: `dict` with size, maxsize, hits, misses and hit_rate
+        """
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+_HTML_TEXT_CACHE = HTMLTextCache()
+
+
+def get_html_text_cache():
+    """
+    :return: The `HTMLTextCache` used by `html_to_text`
+    """
+    return _HTML_TEXT_CACHE
+
+
+def set_html_converter(converter):
+    """
+    Set the function used to convert HTML to plain text (a callable taking
+    an HTML string and returning text). `None` restores `html2text`.
+    The cached conversions are discarded.
+    """
+    cache = get_html_text_cache()
+    cache.converter = converter or html2text
+    cache.clear()
+
+
+def html_to_text(html):
+    """
+    Convert `html` to plain text using the cached converter
+    :param html:    HTML text
+    :type html:     str
+    :return:        Plain text
+    :rtype:         str
+    """
+    return _HTML_TEXT_CACHE.convert(html)
@@ -9,13 +9,18 @@
     :license: BSD, see LICENSE for more details.
 """
 import copy
+import threading
+import weakref
 
 # since each thread has its own greenlet we can just use those as identifiers
 # for the context.  If greenlets are not available we fall back to the
 # current thread ident depending on where it is.
+# The greenlet itself is not used as key, so the storage does not keep dead
+# greenlets alive.
 try:
-    from greenlet import getcurrent as get_ident
+    from greenlet import getcurrent
 except ImportError:
+    getcurrent = None
     try:
         from thread import get_ident
     except ImportError:  # noqa
@@ -23,6 +28,37 @@ except ImportError:
             from _thread import get_ident  # noqa
         except ImportError:  # noqa
             from dummy_thread import get_ident  # noqa
+else:
+    def get_ident():
+        return id(getcurrent())
+
+
+class _OwnerToken(object):
+    """Object only referenced by the thread local storage of its thread,
+    so it dies with the thread."""
+    __slots__ = ('__weakref__',)
+
+
+_thread_tokens = threading.local()
+
+
+def _owner_ref(callback):
+    """Weak reference to the owner of the current context (the greenlet or
+    the thread) calling `callback` when the owner dies.
+    """
+    if getcurrent is not None:
+        return weakref.ref(getcurrent(), callback)
+    try:
+        token = _thread_tokens.token
+    except AttributeError:
+        token = _thread_tokens.token = _OwnerToken()
+    return weakref.ref(token, callback)
+
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python 2
+    ContextVar = None
 
 
 def release_local(local):
@@ -49,21 +85,47 @@ def release_local(local):
 
 
 class Local(object):
-    __slots__ = ('__storage__', '__ident_func__')
+
+    """Storage of attributes by context (greenlet or thread).
+
+    The storage of each context is released when its owner dies, so a
+    greenlet or thread that ends without releasing the local does not leak
+    it.  Only the default ident function is tracked; with a custom one the
+    storage must be released with :func:`release_local` or
+    :meth:`LocalManager.cleanup`.
+    """
+    __slots__ = ('__storage__', '__ident_func__', '__owners__')
 
     def __init__(self):
         object.__setattr__(self, '__storage__', {})
         object.__setattr__(self, '__ident_func__', get_ident)
+        object.__setattr__(self, '__owners__', {})
 
     def __iter__(self):
         return iter(self.__storage__.items())
 
+    def __len__(self):
+        """Number of contexts with storage"""
+        return len(self.__storage__)
+
     def __call__(self, proxy):
         """Create a proxy for a name."""
         return LocalProxy(self, proxy)
 
     def __release_local__(self):
-        self.__storage__.pop(self.__ident_func__(), None)
+        ident = self.__ident_func__()
+        self.__storage__.pop(ident, None)
+        self.__owners__.pop(ident, None)
+
+    def __track_owner__(self, ident):
+        storage = self.__storage__
+        owners = self.__owners__
+
+        def release(ref):
+            if owners.get(ident) is ref:
+                owners.pop(ident, None)
+                storage.pop(ident, None)
+        owners[ident] = _owner_ref(release)
 
     def __getattr__(self, name):
         try:
@@ -78,6 +140,8 @@ class Local(object):
             storage[ident][name] = value
         except KeyError:
             storage[ident] = {name: value}
+            if self.__ident_func__ is get_ident:
+                self.__track_owner__(ident)
 
     def __delattr__(self, name):
         try:
@@ -85,6 +149,23 @@ class Local(object):
         except KeyError:
             raise AttributeError(name)
 
+    def sweep(self):
+        """Release the storage of the contexts whose owner is dead.  Not
+        needed in general, the storage is released when the owner dies, but
+        it can be called periodically as a safety net.
+
+        :return: Number of contexts released
+        """
+        storage = self.__storage__
+        owners = self.__owners__
+        released = 0
+        for ident, ref in list(owners.items()):
+            if ref() is None and owners.get(ident) is ref:
+                owners.pop(ident, None)
+                storage.pop(ident, None)
+                released += 1
+        return released
+
 
 class LocalStack(object):
 
@@ -116,10 +197,15 @@ class LocalStack(object):
 
     def __init__(self):
         self._local = Local()
+        self._storage = self._local.__storage__
 
     def __release_local__(self):
         self._local.__release_local__()
 
+    def __len__(self):
+        """Number of contexts with a stack"""
+        return len(self._local)
+
     def _get__ident_func__(self):
         return self._local.__ident_func__
 
@@ -138,7 +224,8 @@ class LocalStack(object):
 
     def push(self, obj):
         """Pushes a new item to the stack"""
-        rv = getattr(self._local, 'stack', None)
+        values = self._storage.get(self._local.__ident_func__())
+        rv = values.get('stack') if values else None
         if rv is None:
             self._local.stack = rv = []
         rv.append(obj)
@@ -148,7 +235,8 @@ class LocalStack(object):
         """Removes the topmost item from the stack, will return the
         old value or `None` if the stack was already empty.
         """
-        stack = getattr(self._local, 'stack', None)
+        values = self._storage.get(self._local.__ident_func__())
+        stack = values.get('stack') if values else None
         if stack is None:
             return None
         elif len(stack) == 1:
@@ -162,10 +250,106 @@ class LocalStack(object):
         """The topmost item on the stack.  If the stack is empty,
         `None` is returned.
         """
-        try:
-            return self._local.stack[-1]
-        except (AttributeError, IndexError):
+        # Straight to the storage, skipping `Local.__getattr__`
+        values = self._storage.get(self._local.__ident_func__())
+        if values:
+            stack = values.get('stack')
+            if stack:
+                return stack[-1]
+        return None
+
+    def sweep(self):
+        """Release the stacks of the contexts whose owner is dead.
+
+        :return: Number of stacks released
+        """
+        return self._local.sweep()
+
+    def stats(self):
+        """Size metrics of the stack storage
+
+        :return: `dict` with the number of `contexts` with a stack and the
+                 total number of `items` pushed
+        """
+        stacks = [
+            values.get('stack', ())
+            for values in list(self._storage.values())
+        ]
+        return {
+            'contexts': len(stacks),
+            'items': sum(len(stack) for stack in stacks),
+        }
+
+
+class ContextStack(object):
+
+    """A :class:`LocalStack` alike stack stored in a
+    :class:`contextvars.ContextVar`.  The stack is an immutable tuple, so
+    lookups do not need any ident call, asyncio tasks see the stack of the
+    context they were created from and nothing is kept once a thread or a
+    task finishes.
+
+        >>> cs = ContextStack('example')
+        >>> cs.push(42)
+        >>> cs.top
+        42
+        >>> cs.pop()
+        42
+        >>> cs.top is None
+        True
+
+    Only available where :mod:`contextvars` exists (Python 3.7+).
+    """
+    __slots__ = ('_var',)
+
+    def __init__(self, name='stack'):
+        if ContextVar is None:
+            raise RuntimeError('contextvars is not available')
+        self._var = ContextVar(name, default=())
+
+    def __release_local__(self):
+        self._var.set(())
+
+    def __call__(self):
+        def _lookup():
+            rv = self.top
+            if rv is None:
+                raise RuntimeError('object unbound')
+            return rv
+        return LocalProxy(_lookup)
+
+    def push(self, obj):
+        """Pushes a new item to the stack"""
+        rv = self._var.get() + (obj,)
+        self._var.set(rv)
+        return rv
+
+    def pop(self):
+        """Removes the topmost item from the stack, will return the
+        old value or `None` if the stack was already empty.
+        """
+        stack = self._var.get()
+        if not stack:
             return None
+        self._var.set(stack[:-1])
+        return stack[-1]
+
+    @property
+    def top(self):
+        """The topmost item on the stack.  If the stack is empty,
+        `None` is returned.
+        """
+        stack = self._var.get()
+        return stack[-1] if stack else None
+
+
+def context_stack(name='stack'):
+    """Returns a :class:`ContextStack` or, without :mod:`contextvars`, a
+    :class:`LocalStack`.
+    """
+    if ContextVar is None:
+        return LocalStack()
+    return ContextStack(name)
 
 
 class LocalManager(object):
@@ -220,6 +404,14 @@ class LocalManager(object):
         for local in self.locals:
             release_local(local)
 
+    def sweep(self):
+        """Release the data left in the locals by dead contexts.  Can be
+        called periodically by long running processes.
+
+        :return: Number of contexts released
+        """
+        return sum(local.sweep() for local in self.locals)
+
     def make_middleware(self, app):
         """Wrap a WSGI application so that cleaning up happens after
         request end.
@@ -286,7 +478,8 @@ class LocalProxy(object):
     .. versionchanged:: 0.6.1
        The class can be instantiated with a callable as well now.
     """
-    __slots__ = ('__local', '__dict__', '__name__', '__wrapped__')
+    __slots__ = ('__local', '__dict__', '__name__', '__wrapped__',
+                 '__lookup')
 
     def __init__(self, local, name=None):
         object.__setattr__(self, '_LocalProxy__local', local)
@@ -295,18 +488,22 @@ class LocalProxy(object):
             # "local" is a callable that is not an instance of Local or
             # LocalManager: mark it as a wrapped function.
             object.__setattr__(self, '__wrapped__', local)
+            lookup = local
+        else:
+            def lookup():
+                try:
+                    return getattr(local, name)
+                except AttributeError:
+                    raise RuntimeError('no object bound to %s' % name)
+        # Resolved once, so each access is a single call
+        object.__setattr__(self, '_LocalProxy__lookup', lookup)
 
     def _get_current_object(self):
         """Return the current object.  This is useful if you want the real
         object behind the proxy at a time for performance reasons or because
         you want to pass the object into a different context.
         """
-        if not hasattr(self.__local, '__release_local__'):
-            return self.__local()
-        try:
-            return getattr(self.__local, self.__name__)
-        except AttributeError:
-            raise RuntimeError('no object bound to %s' % self.__name__)
+        return self.__lookup()
 
     @property
     def __dict__(self):
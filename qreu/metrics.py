@@ -0,0 +1,162 @@
+# coding=utf-8
+"""
+Instrumentation of the send path: hooks called by the senders and an
+in-memory metrics collector with Prometheus text export.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import OrderedDict
+
+#: Phases timed by the senders
+PHASES = ('render', 'recipients', 'connect', 'transaction', 'send')
+
+
+class SendHook(object):
+    """
+    Base class of the send hooks, all methods do nothing. Add hooks to a
+    sender with `Sender.add_hook`.
+    """
+
+    def pre_send(self, sender, mail):
+        """
+        Called before sending `mail`
+        """
+
+    def post_send(self, sender, mail, result, error, elapsed):
+        """
+        Called after sending `mail`
+        :param result:  Result of `sendmail` (None on error)
+        :param error:   Exception raised by `sendmail` or None
+        :param elapsed: Seconds spent sending
+        """
+
+    def timing(self, sender, phase, elapsed):
+        """
+        Called at the end of each timed phase of the send path
+        :param phase:   Name of the phase (see `PHASES`)
+        :param elapsed: Seconds spent in the phase
+        """
+
+    def count(self, sender, name, value=1):
+        """
+        Called to increment the counter `name` (messages, bytes, recipients,
+        connections...)
+        """
+
+
+class TimerStats(object):
+    """Count, sum, min and max of the observations of a timer"""
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count, 'total': self.total, 'mean': self.mean,
+            'min': self.min, 'max': self.max,
+        }
+
+
+class MetricsCollector(SendHook):
+    """
+    Thread safe in-memory collector of the send metrics
+
+    Counters: messages_sent, messages_failed, bytes_sent, recipients,
+    transactions, connections_opened, connections_reused,
+    connection_failures, retries and reconnections.
+    Timers: one by phase of `PHASES`.
+
+    :param prefix:  Prefix of the Prometheus metric names
+    :type prefix:   str
+    """
+
+    def __init__(self, prefix='qreu'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.counters = OrderedDict()
+        self.timers = OrderedDict()
+
+    def __repr__(self):
+        return '<MetricsCollector {}>'.format(dict(self.counters))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, phase, elapsed):
+        with self._lock:
+            stats = self.timers.get(phase)
+            if stats is None:
+                stats = self.timers[phase] = TimerStats()
+            stats.observe(elapsed)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def snapshot(self):
+        """
+        :return: `dict` as {'counters': {name: value},
+                 'timers': {phase: {count, total, mean, min, max}}}
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': dict(
+                    (phase, stats.as_dict())
+                    for phase, stats in self.timers.items()
+                ),
+            }
+
+    def to_prometheus(self):
+        """
+        Export the metrics in the Prometheus text format: counters as
+        `<prefix>_<name>_total` and timers as the summary
+        `<prefix>_phase_seconds` labeled by phase.
+        :return: str
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = '{}_{}_total'.format(self.prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        if snapshot['timers']:
+            metric = '{}_phase_seconds'.format(self.prefix)
+            lines.append('# TYPE {} summary'.format(metric))
+            for phase, stats in sorted(snapshot['timers'].items()):
+                lines.append('{}_count{{phase="{}"}} {}'.format(
+                    metric, phase, stats['count']))
+                lines.append('{}_sum{{phase="{}"}} {!r}'.format(
+                    metric, phase, stats['total']))
+        return '\n'.join(lines) + '\n'
+
+    def post_send(self, sender, mail, result, error, elapsed):
+        if error is None:
+            self.increment('messages_sent')
+        else:
+            self.increment('messages_failed')
+
+    def timing(self, sender, phase, elapsed):
+        self.observe(phase, elapsed)
+
+    def count(self, sender, name, value=1):
+        self.increment(name, value)
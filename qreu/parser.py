@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+Incremental parsing of messages received in chunks.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import re
+from email.feedparser import FeedParser
+
+import six
+
+from qreu.spool import DEFAULT_SPOOL_THRESHOLD, SpooledMessage
+
+HEADER_END = re.compile(r'\r?\n\r?\n')
+#: Size of the chunks read by `feed_file`
+CHUNK_SIZE = 64 * 1024
+
+
+class EmailFeedParser(object):
+    """
+    Parse a message as its chunks arrive:
+
+        parser = Email.feed_parser()
+        for chunk in chunks:
+            parser.feed(chunk)
+            if parser.headers is not None:
+                route(parser.headers['To'])
+        mail = parser.close()
+
+    The headers are available as soon as the header block is complete and
+    part payloads bigger than `spool_threshold` are kept in temporary files
+    (see `qreu.spool.SpooledMessage`).
+
+    :param spool_threshold: Max size of the payloads kept in memory (None to
+                            keep all of them)
+    :type spool_threshold:  int
+    """
+
+    def __init__(self, spool_threshold=DEFAULT_SPOOL_THRESHOLD):
+        self.spool_threshold = spool_threshold
+        self._root = None
+        self._parser = FeedParser(_factory=self._factory)
+        # The factory may be probed by FeedParser on Python 3
+        self._root = None
+        self._headers_done = False
+        self._tail = ''
+        self._closed = False
+
+    def _factory(self, **kwargs):
+        message = SpooledMessage(self.spool_threshold, **kwargs)
+        if self._root is None:
+            self._root = message
+        return message
+
+    def feed(self, data):
+        """
+        Feed the next chunk of the message
+        :param data:    Chunk of the raw message
+        :type data:     bytes or str
+        """
+        if self._closed:
+            raise ValueError('Feeding a closed parser')
+        if not six.PY2 and isinstance(data, bytes):
+            # As BytesFeedParser does, 8bit data is kept as surrogates
+            data = data.decode('ascii', 'surrogateescape')
+        if not data:
+            return
+        if not self._headers_done:
+            scan = self._tail + data
+            if (HEADER_END.search(scan)
+                    or (self._root is None and scan.lstrip('\r')[:1] == '\n')):
+                self._headers_done = True
+            self._tail = scan[-3:]
+        self._parser.feed(data)
+
+    def feed_file(self, input_file, chunk_size=CHUNK_SIZE):
+        """
+        Feed the contents of `input_file` in chunks
+        :param input_file:  File object to read the message from
+        """
+        chunk = input_file.read(chunk_size)
+        while chunk:
+            self.feed(chunk)
+            chunk = input_file.read(chunk_size)
+
+    @property
+    def headers(self):
+        """
+        :return: The message (`email.message.Message`) with its headers once
+                 the header block is complete, None before
+        """
+        if self._headers_done or self._closed:
+            return self._root
+        return None
+
+    @property
+    def headers_complete(self):
+        return self.headers is not None
+
+    def close(self):
+        """
+        End the parsing
+        :return: `qreu.Email` with the parsed message
+        """
+        from qreu.email import Email
+        root = self._parser.close()
+        self._closed = True
+        mail = Email()
+        mail.email = root
+        return mail
+
@@ -0,0 +1,386 @@
+# coding=utf-8
+"""
+Opt-in profiling of the Email operations and the senders: per message cost
+breakdown (header encoding, html2text, base64, serialization, network...),
+cProfile stats and tracemalloc allocations.
+
+Nothing is patched until profiling starts, so it has no cost when disabled.
+Enable it with the `Profiler` context manager or, for a whole process, with
+the QREU_PROFILE environment variable (see `enable_from_env`).
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import atexit
+import os
+import random
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+from timeit import default_timer
+
+import six
+
+try:
+    import cProfile
+    import pstats
+except ImportError:  # pragma: no cover
+    cProfile = pstats = None
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+#: Environment variable enabling the profiling of the whole process.
+#: Its value is the path of the report ("1" writes it to stderr)
+ENV_VAR = 'QREU_PROFILE'
+
+# (module, class or None, attribute, category)
+TARGETS = [
+    ('qreu.email', 'Email', '__init__', 'build'),
+    ('qreu.email', 'Email', 'add_header', 'headers'),
+    ('qreu.email', 'Email', 'add_body_text', 'body'),
+    ('qreu.email', 'Email', 'add_attachment', 'attachments'),
+    ('qreu.email', 'Email', 'parse', 'parse'),
+    ('qreu.email', 'Email', 'forward', 'forward'),
+    ('qreu.email', 'Email', 'body_parts', 'body_parts'),
+    ('qreu.email', 'Email', 'mime_string', 'serialization'),
+    ('qreu.email', 'Email', 'mime_bytes', 'serialization'),
+    ('qreu.email', None, 'html_to_text', 'html2text'),
+    ('qreu.transfer', None, 'encode_base64', 'base64'),
+]
+
+
+class MessageCost(object):
+    """Cost breakdown of one message: exclusive seconds by category"""
+    __slots__ = ('label', 'costs', 'calls', 'allocated')
+
+    def __init__(self, label):
+        self.label = label
+        self.costs = OrderedDict()
+        self.calls = 0
+        self.allocated = 0
+
+    def __repr__(self):
+        return '<MessageCost {} {:.6f}s>'.format(self.label, self.total)
+
+    @property
+    def total(self):
+        return sum(self.costs.values())
+
+    def add(self, category, elapsed):
+        self.costs[category] = self.costs.get(category, 0.0) + elapsed
+        self.calls += 1
+
+
+def _label(mail):
+    try:
+        label = mail.header('Message-ID') or mail.subject
+    except Exception:
+        label = None
+    return six.text_type(label or 'mail at 0x{:x}'.format(id(mail)))
+
+
+def _sender_classes():
+    from qreu.sendcontext import Sender
+    pending, seen = [Sender], []
+    while pending:
+        klass = pending.pop()
+        if klass not in seen:
+            seen.append(klass)
+            pending.extend(klass.__subclasses__())
+    return seen
+
+
+class Profiler(object):
+    """
+    Profile the Email entry points and the `sendmail` of all the senders
+    while active:
+
+        with Profiler(output='/tmp/qreu.prof') as profiler:
+            mail.send()
+        print(profiler.report())
+
+    Costs are exclusive: the time of a nested operation (e.g. html2text in
+    add_body_text) is only counted in its own category.
+
+    Each thread has its own cProfile profile. Only one profile can be
+    active at a time on Python 3.12+, so a call made while another one
+    (or another profiling tool) is active is timed but not added to the
+    cProfile stats. Profiling errors never reach the profiled code.
+
+    :param cprofile:    Also collect cProfile stats of the sampled messages
+    :type cprofile:     bool
+    :param memory:      Track the memory allocated by each message with
+                        tracemalloc (Python 3)
+    :type memory:       bool
+    :param sample:      Fraction of the top level operations profiled
+    :type sample:       float
+    :param output:      Path to dump the cProfile stats on exit
+    :type output:       str
+    """
+
+    def __init__(self, cprofile=True, memory=False, sample=1.0, output=None):
+        self.cprofile = cprofile and cProfile is not None
+        self.memory = memory and tracemalloc is not None
+        self.sample = sample
+        self.output = output
+        self.messages = OrderedDict()
+        self.totals = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches = []
+        self._profiles = []
+        self._started_tracemalloc = False
+        self._email_class = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.stop()
+
+    @property
+    def active(self):
+        return bool(self._patches)
+
+    def start(self):
+        if self.active:
+            return self
+        from qreu.email import Email
+        self._email_class = Email
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        for module_name, class_name, attr, category in TARGETS:
+            module = sys.modules.get(module_name) or __import__(
+                module_name, fromlist=[str('_')])
+            owner = getattr(module, class_name) if class_name else module
+            self._patch(owner, attr, category)
+        for klass in _sender_classes():
+            if 'sendmail' in vars(klass):
+                self._patch(klass, 'sendmail', 'network')
+        return self
+
+    def stop(self):
+        while self._patches:
+            owner, attr, original = self._patches.pop()
+            setattr(owner, attr, original)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        stats = self.stats()
+        if stats is not None and self.output:
+            stats.dump_stats(self.output)
+
+    def _patch(self, owner, attr, category):
+        original = vars(owner)[attr] if isinstance(owner, type) else \
+            getattr(owner, attr)
+        if isinstance(original, property):
+            patched = property(
+                self._wrap(original.fget, category), original.fset,
+                original.fdel, original.__doc__)
+        elif isinstance(original, staticmethod):
+            patched = staticmethod(
+                self._wrap(original.__get__(None, owner), category))
+        else:
+            patched = self._wrap(original, category)
+        self._patches.append((owner, attr, original))
+        setattr(owner, attr, patched)
+
+    def _wrap(self, func, category):
+        profiler = self
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return profiler._call(category, func, args, kwargs)
+        return wrapper
+
+    def _record(self, mail):
+        """Record of `mail`, costs without message go to 'unattributed'"""
+        key = id(mail) if mail is not None else None
+        with self._lock:
+            record = self.messages.get(key)
+            if record is None:
+                label = _label(mail) if mail is not None else 'unattributed'
+                record = self.messages[key] = MessageCost(label)
+        return record
+
+    def _enable_profile(self):
+        """
+        Enable the cProfile profile of the current thread
+        :return: The enabled profile or None
+        """
+        local = self._local
+        profile = getattr(local, 'profile', None)
+        if profile is None:
+            profile = local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active (Python 3.12+ only allows one)
+            return None
+        return profile
+
+    def _call(self, category, func, args, kwargs):
+        local = self._local
+        stack = getattr(local, 'stack', None)
+        if stack is None:
+            stack = local.stack = []
+        outermost = not stack
+        if outermost:
+            local.sampled = random.random() < self.sample
+        if not local.sampled:
+            # Keep the depth, so nested calls are not sampled again
+            stack.append(None)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stack.pop()
+
+        # Message of the call: the Email (self) or the mail sent
+        email_class = self._email_class
+        mail = None
+        if args and isinstance(args[0], email_class):
+            mail = args[0]
+        elif category == 'network' and len(args) > 1:
+            mail = args[1]
+        frame = [category, mail, 0.0]
+        profile = None
+        memory_start = None
+        if outermost:
+            try:
+                if self.cprofile:
+                    profile = self._enable_profile()
+                if self.memory:
+                    memory_start = tracemalloc.get_traced_memory()[0]
+            except Exception:
+                pass
+        stack.append(frame)
+        start = default_timer()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            elapsed = default_timer() - start
+            stack.pop()
+            if profile is not None:
+                profile.disable()
+            try:
+                self._account(
+                    frame, stack, result, elapsed, outermost, memory_start)
+            except Exception:
+                # Never break the profiled code
+                pass
+
+    def _account(self, frame, stack, result, elapsed, outermost,
+                 memory_start):
+        """Add the cost of a finished call to its message and category"""
+        category = frame[0]
+        email_class = self._email_class
+        if frame[1] is None and isinstance(result, email_class):
+            # Email.parse
+            frame[1] = result
+        mail = frame[1]
+        if mail is None and stack:
+            mail = next(
+                (f[1] for f in reversed(stack) if f[1] is not None), None)
+        if stack:
+            stack[-1][2] += elapsed
+        exclusive = elapsed - frame[2]
+        record = self._record(mail)
+        record.add(category, exclusive)
+        with self._lock:
+            count, total = self.totals.get(category, (0, 0.0))
+            self.totals[category] = (count + 1, total + exclusive)
+        if outermost:
+            if mail is not None:
+                # Headers may be set after the record was created
+                record.label = _label(mail)
+            if memory_start is not None and tracemalloc.is_tracing():
+                record.allocated += max(
+                    tracemalloc.get_traced_memory()[0] - memory_start, 0)
+
+    def stats(self):
+        """
+        :return: `pstats.Stats` of the cProfile profiles of all the threads
+                 or None
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        result = None
+        for profile in profiles:
+            try:
+                stats = pstats.Stats(profile)
+            except TypeError:
+                # Never enabled
+                continue
+            if result is None:
+                result = stats
+            else:
+                result.add(stats)
+        return result
+
+    def slowest(self, number=10):
+        """
+        :return: `list` of the `number` most expensive `MessageCost`
+        """
+        return sorted(
+            self.messages.values(), key=lambda record: record.total,
+            reverse=True)[:number]
+
+    def report(self, number=10):
+        """
+        Aggregated costs by category and the breakdown of the slowest
+        messages
+        :return: str
+        """
+        lines = ['qreu profile: {} messages'.format(len(self.messages)), '']
+        lines.append('{:<16} {:>8} {:>12}'.format('category', 'calls', 'seconds'))
+        for category, (count, total) in sorted(
+                self.totals.items(), key=lambda item: -item[1][1]):
+            lines.append('{:<16} {:>8} {:>12.6f}'.format(category, count, total))
+        lines.extend(['', 'Slowest messages:'])
+        for record in self.slowest(number):
+            breakdown = ', '.join(
+                '{} {:.6f}'.format(category, seconds)
+                for category, seconds in sorted(
+                    record.costs.items(), key=lambda item: -item[1]))
+            line = '{:.6f}s {}: {}'.format(record.total, record.label, breakdown)
+            if self.memory:
+                line += ' ({} bytes allocated)'.format(record.allocated)
+            lines.append(line)
+        return '\n'.join(lines) + '\n'
+
+
+def enable_from_env(environ=None):
+    """
+    Start a process wide `Profiler` if QREU_PROFILE is set, writing its
+    report on exit to the path of the variable (or to stderr if "1"). The
+    cProfile stats are dumped next to the report with ".prof" appended.
+
+    :return: The started `Profiler` or None
+    """
+    environ = os.environ if environ is None else environ
+    value = environ.get(ENV_VAR, '')
+    if not value or value == '0':
+        return None
+    path = None if value == '1' else value
+    profiler = Profiler(
+        memory=environ.get(ENV_VAR + '_MEMORY', '') not in ('', '0'),
+        sample=float(environ.get(ENV_VAR + '_SAMPLE', 1.0)),
+        output=path and path + '.prof')
+
+    def dump():
+        profiler.stop()
+        if path:
+            with open(path, 'w') as writer:
+                writer.write(profiler.report())
+        else:
+            sys.stderr.write(profiler.report())
+    atexit.register(dump)
+    return profiler.start()
@@ -0,0 +1,321 @@
+# coding=utf-8
+"""
+Rate limiting of the senders: token buckets per sender, per from address
+and per recipient domain, slowed down (AIMD) when the server signals
+throttling and sped up again while the messages go through.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import threading
+import time
+from smtplib import SMTPRecipientsRefused, SMTPResponseException
+from timeit import default_timer
+
+from qreu.address import Address, normalize_address
+from qreu.metrics import SendHook
+
+#: SMTP replies (and HTTP statuses) meaning the server throttles the client
+THROTTLE_CODES = (421, 429, 451)
+#: Number of from address or domain buckets above which the idle ones are
+#: dropped (see `TokenBucket.idle`)
+MAX_IDLE_BUCKETS = 1024
+
+
+def throttle_code(error):
+    """
+    :param error:   Exception raised sending a message
+    :return:        The code of `error` if it means the server throttles
+                    the client (see `THROTTLE_CODES`), None otherwise
+    """
+    if isinstance(error, SMTPRecipientsRefused):
+        for code, _ in error.recipients.values():
+            if code in THROTTLE_CODES:
+                return code
+        return None
+    if isinstance(error, SMTPResponseException):
+        code = error.smtp_code
+    else:
+        # HTTP senders (e.g. MicrosoftGraphSender)
+        code = getattr(error, 'status_code', None)
+    if code in THROTTLE_CODES:
+        return code
+    return None
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket: `rate` tokens are added every `period`
+    seconds, up to `burst`. `reserve` takes the tokens at once and returns
+    the time to wait before using them, so callers (threads or asyncio
+    tasks) are scheduled one after the other without holding the lock while
+    they wait.
+
+    The rate is adaptive: `throttle` multiplies it by `decrease` (not below
+    `min_rate`) and `recover` adds `increase` times the configured rate,
+    up to it.
+
+    :param rate:        Tokens added each period
+    :type rate:         float
+    :param period:      Seconds of the period (e.g. 60 for a rate per minute)
+    :type period:       float
+    :param burst:       Max tokens saved while idle (default 1, no bursts)
+    :type burst:        float
+    :param min_rate:    Min tokens each period when throttled (default 1%
+                        of the rate)
+    :type min_rate:     float
+    :param decrease:    Factor applied to the rate on throttling
+    :type decrease:     float
+    :param increase:    Fraction of the rate recovered on each success
+    :type increase:     float
+    :param clock:       Function returning the current time
+    """
+
+    def __init__(self, rate, period=1.0, burst=None, min_rate=None,
+                 decrease=0.5, increase=0.02, clock=default_timer):
+        if rate <= 0 or period <= 0:
+            raise ValueError('The rate and the period must be positive')
+        self.max_rate = float(rate) / period
+        self.rate = self.max_rate
+        if min_rate is None:
+            self.min_rate = self.max_rate / 100
+        else:
+            self.min_rate = min(float(min_rate) / period, self.max_rate)
+        self.burst = float(burst if burst is not None else 1)
+        self.decrease = decrease
+        self.increase = increase
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._decreased = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<TokenBucket {:.3f}/s of {:.3f}/s>'.format(
+            self.rate, self.max_rate)
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, tokens=1):
+        """
+        Take `tokens` from the bucket, even if they are not available yet
+        :return: Seconds to wait before using them (0 if available now)
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self._tokens -= tokens
+            ready = self._updated + max(-self._tokens, 0) / self.rate
+            return max(ready - now, 0)
+
+    def try_acquire(self, tokens=1):
+        """
+        Take `tokens` from the bucket only if they are available now
+        :return: True if taken
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if self._updated > now or self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens=1, sleep=time.sleep):
+        """
+        Take `tokens` from the bucket waiting until they are available
+        :return: Seconds waited
+        """
+        delay = self.reserve(tokens)
+        if delay:
+            sleep(delay)
+        return delay
+
+    def throttle(self, retry_after=None):
+        """
+        Slow down: decrease the rate (once per interval between tokens,
+        the concurrent failures of a burst count once) and drop the saved
+        tokens
+        :param retry_after: Seconds without tokens asked by the server
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            if (self._decreased is None
+                    or now - self._decreased >= 1.0 / self.rate):
+                self.rate = max(self.rate * self.decrease, self.min_rate)
+                self._decreased = now
+            self._tokens = min(self._tokens, 0)
+            if retry_after:
+                self._updated = max(self._updated, now + retry_after)
+
+    @property
+    def idle(self):
+        """
+        :return: True if the bucket is full and at the configured rate, as
+                 a new one would be
+        """
+        with self._lock:
+            self._refill(self.clock())
+            return self.rate >= self.max_rate and self._tokens >= self.burst
+
+    def recover(self):
+        """
+        Speed up after a success, up to the configured rate
+        """
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = min(
+                self.rate + self.max_rate * self.increase, self.max_rate)
+
+
+class RateLimiter(SendHook):
+    """
+    Send hook limiting the messages sent each `period`: in total (`rate`),
+    for each from address (`per_from`) and for each recipient domain
+    (`per_domain`, or the rate in `domains` for the given domains). Add it
+    to any sender with `Sender.add_hook`, the same limiter can be shared by
+    several senders and threads.
+
+    `pre_send` waits until the message can be sent and `post_send` adapts
+    the rates to the result (see `TokenBucket.throttle`). Asyncio code
+    must not block the event loop: call the limiter instead of adding it
+    to the sender::
+
+        await asyncio.sleep(limiter.reserve(mail))
+        try:
+            result = sender.deliver(mail)
+        except Exception as err:
+            limiter.feedback(mail, err)
+            raise
+        limiter.feedback(mail)
+
+    :param rate:        Messages each period of the senders using it
+    :type rate:         float
+    :param per_from:    Messages each period of each from address
+    :type per_from:     float
+    :param per_domain:  Messages each period to each recipient domain
+    :type per_domain:   float
+    :param domains:     Messages each period to the given domains, as
+                        {domain: rate}
+    :type domains:      dict
+    :param period:      Seconds of the period (e.g. 60 for rates per minute)
+    :type period:       float
+    :param sleep:       Function to wait (for testing)
+    :param max_idle:    Number of from address or domain buckets above which
+                        the idle ones are dropped
+    :type max_idle:     int
+    :param bucket_args: Arguments of the `TokenBucket` (burst, min_rate,
+                        decrease, increase, clock)
+    """
+
+    def __init__(self, rate=None, per_from=None, per_domain=None,
+                 domains=None, period=1.0, sleep=time.sleep,
+                 max_idle=MAX_IDLE_BUCKETS, **bucket_args):
+        self.period = period
+        self.sleep = sleep
+        self.max_idle = max_idle
+        self._prune_size = max_idle
+        self._bucket_args = bucket_args
+        self._bucket = None
+        if rate:
+            self._bucket = self._new_bucket(rate)
+        self._per_from = per_from
+        self._per_domain = per_domain
+        self._domain_rates = dict(
+            (normalize_address('@' + domain)[1:], domain_rate)
+            for domain, domain_rate in (domains or {}).items()
+        )
+        self._from_buckets = {}
+        self._domain_buckets = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<RateLimiter {} from, {} domains>'.format(
+            len(self._from_buckets), len(self._domain_buckets))
+
+    def _new_bucket(self, rate):
+        return TokenBucket(rate, self.period, **self._bucket_args)
+
+    def _get_bucket(self, buckets, key, rate):
+        bucket = buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = buckets.get(key)
+                if bucket is None:
+                    if len(buckets) >= self._prune_size:
+                        self._prune()
+                    bucket = buckets[key] = self._new_bucket(rate)
+        return bucket
+
+    def _prune(self):
+        # Idle buckets behave as new ones, drop them so the buckets of
+        # every address and domain seen do not grow forever
+        for buckets in (self._from_buckets, self._domain_buckets):
+            for key, bucket in list(buckets.items()):
+                if bucket.idle:
+                    del buckets[key]
+        # Prune again only once the active buckets double
+        self._prune_size = max(
+            self.max_idle,
+            2 * len(self._from_buckets), 2 * len(self._domain_buckets))
+
+    def buckets(self, mail):
+        """
+        :param mail:    qreu.Email object
+        :return:        `list` of the `TokenBucket` limiting `mail`
+        """
+        result = []
+        if self._bucket is not None:
+            result.append(self._bucket)
+        if self._per_from:
+            from_mail = mail.from_
+            if isinstance(from_mail, Address):
+                from_mail = from_mail.address
+            result.append(self._get_bucket(
+                self._from_buckets, normalize_address(from_mail),
+                self._per_from))
+        if self._per_domain or self._domain_rates:
+            domains = set(
+                normalize_address(addr).rpartition('@')[2]
+                for addr in mail.recipients_addresses
+            )
+            for domain in sorted(domains):
+                domain_rate = self._domain_rates.get(domain, self._per_domain)
+                if domain_rate:
+                    result.append(self._get_bucket(
+                        self._domain_buckets, domain, domain_rate))
+        return result
+
+    def reserve(self, mail):
+        """
+        Reserve the sending of `mail` in all its buckets
+        :return: Seconds to wait before sending it
+        """
+        return max([bucket.reserve() for bucket in self.buckets(mail)] or [0])
+
+    def feedback(self, mail, error=None):
+        """
+        Adapt the rates of the buckets of `mail` to the result of sending it
+        :param error:   Exception raised sending `mail` or None on success
+        """
+        if error is None:
+            for bucket in self.buckets(mail):
+                bucket.recover()
+        elif throttle_code(error) is not None:
+            retry_after = getattr(error, 'retry_after', None)
+            for bucket in self.buckets(mail):
+                bucket.throttle(retry_after)
+
+    def pre_send(self, sender, mail):
+        delay = self.reserve(mail)
+        if delay:
+            self.sleep(delay)
+
+    def post_send(self, sender, mail, result, error, elapsed):
+        self.feedback(mail, error)
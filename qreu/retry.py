@@ -0,0 +1,260 @@
+# coding=utf-8
+"""
+Delivery resilience for `SMTPSender`: retry with jittered exponential
+backoff on transient failures, a pool of relay hosts with round robin or
+weighted selection, and a circuit breaker per host that stops connecting
+to a dead relay for a while.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import random
+import socket
+import threading
+import time
+from smtplib import (
+    SMTPException, SMTPRecipientsRefused, SMTPResponseException,
+    SMTPServerDisconnected
+)
+from timeit import default_timer
+
+import six
+
+ROUND_ROBIN = 'round_robin'
+WEIGHTED = 'weighted'
+
+
+def is_disconnection(error):
+    """
+    :return: True if `error` means the connection with the server is lost
+    """
+    if isinstance(error, SMTPServerDisconnected):
+        return True
+    # SMTPException is an OSError (socket.error) on Python 3
+    return (isinstance(error, socket.error)
+            and not isinstance(error, SMTPException))
+
+
+def is_transient(error):
+    """
+    Transient errors are worth retrying: lost connections, network errors
+    and 4xx replies of the server. Refused recipients are not, the sender
+    handles them on its own.
+
+    :param error:   Exception raised sending a message
+    :return:        bool
+    """
+    if isinstance(error, SMTPRecipientsRefused):
+        return False
+    if is_disconnection(error):
+        return True
+    if isinstance(error, SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class RetryPolicy(object):
+    """
+    Retry of the transient failures (see `is_transient`) with exponential
+    backoff: the n-th retry waits `backoff * 2 ** n` seconds (at most
+    `max_backoff`), reduced by a random fraction of up to `jitter` so
+    clients do not retry all at once.
+
+    :param attempts:    Max attempts of each operation (1 disables retries)
+    :type attempts:     int
+    :param backoff:     Seconds to wait before the first retry
+    :type backoff:      float
+    :param max_backoff: Max seconds to wait between retries
+    :type max_backoff:  float
+    :param jitter:      Max fraction of the delay removed at random (0-1)
+    :type jitter:       float
+    :param sleep:       Function to wait (for testing)
+    """
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30.0, jitter=0.5,
+                 sleep=time.sleep):
+        if attempts < 1:
+            raise ValueError('At least one attempt is required')
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.sleep = sleep
+
+    def __repr__(self):
+        return '<RetryPolicy attempts={} backoff={}>'.format(
+            self.attempts, self.backoff)
+
+    def delays(self):
+        """
+        :return: Iterator of the delays before each retry
+        """
+        for retry in range(self.attempts - 1):
+            delay = min(self.backoff * 2 ** retry, self.max_backoff)
+            yield delay * (1 - self.jitter * random.random())
+
+    is_transient = staticmethod(is_transient)
+
+
+#: Policy without retries
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker(object):
+    """
+    Thread safe circuit breaker: after `failure_threshold` consecutive
+    failures the circuit opens and `allow` returns False for
+    `reset_timeout` seconds. Then one trial is allowed (half open): a
+    success closes the circuit, a failure opens it again.
+
+    :param failure_threshold:   Consecutive failures opening the circuit
+                                (None to never open it)
+    :type failure_threshold:    int
+    :param reset_timeout:       Seconds the circuit stays open
+    :type reset_timeout:        float
+    :param clock:               Function returning the current time
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0,
+                 clock=default_timer):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<CircuitBreaker {} failures={}>'.format(
+            self.state, self.failures)
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """
+        :return: True if the protected operation can be tried now
+        """
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if (self.failure_threshold is not None
+                    and self.failures >= self.failure_threshold):
+                self._opened_at = self.clock()
+
+
+def _parse_host(host, default_port):
+    """
+    :param host:    'host', 'host:port', (host, port) or
+                    (host, port, weight)
+    :return:        (host, port, weight)
+    """
+    if isinstance(host, six.string_types):
+        name, sep, port = host.rpartition(':')
+        if sep and port.isdigit():
+            return name, int(port), 1
+        return host, default_port, 1
+    host = tuple(host)
+    if len(host) == 2:
+        return host[0], int(host[1]), 1
+    return host[0], int(host[1]), host[2]
+
+
+class HostPool(object):
+    """
+    Relay hosts of a sender, each one with its `CircuitBreaker`. The hosts
+    are tried in the order given by `candidates`, skipping the ones with an
+    open circuit, and the result of each try is recorded with
+    `record_success` or `record_failure`.
+
+    :param hosts:               Hosts as 'host', 'host:port', (host, port)
+                                or (host, port, weight)
+    :type hosts:                list
+    :param port:                Port of the hosts without one
+    :type port:                 int
+    :param selection:           'round_robin' or 'weighted' (random order
+                                by weight)
+    :type selection:            str
+    :param failure_threshold:   See `CircuitBreaker`
+    :param reset_timeout:       See `CircuitBreaker`
+    :param clock:               See `CircuitBreaker`
+    """
+
+    def __init__(self, hosts, port=25, selection=ROUND_ROBIN,
+                 failure_threshold=5, reset_timeout=30.0,
+                 clock=default_timer):
+        if selection not in (ROUND_ROBIN, WEIGHTED):
+            raise ValueError('Unknown host selection: {}'.format(selection))
+        self.hosts = [_parse_host(host, port) for host in hosts]
+        if not self.hosts:
+            raise ValueError('At least one host is required')
+        self.selection = selection
+        self.breakers = dict(
+            ((host, port), CircuitBreaker(
+                failure_threshold, reset_timeout, clock))
+            for host, port, _ in self.hosts
+        )
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<HostPool {}>'.format(', '.join(
+            '{}:{}'.format(host, port) for host, port, _ in self.hosts))
+
+    def _ordered(self):
+        if self.selection == WEIGHTED:
+            # Weighted random order without replacement
+            return [
+                host for _, host in sorted(
+                    ((random.random() ** (1.0 / host[2]), host)
+                     for host in self.hosts if host[2] > 0),
+                    reverse=True)
+            ]
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.hosts)
+        return self.hosts[start:] + self.hosts[:start]
+
+    def candidates(self):
+        """
+        :return: `list` of the (host, port) to try, in order, without the
+                 hosts with an open circuit. Check `allow` before trying
+                 each one.
+        """
+        return [
+            (host, port) for host, port, _ in self._ordered()
+            if self.breakers[(host, port)].state != CircuitBreaker.OPEN
+        ]
+
+    def allow(self, host):
+        return self.breakers[host].allow()
+
+    def record_success(self, host):
+        self.breakers[host].record_success()
+
+    def record_failure(self, host):
+        self.breakers[host].record_failure()
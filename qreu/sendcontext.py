@@ -1,19 +1,80 @@
 # -*- coding: utf-8 -*-
 
-from qreu import local
-from qreu.address import Address
-from smtplib import SMTP, SMTP_SSL, SMTPConnectError
-
-_SENDCONTEXT = local.LocalStack()
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from qreu import local, transfer
+from qreu.address import Address, idna_address
+from qreu.envelope import plan_envelope
+from qreu.retry import NO_RETRY, HostPool, is_disconnection
+from six import PY2, text_type
+from smtplib import SMTP, SMTP_SSL, SMTPConnectError, SMTPDataError
+from smtplib import SMTPException, SMTPRecipientsRefused, SMTPSenderRefused
+try:
+    from smtplib import SMTPNotSupportedError
+except ImportError:  # Python 2
+    SMTPNotSupportedError = SMTPException
+
+#: Size of the BDAT chunks (RFC 3030)
+BDAT_CHUNK_SIZE = 1024 * 1024
+
+_SENDCONTEXT = local.context_stack('qreu_sender')
+
+
+def _message_size(message):
+    """
+    :param message: Rendered message
+    :type message:  str or bytes
+    :return:        Bytes sent for `message`: UTF-8 encoded and with its bare
+                    LF line endings sent as CRLF
+    """
+    if not isinstance(message, bytes):
+        message = message.encode('utf-8')
+    return len(message) + message.count(b'\n') - message.count(b'\r\n')
 
 def get_current_sender():
     return _SENDCONTEXT.top
 
 class Sender(object):
+    _hooks = ()
+
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             self.__setattr__(k, v)
 
+    def add_hook(self, hook):
+        """
+        Add an instrumentation hook to the sender
+        :param hook:    Hook called on the send path
+        :type hook:     qreu.metrics.SendHook
+        :return:        The sender itself
+        """
+        self._hooks = tuple(self._hooks) + (hook,)
+        return self
+
+    @contextmanager
+    def _phase(self, name):
+        """
+        Time the phase `name` of the send path for the hooks
+        """
+        hooks = self._hooks
+        if not hooks:
+            yield
+            return
+        start = default_timer()
+        try:
+            yield
+        finally:
+            elapsed = default_timer() - start
+            for hook in hooks:
+                hook.timing(self, name, elapsed)
+
+    def _count(self, name, value=1):
+        for hook in self._hooks:
+            hook.count(self, name, value)
+
     def __enter__(self):
         _SENDCONTEXT.push(self)
         return _SENDCONTEXT.top
@@ -27,7 +88,35 @@ class Sender(object):
         :param mail:    qreu.Email object to send
         :type mail:     Email
         """
-        return mail.mime_string
+        with self._phase('render'):
+            return mail.mime_string
+
+    def deliver(self, mail):
+        """
+        Send the qreu.Email object with `sendmail`, calling the hooks before
+        and after it
+        :param mail:    qreu.Email object to send
+        :type mail:     Email
+        """
+        hooks = self._hooks
+        if not hooks:
+            return self.sendmail(mail)
+        for hook in hooks:
+            hook.pre_send(self, mail)
+        start = default_timer()
+        try:
+            result = self.sendmail(mail)
+        except Exception as err:
+            elapsed = default_timer() - start
+            for hook in hooks:
+                hook.timing(self, 'send', elapsed)
+                hook.post_send(self, mail, None, err, elapsed)
+            raise
+        elapsed = default_timer() - start
+        for hook in hooks:
+            hook.timing(self, 'send', elapsed)
+            hook.post_send(self, mail, result, None, elapsed)
+        return result
 
     def send(self, mail):
         """
@@ -36,7 +125,7 @@ class Sender(object):
         :type mail:     Email
         """
         sender = get_current_sender()
-        return sender.sendmail(mail)
+        return sender.deliver(mail)
 
 
 class FileSender(Sender):
@@ -51,15 +140,22 @@ class FileSender(Sender):
         :param mail:    qreu.Email object to send
         :type mail:     Email
         """
+        with self._phase('render'):
+            message = mail.mime_string
         with open(self._filename, 'w') as writer:
-            writer.write(mail.mime_string)
+            writer.write(message)
+        self._count('bytes_sent', len(message))
         return True
 
 
 class SMTPSender(Sender):
+    _connection_uses = 0
+
     def __init__(
             self, host='localhost', port=25, user=None, passwd=None,
-            ssl_keyfile=None, ssl_certfile=None, tls=False, ssl=False
+            ssl_keyfile=None, ssl_certfile=None, tls=False, ssl=False,
+            max_recipients=None, split_domains=False,
+            max_connections=4, chunking=True, hosts=None, retry=None
     ):
         """
         Sender context to send through SMTP
@@ -79,58 +175,481 @@ class SMTPSender(Sender):
         :type tls:              boolean
         :param ssl:             Start connection as SMTP-SSL
         :type ssl:              boolean
+        :param max_recipients:  Max RCPT commands for each transaction
+                                (default all the recipients in one, see
+                                `qreu.envelope.DEFAULT_MAX_RECIPIENTS`)
+        :type max_recipients:   int
+        :param split_domains:   Deliver each recipient domain through its
+                                own connection, in parallel
+        :type split_domains:    boolean
+        :param max_connections: Max parallel connections with split_domains
+        :type max_connections:  int
+        :param chunking:        Send the messages with BDAT if the server
+                                supports CHUNKING
+        :type chunking:         boolean
+        :param hosts:           Relay hosts to use instead of `host`, with
+                                failover and a circuit breaker for each one
+        :type hosts:            list or qreu.retry.HostPool
+        :param retry:           Retry of the transient failures, with
+                                reconnection if the connection is lost
+                                (default no retries)
+        :type retry:            qreu.retry.RetryPolicy
         """
+        if hosts is None:
+            hosts = HostPool([(host, port)], failure_threshold=None)
+        elif not isinstance(hosts, HostPool):
+            hosts = HostPool(hosts, port=port)
         super(SMTPSender, self).__init__(
             _host=host, _port=port,
             _user=user, _passwd=passwd,
             _ssl_keyfile=ssl_keyfile, _ssl_certfile=ssl_certfile,
             _tls=tls or (ssl_certfile and ssl_keyfile),
-            _ssl=ssl
+            _ssl=ssl,
+            _max_recipients=max_recipients,
+            _split_domains=split_domains,
+            _max_connections=max(1, max_connections),
+            _chunking=chunking,
+            _hosts=hosts,
+            _retry=retry or NO_RETRY
         )
 
-    def __enter__(self):
+    def _connect(self):
+        """
+        Open a new (logged in) connection to the first available host,
+        failing over to the next ones on transient errors
+        :return: `smtplib.SMTP` connection
+        """
+        error = None
+        for host in self._hosts.candidates():
+            if not self._hosts.allow(host):
+                continue
+            try:
+                with self._phase('connect'):
+                    connection = self._open_connection(*host)
+            except Exception as err:
+                if not self._retry.is_transient(err):
+                    # The host answered
+                    self._hosts.record_success(host)
+                    raise
+                self._hosts.record_failure(host)
+                self._count('connection_failures')
+                error = err
+                continue
+            self._hosts.record_success(host)
+            self._count('connections_opened')
+            connection._qreu_host = host
+            return connection
+        if error is None:
+            error = SMTPConnectError(421, 'No SMTP host available')
+        raise error
+
+    def _with_retry(self, connection, operation):
+        """
+        Call `operation(connection)` retrying the transient failures with
+        the retry policy. Lost connections are opened again and the
+        failures recorded in the circuit breaker of their host.
+        :return: (result, connection), the connection may be a new one
+        """
+        delays = self._retry.delays()
+        original = connection
+        failed = False
+        while True:
+            try:
+                if connection is None:
+                    connection = self._connect()
+                result = operation(connection)
+            except Exception as err:
+                delay = next(delays, None)
+                if delay is None or not self._retry.is_transient(err):
+                    if connection is not original and connection is not None:
+                        connection.close()
+                    raise
+                failed = True
+                host = getattr(connection, '_qreu_host', None)
+                if host is not None:
+                    self._hosts.record_failure(host)
+                self._count('retries')
+                self._retry.sleep(delay)
+                if connection is None:
+                    continue
+                try:
+                    if is_disconnection(err):
+                        connection.close()
+                    else:
+                        connection.rset()
+                        continue
+                except Exception:
+                    pass
+                connection = None
+                self._count('reconnections')
+                continue
+            host = getattr(connection, '_qreu_host', None)
+            if failed and host is not None:
+                self._hosts.record_success(host)
+            return result, connection
+
+    def _open_connection(self, host=None, port=None):
+        host = host or self._host
+        port = port or self._port
         if self._ssl:
-            self._connection = SMTP_SSL(
-                host=self._host, port=self._port,
+            connection = SMTP_SSL(
+                host=host, port=port,
                 keyfile=self._ssl_keyfile, certfile=self._ssl_certfile
             )
         else:
             try:
-                self._connection = SMTP(host=self._host, port=self._port)
+                connection = SMTP(host=host, port=port)
                 if self._tls:
-                    self._connection.starttls(
+                    connection.starttls(
                         keyfile=self._ssl_keyfile, certfile=self._ssl_certfile)
             except SMTPConnectError as err:
                 # Cannot establish connection due to only listening to SSL
                 if self._tls or self._ssl:
-                    self._connection = SMTP_SSL(
-                        host=self._host, port=self._port,
+                    connection = SMTP_SSL(
+                        host=host, port=port,
                         keyfile=self._ssl_keyfile, certfile=self._ssl_certfile
                     )
                 else:
                     raise
         if self._user and self._passwd:
-            self._connection.login(user=self._user, password=str(self._passwd))
+            connection.login(user=self._user, password=str(self._passwd))
+        return connection
+
+    def __enter__(self):
+        self._connection = self._with_retry(None, lambda conn: conn)[0]
+        self._connection_uses = 0
         return super(SMTPSender, self).__enter__()
 
     def __exit__(self, etype, evalue, etraceback):
         super(SMTPSender, self).__exit__(etype, evalue, etraceback)
         self._connection.close()
 
+    @staticmethod
+    def _esmtp_features(connection):
+        features = getattr(connection, 'esmtp_features', None)
+        return features if isinstance(features, dict) else {}
+
+    def _check_size(self, connection, message):
+        """
+        Raise `SMTPDataError` (552) before any RCPT if the message exceeds the
+        SIZE advertised by the server
+        """
+        size = self._esmtp_features(connection).get('size', '')
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            return
+        message_size = _message_size(message)
+        if size and message_size > size:
+            raise SMTPDataError(
+                552, 'Message size ({}) exceeds fixed maximum message size '
+                     '({})'.format(message_size, size))
+
+    def _transaction(self, connection, from_mail, recipients, message,
+                     mail_options=()):
+        if (self._chunking and isinstance(message, bytes)
+                and 'chunking' in self._esmtp_features(connection)):
+            return self._bdat(
+                connection, from_mail, recipients, message, mail_options)
+        if mail_options:
+            return connection.sendmail(
+                from_mail, recipients, message, list(mail_options))
+        return connection.sendmail(from_mail, recipients, message)
+
+    def _bdat(self, connection, from_mail, recipients, message,
+              mail_options=()):
+        """
+        `smtplib.SMTP.sendmail` sending the message in BDAT chunks instead
+        of DATA: no dot-stuffing nor line processing, and binary parts
+        allowed (RFC 3030)
+        :return: `dict` with the refused recipients
+        """
+        connection.ehlo_or_helo_if_needed()
+        options = list(mail_options)
+        if 'size' in self._esmtp_features(connection):
+            options.insert(0, 'size={}'.format(len(message)))
+        code, response = connection.mail(from_mail, options)
+        if code != 250:
+            if code == 421:
+                connection.close()
+            else:
+                connection.rset()
+            raise SMTPSenderRefused(code, response, from_mail)
+        refused = {}
+        for rcpt in recipients:
+            code, response = connection.rcpt(rcpt)
+            if code not in (250, 251):
+                refused[rcpt] = (code, response)
+            if code == 421:
+                connection.close()
+                raise SMTPRecipientsRefused(refused)
+        if len(refused) == len(recipients):
+            connection.rset()
+            raise SMTPRecipientsRefused(refused)
+        offset = 0
+        while True:
+            chunk = message[offset:offset + BDAT_CHUNK_SIZE]
+            offset += len(chunk)
+            last = offset >= len(message)
+            command = 'BDAT {}{}\r\n'.format(
+                len(chunk), ' LAST' if last else '')
+            connection.send(command.encode('ascii') + chunk)
+            code, response = connection.getreply()
+            if code != 250:
+                if code == 421:
+                    connection.close()
+                else:
+                    connection.rset()
+                raise SMTPDataError(code, response)
+            if last:
+                return refused
+
+    def _envelope_addresses(self, connection, from_mail, recipients):
+        """
+        Envelope addresses of a message for `connection`: internationalized
+        addresses are kept as they are if the server supports SMTPUTF8,
+        their domains are converted to IDNA otherwise
+        :return: (from_mail, recipients, smtputf8)
+        """
+        addresses = [from_mail or ''] + list(recipients)
+        try:
+            ''.join(addresses).encode('ascii')
+        except UnicodeError:
+            pass
+        else:
+            return from_mail, recipients, False
+        if 'smtputf8' in self._esmtp_features(connection):
+            if PY2:
+                # smtplib sends the commands as they are
+                addresses = [
+                    addr.encode('utf-8') if isinstance(addr, text_type)
+                    else addr for addr in addresses
+                ]
+                return addresses[0], addresses[1:], True
+            return from_mail, recipients, True
+        try:
+            addresses = [idna_address(addr) for addr in addresses]
+        except UnicodeError:
+            raise SMTPNotSupportedError(
+                'SMTPUTF8 not supported by the server')
+        return addresses[0], addresses[1:], False
+
+    def _render(self, connection, mail, smtputf8=False):
+        """
+        Render `mail` for `connection`, using the extensions of the server:
+        8bit and binary parts are sent as they are with 8BITMIME or
+        BINARYMIME (encoded to 7bit otherwise), UTF-8 headers with SMTPUTF8,
+        and the message is rendered as bytes for BDAT if it has CHUNKING.
+        :return: (message, mail_options)
+        """
+        features = self._esmtp_features(connection)
+        chunking = self._chunking and 'chunking' in features
+        message = mail.email
+        mail_options = ['SMTPUTF8'] if smtputf8 else []
+        body = transfer.body_type(message)
+        if (body == transfer.BODY_BINARYMIME and chunking
+                and 'binarymime' in features):
+            mail_options.append('BODY=BINARYMIME')
+        elif (body == transfer.BODY_8BITMIME and '8bitmime' in features):
+            mail_options.append('BODY=8BITMIME')
+        elif body != transfer.BODY_7BIT:
+            message = transfer.downgrade_8bit(message)
+        if not (mail_options or chunking):
+            return mail.mime_string, ()
+        data = transfer.as_bytes(message, utf8_headers=smtputf8)
+        return transfer.fix_eols(data), mail_options
+
+    def _rendered(self, connection, mail, smtputf8, renders):
+        """
+        `_render` of `mail` for `connection`, reusing the renders of the
+        previous connections with the same extensions
+        :param renders: `dict` with the renders of `mail`
+        :return:        (message, mail_options)
+        """
+        features = self._esmtp_features(connection)
+        key = (
+            smtputf8, self._chunking and 'chunking' in features,
+            '8bitmime' in features, 'binarymime' in features
+        )
+        rendered = renders.get(key)
+        if rendered is None:
+            with self._phase('render'):
+                rendered = renders[key] = self._render(
+                    connection, mail, smtputf8)
+        return rendered
+
+    def _send_batch(self, connection, mail, from_mail, recipients, renders):
+        """
+        Send `mail` to `recipients` in one transaction, negotiating the
+        envelope addresses and the rendering of the message with the
+        extensions of `connection` (each connection of a retry, a failover
+        or a parallel send may have different ones)
+        :return: (refused, size): `dict` with the refused recipients and
+                 the size of the message sent
+        """
+        if hasattr(connection, 'ehlo_or_helo_if_needed'):
+            connection.ehlo_or_helo_if_needed()
+        envelope_from, envelope_recipients, smtputf8 = \
+            self._envelope_addresses(connection, from_mail, recipients)
+        message, mail_options = self._rendered(
+            connection, mail, smtputf8, renders)
+        self._check_size(connection, message)
+        # Report the refused recipients as given, not as sent (IDNA)
+        originals = dict(zip(envelope_recipients, recipients))
+        try:
+            refused = self._transaction(
+                connection, envelope_from, envelope_recipients, message,
+                mail_options)
+        except SMTPRecipientsRefused as err:
+            err.recipients = dict(
+                (originals.get(rcpt, rcpt), reply)
+                for rcpt, reply in err.recipients.items())
+            err.args = (err.recipients,)
+            raise
+        if not isinstance(refused, dict):
+            refused = {}
+        refused = dict(
+            (originals.get(rcpt, rcpt), reply)
+            for rcpt, reply in refused.items())
+        return refused, _message_size(message)
+
+    def _send_batches(self, connection, mail, from_mail, batches, renders):
+        """
+        Send `mail` in one transaction for each batch of recipients.
+        Recipients refused with a 452 (too many recipients) are queued again
+        in smaller batches.
+        Transient failures are retried with the retry policy.
+        :return: (refused, connection): `dict` with the refused recipients
+                 as {address: (code, response)} and the connection, that
+                 is a new one if it was lost
+        """
+        refused = {}
+        pending = [list(batch) for batch in batches]
+        while pending:
+            recipients = pending.pop(0)
+            self._count('transactions')
+            try:
+                with self._phase('transaction'):
+                    (batch_refused, size), connection = self._with_retry(
+                        connection, lambda conn: self._send_batch(
+                            conn, mail, from_mail, recipients, renders))
+            except SMTPRecipientsRefused as err:
+                batch_refused = err.recipients
+            else:
+                self._count('bytes_sent', size)
+            retry = [
+                rcpt for rcpt in recipients
+                if batch_refused.get(rcpt, (None,))[0] == 452
+            ]
+            if retry and len(recipients) > 1:
+                limit = max(1, (len(recipients) - len(retry)) or
+                            len(recipients) // 2)
+                for rcpt in retry:
+                    batch_refused.pop(rcpt)
+                pending = [
+                    retry[i:i + limit] for i in range(0, len(retry), limit)
+                ] + pending
+            refused.update(batch_refused)
+        return refused, connection
+
+    def _send_domains_parallel(self, mail, from_mail, batches, renders):
+        """
+        Send each domain group of batches through its own connection
+        :return: `dict` with the refused recipients
+        """
+        groups = OrderedDict()
+        for batch in batches:
+            groups.setdefault(batch.domain, []).append(batch)
+        groups = list(groups.values())
+        refused = {}
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not groups:
+                        return
+                    group = groups.pop(0)
+                try:
+                    connection = self._with_retry(None, lambda conn: conn)[0]
+                    try:
+                        result, connection = self._send_batches(
+                            connection, mail, from_mail, group, renders)
+                    finally:
+                        connection.close()
+                except Exception as err:
+                    with lock:
+                        errors.append(err)
+                    return
+                with lock:
+                    refused.update(result)
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(min(self._max_connections, len(groups)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return refused
+
     def sendmail(self, mail):
         """
-        Send the qreu.Email object through smtp.sendmail
+        Send the qreu.Email object through smtp.sendmail.
+        The envelope recipients are deduplicated and sent in batches of
+        `max_recipients` (if set) grouped by domain. The SMTPUTF8, 8BITMIME,
+        BINARYMIME and CHUNKING extensions of each connection are used when
+        the message needs them or can benefit from them (see `_render`).
         :param mail:    qreu.Email object to send
         :type mail:     Email
         """
         from_mail = mail.from_
         if isinstance(mail.from_, Address):
             from_mail = from_mail.address
-        self._connection.sendmail(
-            from_mail, mail.recipients_addresses, mail.mime_string)
+        connection = self._connection
+        if self._connection_uses:
+            self._count('connections_reused')
+        self._connection_uses += 1
+        renders = {}
+        with self._phase('recipients'):
+            batches = plan_envelope(
+                mail.recipients_addresses, self._max_recipients,
+                group_domains=self._split_domains
+            )
+        self._count('recipients', sum(len(batch) for batch in batches))
+        if not batches:
+            # Let smtplib handle a message without recipients
+            self._send_batch(connection, mail, from_mail, [], renders)
+            return True
+        if self._split_domains and len(batches) > 1:
+            refused = self._send_domains_parallel(
+                mail, from_mail, batches, renders)
+        else:
+            refused, self._connection = self._send_batches(
+                connection, mail, from_mail, batches, renders)
+        if refused and len(refused) == sum(len(b) for b in batches):
+            raise SMTPRecipientsRefused(refused)
         return True
 
 
+class GraphError(Exception):
+    """
+    Error of the Microsoft Graph API sending a message
+
+    :param status_code: HTTP status of the response
+    :param retry_after: Seconds to wait before retrying (Retry-After header)
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super(GraphError, self).__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
 class MicrosoftGraphSender(Sender):
     """
     Sender context to send emails using Microsoft Graph API.
@@ -235,4 +754,9 @@ class MicrosoftGraphSender(Sender):
         if response.status_code == 202:
             return True
         else:
-            raise Exception("Error al enviar correo: {} - {}".format(response.status_code, response.text))
+            retry_after = response.headers.get("Retry-After")
+            raise GraphError(
+                "Error al enviar correo: {} - {}".format(response.status_code, response.text),
+                status_code=response.status_code,
+                retry_after=int(retry_after) if retry_after and retry_after.isdigit() else None
+            )
@@ -0,0 +1,176 @@
+# coding=utf-8
+"""
+Message parts spooling their payload to a temporary file when it exceeds a
+size threshold, so big parsed messages do not stay in memory.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import io
+import os
+import tempfile
+from email.message import Message
+
+import six
+
+#: Default size (in characters) above which payloads are spooled
+DEFAULT_SPOOL_THRESHOLD = 1024 * 1024
+
+
+class SpoolFile(object):
+    """
+    Temporary file holding a spooled payload. No file descriptor is kept
+    open between reads, and the file is removed on `close` or when the
+    object is discarded.
+
+    :param value:   Payload to write
+    :type value:    str or bytes
+    """
+
+    def __init__(self, value):
+        fd, self.path = tempfile.mkstemp(prefix='qreu-spool-')
+        self.binary = isinstance(value, six.binary_type)
+        with self._open(fd, 'w') as writer:
+            writer.write(value)
+
+    def __repr__(self):
+        return '<SpoolFile {}>'.format(self.path)
+
+    def _open(self, target, mode):
+        if self.binary:
+            return io.open(target, mode + 'b')
+        # Parsed bytes are kept as surrogates, write them back as they were
+        return io.open(
+            target, mode, encoding='utf-8',
+            errors='surrogateescape' if not six.PY2 else 'strict',
+            newline='')
+
+    @property
+    def closed(self):
+        return self.path is None
+
+    def open(self):
+        """
+        :return: New file object reading the payload, close it after use
+        """
+        if self.path is None:
+            raise ValueError('I/O operation on a closed spool file')
+        return self._open(self.path, 'r')
+
+    def read(self):
+        with self.open() as reader:
+            return reader.read()
+
+    def close(self):
+        path, self.path = self.path, None
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __del__(self):
+        self.close()
+
+
+class SpooledMessage(Message):
+    """
+    `email.message.Message` keeping string payloads bigger than
+    `spool_threshold` in a temporary file (see `SpoolFile`). The payload is
+    read back from the file each time it is accessed, the rest of the API is
+    unchanged.
+
+    `close` removes the temporary files of the message and its subparts,
+    they are also removed when the message is discarded. Use it as a
+    context manager to release them as soon as the message is processed.
+
+    :param spool_threshold: Max size of the payloads kept in memory (None to
+                            keep all of them)
+    :type spool_threshold:  int
+    """
+
+    def __init__(self, spool_threshold=DEFAULT_SPOOL_THRESHOLD, **kwargs):
+        self.spool_threshold = spool_threshold
+        Message.__init__(self, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.close()
+
+    def close(self):
+        """
+        Remove the temporary files of the message and its subparts. Their
+        payloads can not be read anymore.
+        """
+        for part in list(self.walk()):
+            spool = part.__dict__.get('_spool')
+            if spool is not None:
+                spool.close()
+
+    def is_multipart(self):
+        # Spooled payloads are strings, do not read them back
+        return not self.spooled and Message.is_multipart(self)
+
+    @property
+    def spooled(self):
+        """
+        :return: True if the payload is in a temporary file
+        """
+        return self.__dict__.get('_spool') is not None
+
+    @property
+    def payload_size(self):
+        """
+        :return: Length of a string payload without reading it back
+        """
+        if self.spooled:
+            return self.__dict__['_spool_size']
+        payload = self.__dict__.get('_inline_payload')
+        return len(payload) if isinstance(payload, six.string_types) else 0
+
+    def open_payload(self):
+        """
+        Open the string payload as a file object to read it in chunks
+        :return: New file object positioned at the start of the payload,
+                 close it after use
+        """
+        spool = self.__dict__.get('_spool')
+        if spool is None:
+            payload = self.__dict__.get('_inline_payload') or ''
+            if isinstance(payload, six.text_type):
+                return io.StringIO(payload)
+            return io.BytesIO(payload)
+        return spool.open()
+
+    # Old-style classes (email.message.Message on Python 2) ignore
+    # properties, so the payload is resolved through the attribute hooks
+    def __getattr__(self, name):
+        if name != '_payload':
+            raise AttributeError(name)
+        spool = self.__dict__.get('_spool')
+        if spool is None:
+            return self.__dict__.get('_inline_payload')
+        return spool.read()
+
+    def __setattr__(self, name, value):
+        if name != '_payload':
+            self.__dict__[name] = value
+            return
+        spool = self.__dict__.pop('_spool', None)
+        if spool is not None:
+            spool.close()
+        threshold = self.__dict__.get('spool_threshold')
+        if (threshold is not None and isinstance(value, six.string_types)
+                and len(value) > threshold):
+            self.__dict__['_spool'] = SpoolFile(value)
+            self.__dict__['_spool_size'] = len(value)
+            value = None
+        self.__dict__['_inline_payload'] = value
+
+    def __getstate__(self):
+        # Temporary files can not be pickled (nor copied), inline the payload
+        state = dict(self.__dict__)
+        if state.pop('_spool', None) is not None:
+            state['_inline_payload'] = self._payload
+        return state
@@ -0,0 +1,214 @@
+# coding=utf-8
+"""
+Content-addressed attachment store: attachment contents are kept once on
+local disk, keyed by their SHA-256, and the MIME parts referencing them are
+encoded on demand.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import errno
+import hashlib
+import os
+import tempfile
+from email.mime.base import MIMEBase
+
+from qreu import transfer
+
+#: Size of the chunks read when hashing streams
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentStore(object):
+    """
+    Directory storing attachment contents by their SHA-256 hex digest
+
+    :param path:    Directory of the store, created if needed
+    :type path:     str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            os.makedirs(path)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+    def __repr__(self):
+        return '<AttachmentStore {}>'.format(self.path)
+
+    @staticmethod
+    def digest(content):
+        """
+        :param content: Content to hash
+        :type content:  bytes
+        :return:        SHA-256 hex digest of `content`
+        """
+        return hashlib.sha256(content).hexdigest()
+
+    def _filename(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def __contains__(self, digest):
+        return os.path.exists(self._filename(digest))
+
+    def put(self, content):
+        """
+        Store `content` if not already stored
+        :param content: Content of the attachment
+        :type content:  bytes
+        :return:        Digest of the content
+        """
+        digest = self.digest(content)
+        if digest not in self:
+            self._write(digest, [content])
+        return digest
+
+    def put_stream(self, input_buff):
+        """
+        Store the content read from `input_buff` (a binary file-like
+        object) without loading it whole in memory
+        :return:        Digest of the content
+        """
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as writer:
+                chunk = input_buff.read(CHUNK_SIZE)
+                while chunk:
+                    hasher.update(chunk)
+                    writer.write(chunk)
+                    chunk = input_buff.read(CHUNK_SIZE)
+            digest = hasher.hexdigest()
+            if digest not in self:
+                self._move(tmp_path, digest)
+                tmp_path = None
+        finally:
+            if tmp_path:
+                os.remove(tmp_path)
+        return digest
+
+    def _write(self, digest, chunks):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+            self._move(tmp_path, digest)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def _move(self, tmp_path, digest):
+        filename = self._filename(digest)
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        # Atomic, so concurrent writers of the same content are safe
+        os.rename(tmp_path, filename)
+
+    def open(self, digest):
+        """
+        :return: Binary file object with the content of `digest`
+        :raises: KeyError if not stored
+        """
+        try:
+            return open(self._filename(digest), 'rb')
+        except IOError as err:
+            if err.errno == errno.ENOENT:
+                raise KeyError(digest)
+            raise
+
+    def get(self, digest):
+        """
+        :return: Content of `digest`
+        :rtype:  bytes
+        :raises: KeyError if not stored
+        """
+        with self.open(digest) as reader:
+            return reader.read()
+
+    def size(self, digest):
+        """
+        :return: Size in bytes of the content of `digest`
+        """
+        try:
+            return os.path.getsize(self._filename(digest))
+        except OSError:
+            raise KeyError(digest)
+
+    def dedup(self, mail):
+        """
+        Move the base64 attachments of `mail` to the store, replacing their
+        MIME parts by `StoredPart` references
+        :param mail:    qreu.Email object
+        :type mail:     Email
+        :return:        Number of parts moved to the store
+        """
+        return self._dedup_part(mail.email)
+
+    def _dedup_part(self, message):
+        if not message.is_multipart():
+            return 0
+        moved = 0
+        payload = message.get_payload()
+        for idx, part in enumerate(payload):
+            if part.is_multipart():
+                moved += self._dedup_part(part)
+                continue
+            encoding = part.get('Content-Transfer-Encoding', '').lower()
+            if (isinstance(part, StoredPart) or not part.get_filename()
+                    or encoding.strip() != 'base64'):
+                continue
+            digest = self.put(part.get_payload(decode=True))
+            stored = StoredPart(self, digest, *part.get_content_type().split('/'))
+            stored._headers = list(part._headers)
+            payload[idx] = stored
+            moved += 1
+        return moved
+
+
+class StoredPart(MIMEBase):
+    """
+    Base64 MIME part whose content lives in an `AttachmentStore`. The
+    encoded payload is rendered from the store each time it is accessed and
+    never kept in memory, pickled objects only hold the reference.
+
+    Setting a new payload detaches the part from the store.
+
+    :param store:       Store of the content
+    :type store:        AttachmentStore
+    :param digest:      Digest of the content in the store
+    :type digest:       str
+    :param maintype:    Main MIME type
+    :param subtype:     MIME subtype
+    """
+
+    def __init__(self, store, digest, maintype, subtype, **params):
+        self.store = store
+        self.digest = digest
+        MIMEBase.__init__(self, maintype, subtype, **params)
+
+    # Old-style classes (email.message.Message on Python 2) ignore
+    # properties, so the payload is resolved through the attribute hooks
+    def __getattr__(self, name):
+        if name != '_payload':
+            raise AttributeError(name)
+        if self.__dict__.get('_detached_payload') is not None:
+            return self.__dict__['_detached_payload']
+        digest = self.__dict__.get('digest')
+        if digest is None:
+            return None
+        return transfer.encode_base64(self.store.get(digest))
+
+    def __setattr__(self, name, value):
+        if name != '_payload':
+            self.__dict__[name] = value
+        elif value is None and '_detached_payload' not in self.__dict__:
+            # Initialization of the part
+            self.__dict__['_detached_payload'] = None
+        else:
+            self.__dict__['_detached_payload'] = value
+            self.__dict__['digest'] = None
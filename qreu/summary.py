@@ -0,0 +1,257 @@
+# coding=utf-8
+"""
+Compact, read-only summaries of emails for large in-memory collections.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import re
+from collections import namedtuple
+from email.parser import HeaderParser
+
+import six
+
+from qreu import address
+from qreu.email import (
+    clean_subject, decode_header_value, is_forwarded_subject, is_reply_subject
+)
+
+AttachmentInfo = namedtuple(
+    'AttachmentInfo', ['name', 'content_type', 'size'])
+
+HEADER_END = re.compile(br'\r?\n\r?\n')
+# Boundary line followed by the header block of a MIME part
+PART_HEADERS = re.compile(
+    br'^--[^\r\n]*\r?\n'
+    br'((?:(?:[^\s:][^:\r\n]*:|[ \t])[^\r\n]*\r?\n)+)\r?\n',
+    re.MULTILINE)
+NEXT_BOUNDARY = re.compile(br'\r?\n--')
+
+
+def decoded_header(headers, name):
+    """
+    :param headers: Parsed headers
+    :type headers:  email.message.Message
+    :param name:    Header name
+    :return:        Decoded value of the header or '' if missing
+    """
+    value = headers.get(name)
+    if not value:
+        return ''
+    return decode_header_value(value)
+
+
+def _addresses(value):
+    return tuple(
+        address.Address(*addr)
+        for addr in address.getaddresses([value]) if addr[1]
+    )
+
+
+def _raw_to_str(raw):
+    if isinstance(raw, six.text_type) or six.PY2:
+        return raw
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1')
+
+
+def parse_headers(raw_message, with_body=True):
+    """
+    Parse only the header block of a raw message
+
+    :param raw_message: Raw message
+    :type raw_message:  bytes or str
+    :param with_body:   Also return the raw body (a copy)
+    :type with_body:    bool
+    :return:            Tuple as (headers `email.message.Message`, raw body)
+    """
+    if isinstance(raw_message, six.text_type):
+        if six.PY2:
+            raw_message = raw_message.encode('utf-8')
+        else:
+            raw_message = raw_message.encode('utf-8', 'surrogateescape')
+    match = HEADER_END.search(raw_message)
+    if match:
+        header_block = raw_message[:match.end()]
+        body = raw_message[match.end():] if with_body else None
+    else:
+        header_block, body = raw_message, b''
+    return HeaderParser().parsestr(_raw_to_str(header_block)), body
+
+
+def scan_attachments(body):
+    """
+    Find the attachments of a raw MIME body by scanning the header blocks
+    that follow the boundary lines, without building the MIME tree.
+
+    :param body:    Raw body of the message
+    :type body:     bytes
+    :return:        `tuple` of `AttachmentInfo`
+    """
+    parser = HeaderParser()
+    result = []
+    for match in PART_HEADERS.finditer(body):
+        headers = parser.parsestr(_raw_to_str(match.group(1)))
+        filename = headers.get_filename()
+        if not filename:
+            continue
+        start = match.end()
+        end_match = NEXT_BOUNDARY.search(body, start)
+        end = end_match.start() if end_match else len(body)
+        size = end - start
+        encoding = headers.get('Content-Transfer-Encoding', '')
+        if encoding.strip().lower() == 'base64':
+            size = max(size - body.count(b'\n', start, end)
+                       - body.count(b'\r', start, end), 0) * 3 // 4
+            size -= body[max(start, end - 4):end].rstrip()[-2:].count(b'=')
+        result.append(AttachmentInfo(
+            decode_header_value(filename), headers.get_content_type(), size
+        ))
+    return tuple(result)
+
+
+class EmailSummary(object):
+    """
+    Read-only summary of an email with the decoded key headers, flags,
+    addresses and attachment metadata, using `__slots__` to keep big
+    collections small.
+
+    Build it with `EmailSummary.from_email` or, without building the MIME
+    tree, with `EmailSummary.from_bytes`.
+    """
+    __slots__ = (
+        'message_id', 'raw_subject', 'date', 'from_', 'to', 'cc', 'bcc',
+        'references', 'in_reply_to', 'is_reply', 'is_forwarded',
+        'is_auto_generated', 'attachments',
+    )
+
+    def __init__(self, message_id='', raw_subject='', date='', from_=None,
+                 to=(), cc=(), bcc=(), references=(), in_reply_to='',
+                 is_auto_generated=False, attachments=()):
+        setattr_ = super(EmailSummary, self).__setattr__
+        setattr_('message_id', message_id)
+        setattr_('raw_subject', raw_subject)
+        setattr_('date', date)
+        setattr_('from_', from_ or address.Address('', ''))
+        setattr_('to', tuple(to))
+        setattr_('cc', tuple(cc))
+        setattr_('bcc', tuple(bcc))
+        setattr_('references', tuple(references))
+        setattr_('in_reply_to', in_reply_to)
+        is_forwarded = is_forwarded_subject(raw_subject)
+        setattr_('is_forwarded', is_forwarded)
+        setattr_('is_reply', not is_forwarded and (
+            bool(in_reply_to) or is_reply_subject(raw_subject)))
+        setattr_('is_auto_generated', bool(is_auto_generated))
+        setattr_('attachments', tuple(attachments))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("can't set attribute")
+
+    def __delattr__(self, name):
+        raise AttributeError("can't delete attribute")
+
+    def __reduce__(self):
+        return self.__class__, (
+            self.message_id, self.raw_subject, self.date, self.from_,
+            self.to, self.cc, self.bcc, self.references, self.in_reply_to,
+            self.is_auto_generated, self.attachments
+        )
+
+    def __repr__(self):
+        return '<EmailSummary {} {!r}>'.format(self.message_id, self.subject)
+
+    @property
+    def subject(self):
+        """
+        Clean subject without abbreviations
+        :return: str
+        """
+        return clean_subject(self.raw_subject)
+
+    @property
+    def parent(self):
+        """
+        Parent Message-Id
+        :return: str
+        """
+        return self.references and self.references[-1] or None
+
+    @property
+    def recipients(self):
+        """
+        :return: `tuple` of `Address` with all recipients
+        """
+        return self.to + self.cc + self.bcc
+
+    @property
+    def recipients_addresses(self):
+        """
+        :return: `list` with the email addresses of the recipients without
+                 duplicates
+        """
+        seen = set()
+        result = []
+        for addr in self.recipients:
+            if addr.key not in seen:
+                seen.add(addr.key)
+                result.append(addr.address)
+        return result
+
+    @classmethod
+    def _from_headers(cls, header, attachments):
+        return cls(
+            message_id=header('Message-ID'),
+            raw_subject=header('Subject'),
+            date=header('Date'),
+            from_=address.parse(
+                address.normalize_display_address(header('From'))),
+            to=_addresses(header('To')),
+            cc=_addresses(header('Cc')),
+            bcc=_addresses(header('Bcc')),
+            references=header('References').split(),
+            in_reply_to=header('In-Reply-To'),
+            is_auto_generated=header('Auto-Submitted') == 'auto-generated',
+            attachments=attachments,
+        )
+
+    @classmethod
+    def from_email(cls, mail):
+        """
+        :param mail:    qreu.Email object
+        :type mail:     Email
+        :return:        `EmailSummary`
+        """
+        attachments = [
+            AttachmentInfo(att.name, att.content_type, att.size)
+            for att in mail.attachment_parts
+        ]
+        bccs = mail.bccs if isinstance(mail.bccs, six.string_types) else ''
+
+        def header(name):
+            value = mail.header(name, '') or ''
+            if not value and name == 'Bcc':
+                value = bccs
+            return value
+        return cls._from_headers(header, attachments)
+
+    @classmethod
+    def from_bytes(cls, raw_message):
+        """
+        Summarize a raw message parsing only its header block; attachments
+        are found scanning the part headers of the body.
+
+        :param raw_message: Raw message
+        :type raw_message:  bytes or str
+        :return:            `EmailSummary`
+        """
+        headers, body = parse_headers(raw_message)
+
+        def header(name):
+            return decoded_header(headers, name)
+        attachments = ()
+        if headers.get_content_maintype() == 'multipart':
+            attachments = scan_attachments(body)
+        return cls._from_headers(header, attachments)
+
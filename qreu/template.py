@@ -0,0 +1,141 @@
+# coding=utf-8
+"""
+Templates to build many similar emails (mail merge) sharing the invariant
+parts: encoded headers, body and attachment MIME parts are built only once.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import re
+
+from qreu.email import Email
+
+#: `{name}` placeholder of a template
+PLACEHOLDER = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+
+class EmailTemplate(object):
+    """
+    Template to stamp out `Email` objects.
+
+    The keyword arguments are the same as `Email` ('subject', 'from', 'to',
+    'cc', 'bcc', 'body_text' and 'body_html'); `headers` adds custom headers.
+    Subject and body may contain `{name}` placeholders that are filled with
+    the `context` given to `render`; without context the subject and body
+    are the same for all the emails and are only encoded once. Other braces
+    (CSS, scripts) and the placeholders missing in the context are kept as
+    they are.
+
+    The MIME parts built by the template are shared by all the rendered
+    emails, so they must be treated as read-only.
+
+    Usage::
+
+        tmpl = EmailTemplate(**{
+            'from': 'news@example.com', 'subject': 'Newsletter',
+            'body_html': html
+        })
+        tmpl.add_attachment(open('conditions.pdf', 'rb'))
+        for recipient in recipients:
+            tmpl.render(to=recipient).send()
+    """
+
+    def __init__(self, headers=None, **kwargs):
+        self._headers = []
+        self._bccs = []
+        self._attachments = []
+        self._subject = kwargs.get('subject', False)
+        self._body_text = kwargs.get('body_text', False)
+        self._body_html = kwargs.get('body_html', False)
+        self._body_part = None
+        # Encode the invariant headers and body only once
+        scratch = Email()
+        for header_name in ['subject', 'from', 'to', 'cc', 'bcc']:
+            value = kwargs.get(header_name, False)
+            if value:
+                self._add_header(scratch, header_name, value)
+        for header_name, value in (headers or {}).items():
+            self._add_header(scratch, header_name, value)
+        if self._body_text or self._body_html:
+            scratch.add_body_text(self._body_text, self._body_html)
+            self._body_part = scratch.email.get_payload()[-1]
+
+    @staticmethod
+    def _has_placeholders(text):
+        return bool(text) and PLACEHOLDER.search(text) is not None
+
+    @staticmethod
+    def _fill(text, context):
+        if not text:
+            return text
+        return PLACEHOLDER.sub(
+            lambda match: '{}'.format(
+                context.get(match.group(1), match.group(0))),
+            text)
+
+    def _add_header(self, scratch, header_name, value):
+        header_value = scratch.add_header(header_name, value)
+        if header_name.lower() == 'bcc':
+            self._bccs = header_value
+        else:
+            header_name = Email.fix_header_name(header_name) or header_name
+            self._headers.append((header_name, header_value))
+
+    def add_attachment(self, input_buff, attname=False,
+                       disposition='attachment', content_id=None):
+        """
+        Add an attachment shared by all the rendered emails. The file is read
+        and base64 encoded only once.
+        Same parameters as `Email.add_attachment`.
+        :return:    True if Added, Exception if failed
+        :rtype:     bool
+        """
+        scratch = Email()
+        scratch.add_attachment(
+            input_buff, attname=attname, disposition=disposition,
+            content_id=content_id
+        )
+        self._attachments.append(scratch.email.get_payload()[-1])
+        return True
+
+    def render(self, context=None, **kwargs):
+        """
+        Build a new `Email` from the template.
+
+        :param context: Values for the placeholders of subject and body
+        :type context:  dict
+        :param kwargs:  `Email` arguments for this email only. Recipient
+                        headers (to, cc, bcc) replace the template ones.
+        :return:        `Email`
+        """
+        context = context or {}
+        mail = Email(date=kwargs['date']) if kwargs.get('date') else Email()
+        overridden = set(kwargs)
+        if context and self._has_placeholders(self._subject):
+            overridden.add('subject')
+        for header_name, header_value in self._headers:
+            if header_name.lower() not in overridden:
+                mail.email[header_name] = header_value
+        if self._bccs and 'bcc' not in overridden:
+            mail.bccs = self._bccs
+        for header_name in ['subject', 'from', 'to', 'cc', 'bcc']:
+            value = kwargs.get(header_name, False)
+            if value:
+                mail.add_header(header_name, value)
+        if 'subject' in overridden and 'subject' not in kwargs:
+            mail.add_header('subject', self._fill(self._subject, context))
+
+        body_text = kwargs.get('body_text', False)
+        body_html = kwargs.get('body_html', False)
+        if body_text or body_html:
+            mail.add_body_text(body_text, body_html)
+        elif context and (self._has_placeholders(self._body_text) or
+                          self._has_placeholders(self._body_html)):
+            mail.add_body_text(
+                self._fill(self._body_text, context),
+                self._fill(self._body_html, context)
+            )
+        elif self._body_part is not None:
+            mail.email.attach(self._body_part)
+        for attachment in self._attachments:
+            mail.email.attach(attachment)
+        return mail
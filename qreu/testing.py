@@ -0,0 +1,267 @@
+# coding=utf-8
+"""
+Testing helpers: an in-process SMTP server keeping the received messages in
+memory, with failure injection, to exercise `SMTPSender` without a real
+server, and a manual clock for the time based helpers (retries, circuit
+breakers and rate limits).
+"""
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import namedtuple
+
+from six.moves import socketserver
+
+#: Message received by the `SMTPSink`
+#: (`chunks` is the number of BDAT commands, 0 if sent with DATA)
+ReceivedMessage = namedtuple(
+    'ReceivedMessage',
+    ['mail_from', 'rcpt_tos', 'data', 'mail_options', 'chunks'])
+ReceivedMessage.__new__.__defaults__ = ((), 0)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.server.sink._connected()
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        failure = sink._failure('CONNECT')
+        if failure is not False:
+            if failure:
+                self.reply(failure)
+            return
+        self.reply('220 {} qreu sink ready'.format(sink.hostname))
+        mail_from, rcpt_tos, mail_options, chunks = None, [], (), []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            # UTF-8 with SMTPUTF8
+            command = line.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command.split(' ', 1)[0].upper()
+            failure = sink._failure(verb)
+            if failure is not False:
+                if verb == 'BDAT':
+                    self.rfile.read(int(command.split()[1]))
+                if not failure:
+                    # Drop the connection
+                    return
+                self.reply(failure)
+                if failure.startswith('421'):
+                    return
+                continue
+            if verb == 'EHLO':
+                lines = [sink.hostname, 'SIZE {}'.format(sink.max_size)]
+                lines.extend(sink.extensions)
+                for line in lines[:-1]:
+                    self.reply('250-{}'.format(line))
+                self.reply('250 {}'.format(lines[-1]))
+            elif verb == 'HELO':
+                self.reply('250 {}'.format(sink.hostname))
+            elif verb == 'MAIL':
+                mail_from, _, params = command[10:].partition('>')
+                mail_from = mail_from.lstrip(' <')
+                mail_options = tuple(params.split())
+                rcpt_tos, chunks = [], []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if mail_from is None:
+                    self.reply('503 Need MAIL command')
+                    continue
+                rcpt = command[8:].split('>', 1)[0].lstrip(' <')
+                if rcpt in sink.refused:
+                    self.reply('550 No such user')
+                else:
+                    rcpt_tos.append(rcpt)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                if not rcpt_tos:
+                    self.reply('503 Need RCPT command')
+                    continue
+                if 'BODY=BINARYMIME' in mail_options:
+                    self.reply('503 BINARYMIME needs BDAT')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    if data_line.startswith(b'.'):
+                        data_line = data_line[1:]
+                    lines.append(data_line)
+                sink._received(
+                    mail_from, rcpt_tos, b''.join(lines), mail_options)
+                mail_from, rcpt_tos = None, []
+                self.reply('250 OK queued')
+            elif verb == 'BDAT' and 'CHUNKING' in sink.extensions:
+                args = command.split()
+                # The chunk is always read, even to refuse it
+                chunk = self.rfile.read(int(args[1]))
+                if not rcpt_tos:
+                    self.reply('503 Need RCPT command')
+                    continue
+                chunks.append(chunk)
+                if len(args) > 2 and args[2].upper() == 'LAST':
+                    sink._received(
+                        mail_from, rcpt_tos, b''.join(chunks), mail_options,
+                        len(chunks))
+                    mail_from, rcpt_tos, chunks = None, [], []
+                    self.reply('250 OK queued')
+                else:
+                    self.reply('250 OK chunk received')
+            elif verb == 'RSET':
+                mail_from, rcpt_tos, chunks = None, [], []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _ThreadedServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink(object):
+    """
+    In-process SMTP server listening on localhost, storing the received
+    messages in `messages`. Use it as a context manager:
+
+        with SMTPSink() as sink:
+            with SMTPSender(host=sink.host, port=sink.port) as sender:
+                sender.send(mail)
+        sink.messages
+
+    :param port:        Port to listen on (default a free one)
+    :type port:         int
+    :param refused:     Recipients refused with a 550
+    :type refused:      list
+    :param max_size:    SIZE advertised in EHLO
+    :type max_size:     int
+    :param extensions:  Other extensions advertised in EHLO (BDAT is only
+                        accepted with CHUNKING)
+    :type extensions:   list
+    """
+
+    hostname = 'qreu.sink'
+
+    def __init__(self, port=0, refused=None, max_size=0,
+                 extensions=('8BITMIME',)):
+        self.host = '127.0.0.1'
+        self.port = port
+        self.refused = set(refused or [])
+        self.max_size = max_size
+        self.extensions = list(extensions)
+        self.messages = []
+        self.connections = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __repr__(self):
+        return '<SMTPSink {}:{} messages: {}>'.format(
+            self.host, self.port, len(self.messages))
+
+    def _received(self, mail_from, rcpt_tos, data, mail_options=(),
+                  chunks=0):
+        with self._lock:
+            self.messages.append(ReceivedMessage(
+                mail_from, rcpt_tos, data, mail_options, chunks))
+
+    def fail(self, command, reply=None, times=1):
+        """
+        Inject a failure: answer the next `times` `command` with `reply`
+        instead of handling them
+        :param command: SMTP verb (MAIL, RCPT, DATA...) or CONNECT for the
+                        greeting
+        :param reply:   Reply line (e.g. '451 Try again later'), None to
+                        drop the connection. The connection is closed after
+                        a 421 reply
+        :param times:   Number of commands failed
+        :return:        The sink itself
+        """
+        with self._lock:
+            self._failures.append([command.upper(), reply, times])
+        return self
+
+    def _failure(self, verb):
+        """
+        :return: Reply of an injected failure of `verb`, None to drop the
+                 connection or False if there is no failure
+        """
+        with self._lock:
+            for failure in self._failures:
+                if failure[0] == verb:
+                    failure[2] -= 1
+                    if failure[2] <= 0:
+                        self._failures.remove(failure)
+                    return failure[1]
+        return False
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def start(self):
+        self._server = _ThreadedServer((self.host, self.port), _SMTPHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+
+    def clear(self):
+        with self._lock:
+            del self.messages[:]
+            del self._failures[:]
+            self.connections = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.stop()
+
+
+class FakeClock(object):
+    """
+    Manual clock to pass as the `clock` (and `sleep`) of the time based
+    helpers: time only moves with `sleep` or setting `now`.
+
+    :param now: Initial time in seconds
+    :type now:  float
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __repr__(self):
+        return '<FakeClock {}>'.format(self.now)
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
@@ -0,0 +1,245 @@
+# coding=utf-8
+"""
+Content-Transfer-Encoding selection for text parts: 7bit when the text is
+plain ASCII, 8bit (or binary) when the transport allows it and
+quoted-printable or base64 for the rest, whichever is smaller.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import base64
+import copy
+import io
+import re
+from email import charset as email_charset, encoders
+
+import six
+if not six.PY2:
+    from email.generator import BytesGenerator
+
+SEVEN_BIT = '7bit'
+EIGHT_BIT = '8bit'
+QUOTED_PRINTABLE = 'quoted-printable'
+BASE64 = 'base64'
+BINARY = 'binary'
+#: Transfer encodings that need a transport with 8BITMIME (or BINARYMIME)
+EIGHT_BIT_ENCODINGS = (EIGHT_BIT, BINARY)
+#: SMTP BODY types (RFC 6152 and RFC 3030)
+BODY_7BIT = '7BIT'
+BODY_8BITMIME = '8BITMIME'
+BODY_BINARYMIME = 'BINARYMIME'
+#: Max length of a line (without CRLF) for 7bit and 8bit bodies (RFC 5322)
+MAX_LINE_LENGTH = 998
+
+_ASCII = bytes(bytearray(range(128)))
+_EOL = re.compile(br'\r\n|\n|\r(?!\n)')
+_BODY_ENCODINGS = {
+    SEVEN_BIT: None,
+    EIGHT_BIT: None,
+    BINARY: None,
+    QUOTED_PRINTABLE: email_charset.QP,
+    BASE64: email_charset.BASE64,
+}
+
+
+def _longest_line(data):
+    if len(data) <= MAX_LINE_LENGTH:
+        return len(data)
+    return max(len(line.rstrip(b'\r')) for line in data.split(b'\n'))
+
+
+def choose_transfer_encoding(data, allow_8bit=False, allow_binary=False):
+    """
+    Choose the transfer encoding of a text body from a quick scan of its
+    content: the number of non ASCII bytes and the longest line.
+
+    :param data:            Encoded body text
+    :type data:             bytes
+    :param allow_8bit:      The transport supports 8BITMIME
+    :type allow_8bit:       bool
+    :param allow_binary:    The transport supports BINARYMIME
+    :type allow_binary:     bool
+    :return:                7bit, 8bit, binary, quoted-printable or base64
+    :rtype:                 str
+    """
+    non_ascii = len(data.translate(None, _ASCII))
+    short_lines = _longest_line(data) <= MAX_LINE_LENGTH
+    if short_lines and not non_ascii:
+        return SEVEN_BIT
+    if short_lines and (allow_8bit or allow_binary):
+        return EIGHT_BIT
+    if allow_binary:
+        return BINARY
+    # quoted-printable writes 3 characters for each escaped byte, base64
+    # writes 4 for every 3 bytes
+    escaped = non_ascii + data.count(b'=')
+    if escaped * 6 < len(data):
+        return QUOTED_PRINTABLE
+    return BASE64
+
+
+def set_text_payload(part, text, charset='utf-8', encoding=None,
+                     allow_8bit=False, allow_binary=False):
+    """
+    Set the text payload of `part` encoded with `encoding`, or with the
+    one chosen by `choose_transfer_encoding` if None
+
+    :param part:        `email.message.Message` of the text part
+    :param text:        Text of the part (or already encoded with `charset`)
+    :type text:         str or bytes
+    :param charset:     Charset of the text
+    :param encoding:    Transfer encoding (7bit, 8bit, binary,
+                        quoted-printable or base64)
+    :param allow_8bit:  The transport supports 8BITMIME
+    :param allow_binary: The transport supports BINARYMIME
+    :return:            The transfer encoding used
+    """
+    charset = email_charset.Charset(charset or 'utf-8')
+    if isinstance(text, six.text_type):
+        data = text.encode(charset.output_charset or 'utf-8')
+    else:
+        data = text
+    if encoding is None:
+        encoding = choose_transfer_encoding(data, allow_8bit, allow_binary)
+    elif encoding not in _BODY_ENCODINGS:
+        raise ValueError('Unknown transfer encoding: {}'.format(encoding))
+    charset.body_encoding = _BODY_ENCODINGS[encoding]
+    del part['Content-Transfer-Encoding']
+    part.set_payload(data, charset)
+    if encoding == BINARY:
+        part.replace_header('Content-Transfer-Encoding', BINARY)
+    elif encoding == SEVEN_BIT and part['Content-Transfer-Encoding'] != encoding:
+        # Forced 7bit on non ASCII text, keep it safe
+        return set_text_payload(part, text, charset.input_charset,
+                                QUOTED_PRINTABLE)
+    return encoding
+
+
+def body_type(message):
+    """
+    :param message: `email.message.Message`
+    :return:        SMTP BODY type needed to send `message` as it is: 7BIT,
+                    8BITMIME or BINARYMIME
+    """
+    result = BODY_7BIT
+    for part in message.walk():
+        encoding = part.get('Content-Transfer-Encoding', '').strip().lower()
+        if encoding == BINARY:
+            return BODY_BINARYMIME
+        if encoding == EIGHT_BIT:
+            result = BODY_8BITMIME
+    return result
+
+
+def has_8bit_parts(message):
+    """
+    :param message: `email.message.Message`
+    :return:        True if a part of `message` needs 8BITMIME or BINARYMIME
+    """
+    return body_type(message) != BODY_7BIT
+
+
+def _raw_payload(message, charset):
+    """
+    :return: Payload of an 8bit or binary part as bytes
+    """
+    payload = message.get_payload()
+    if not isinstance(payload, six.text_type):
+        return message.get_payload(decode=True)
+    # Text of a message parsed from str, or with the bytes of a message
+    # parsed from bytes as surrogates
+    try:
+        return payload.encode(charset, 'surrogateescape')
+    except LookupError:
+        return payload.encode('utf-8', 'surrogateescape')
+
+
+def downgrade_8bit(message):
+    """
+    Copy of `message` with its 8bit and binary parts encoded as
+    quoted-printable or base64, to send it through a transport without
+    8BITMIME. The other parts are shared with `message`.
+
+    :param message: `email.message.Message`
+    :return:        `email.message.Message`
+    """
+    if not has_8bit_parts(message):
+        return message
+    result = copy.copy(message)
+    result._headers = list(message._headers)
+    if message.is_multipart():
+        result._payload = [downgrade_8bit(part) for part in message._payload]
+        return result
+    encoding = message.get('Content-Transfer-Encoding', '').strip().lower()
+    if encoding in EIGHT_BIT_ENCODINGS:
+        charset = message.get_content_charset() or 'utf-8'
+        data = _raw_payload(message, charset)
+        if message.get_content_maintype() == 'text':
+            set_text_payload(result, data, charset)
+        else:
+            del result['Content-Transfer-Encoding']
+            result.set_payload(data)
+            encoders.encode_base64(result)
+    return result
+
+
+def encode_base64(content):
+    """
+    :param content: Content of an attachment
+    :type content:  bytes
+    :return:        `content` base64 encoded in lines of 76 characters
+    :rtype:         str
+    """
+    if six.PY2:
+        return base64.encodestring(content).decode('ascii')
+    return base64.encodebytes(content).decode('ascii')
+
+
+def fix_eols(data):
+    """
+    :param data:    Rendered message
+    :type data:     bytes
+    :return:        `data` with CRLF line endings, as SMTP expects them
+    """
+    return _EOL.sub(b'\r\n', data)
+
+
+def _utf8_header(value):
+    if isinstance(value, six.text_type) and any(
+            ord(char) > 127 for char in value):
+        if six.PY2:
+            # The generator writes 8bit strings as they are
+            return value.encode('utf-8')
+        # compat32 writes surrogates as they are, instead of encoding them
+        return value.encode('utf-8').decode('ascii', 'surrogateescape')
+    return value
+
+
+def as_bytes(message, utf8_headers=True):
+    """
+    Render `message` keeping its 8bit and binary parts, and its non ASCII
+    headers (e.g. internationalized addresses) as UTF-8: the transport
+    needs 8BITMIME, BINARYMIME or SMTPUTF8 to send it.
+
+    :param message:         `email.message.Message`
+    :param utf8_headers:    Write the non ASCII headers as UTF-8 (SMTPUTF8),
+                            RFC 2047 encode them if False
+    :return:                bytes with LF line endings (see `fix_eols`)
+    """
+    if utf8_headers:
+        headers = [
+            (name, _utf8_header(value)) for name, value in message._headers]
+        if any(new[1] is not old[1]
+               for new, old in zip(headers, message._headers)):
+            message = copy.copy(message)
+            message._headers = headers
+    if six.PY2:
+        result = message.as_string()
+        if isinstance(result, six.text_type):
+            result = result.encode('utf-8')
+        return result
+    output = io.BytesIO()
+    BytesGenerator(
+        output, mangle_from_=False,
+        policy=message.policy.clone(cte_type='8bit')
+    ).flatten(message)
+    return output.getvalue()
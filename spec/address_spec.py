@@ -1,5 +1,6 @@
 # coding=utf-8
 from qreu.address import parse, parse_list, AddressList, Address, normalize_display_address
+from qreu.address import normalize_address
 from expects import *
 
 
@@ -39,6 +40,65 @@ with description('address module'):
                 'u@example.com', 'u2@example.com'
             ))
 
+    with context('comparing addresses'):
+        with it('must be equal ignoring case and domain encoding'):
+            a1 = Address('User', 'User@Example.COM')
+            a2 = Address('Other', 'user@example.com')
+            expect(a1).to(equal(a2))
+            expect(hash(a1)).to(equal(hash(a2)))
+            expect(len({a1, a2})).to(equal(1))
+            a3 = Address('', u'user@bücher.example')
+            expect(a3.key).to(equal('user@xn--bcher-kva.example'))
+            expect(a3).to(equal(Address('', 'USER@xn--bcher-kva.example')))
+
+        with it('must reuse the same object for repeated addresses'):
+            a1 = parse('Firstname <first@example.com>')
+            a2 = parse('Firstname <first@example.com>')
+            expect(a1 is a2).to(be_true)
+
+        with it('must behave as a (display_name, address) tuple'):
+            r = parse('Firstname <first@example.com>')
+            display_name, addr = r
+            expect(display_name).to(equal('Firstname'))
+            expect(addr).to(equal('first@example.com'))
+            expect(r[1]).to(equal('first@example.com'))
+            expect(tuple(r)).to(equal(('Firstname', 'first@example.com')))
+            expect(Address._make(r)).to(be(r))
+            expect(r._asdict()).to(equal(
+                {'display_name': 'Firstname', 'address': 'first@example.com'}))
+
+        with it('must not be equal to a tuple'):
+            r = parse('first@example.com')
+            expect(r == ('', 'first@example.com')).to(be_false)
+            expect(r != ('', 'first@example.com')).to(be_true)
+            expect(len({r, ('', 'first@example.com')})).to(equal(2))
+
+        with it('must sort by the normalized address'):
+            a = Address('Zed', 'a@example.com')
+            b = Address('Ann', 'B@example.com')
+            c = Address('', 'c@example.com')
+            expect(sorted([c, b, a])).to(equal([a, b, c]))
+            expect(a < b <= Address('', 'b@example.com') < c).to(be_true)
+
+        with it('must be immutable'):
+            r = parse('first@example.com')
+
+            def call_wrongly():
+                r.address = 'other@example.com'
+
+            expect(call_wrongly).to(raise_error(AttributeError))
+
+        with it('must deduplicate addresses of an AddressList'):
+            r = AddressList(['A <a@example.com>, b@example.com', 'A@EXAMPLE.com'])
+            expect(r.unique_addresses).to(equal(['a@example.com', 'b@example.com']))
+
+    with context('normalizing an address'):
+        with it('must return an empty string without address'):
+            expect(normalize_address('')).to(equal(''))
+
+        with it('must keep addresses without domain'):
+            expect(normalize_address('Postmaster')).to(equal('postmaster'))
+
 with context('normalizing address display name'):
     with it('must quote display name if it contains commas'):
         addr_str = 'RAMOS ESCOLÀ, PEPITA <pepita@example.com>'
@@ -70,3 +130,17 @@ with context('normalizing address display name'):
         expect(normalize_display_address(addr_str)).to(equal(
             u'"SAYS \\"YES\\", PEPITA" <pepita@example.com>'
         ))
+
+    with it('must validate email addresses'):
+        from qreu.address import validate_address
+        expect(validate_address('user@example.com')).to(equal('user@example.com'))
+        for addr in ['', 'user', 'user@', 'a b@example.com', '<a@b.com>']:
+            expect(lambda: validate_address(addr)).to(raise_error(ValueError))
+
+    with it('must convert the domain of an address to IDNA'):
+        from qreu.address import idna_address
+        expect(idna_address(u'User@Bücher.example')).to(
+            equal('User@xn--bcher-kva.example'))
+        expect(idna_address('user@example.com')).to(equal('user@example.com'))
+        expect(lambda: idna_address(u'pérez@example.com')).to(
+            raise_error(UnicodeError))
@@ -0,0 +1,60 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from email.mime.base import MIMEBase
+from email import encoders
+
+from qreu import Email
+from qreu.attachment import Attachment
+from expects import *
+
+
+with description('Attachment descriptors'):
+    with before.each:
+        self.content = os.urandom(200 * 1024 + 7)
+        self.mail = Email()
+        self.mail.add_attachment(BytesIO(self.content), attname='data.bin')
+
+    with it('must describe the attachment parts of the email'):
+        attachments = list(self.mail.attachment_parts)
+        expect(attachments).to(have_length(1))
+        attachment = attachments[0]
+        expect(attachment).to(be_an(Attachment))
+        expect(attachment.name).to(equal('data.bin'))
+        expect(attachment.content_type).to(equal('application/octet-stream'))
+        expect(attachment.encoded_size).to(be_above(len(self.content)))
+        expect(attachment.size).to(equal(len(self.content)))
+
+    with it('must decode the content while reading'):
+        attachment = next(self.mail.attachment_parts)
+        reader = attachment.open()
+        chunks = []
+        chunk = reader.read(1000)
+        while chunk:
+            chunks.append(chunk)
+            chunk = reader.read(1000)
+        expect(b''.join(chunks)).to(equal(self.content))
+        expect(attachment.read()).to(equal(self.content))
+
+    with it('must save the content to a file'):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            attachment = next(Email.parse(self.mail.mime_string).attachment_parts)
+            path = attachment.save_to(os.path.join(tmpdir, attachment.name))
+            with open(path, 'rb') as f:
+                expect(f.read()).to(equal(self.content))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    with it('must decode quoted-printable attachments'):
+        content = (u'Línia amb accents = igual\n' * 5000).encode('utf-8')
+        part = MIMEBase('text', 'plain')
+        part.set_payload(content)
+        encoders.encode_quopri(part)
+        part.add_header('Content-Disposition', 'attachment; filename="a.txt"')
+        self.mail.email.attach(part)
+        attachment = list(self.mail.attachment_parts)[-1]
+        expect(attachment.encoding).to(equal('quoted-printable'))
+        expect(attachment.read()).to(equal(content))
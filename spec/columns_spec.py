@@ -0,0 +1,57 @@
+# coding=utf-8
+from array import array
+
+from qreu import Email
+from qreu.columns import extract_columns
+from expects import *
+
+
+with description('Column extraction'):
+    with before.all:
+        self.raw_messages = []
+        for fixture in range(0, 9):
+            with open('spec/fixtures/{0}.txt'.format(fixture), 'rb') as f:
+                self.raw_messages.append(f.read())
+        self.mails = [
+            Email.parse(raw) for raw in self.raw_messages
+        ]
+
+    with it('must extract the default fields as columns'):
+        columns = extract_columns(self.raw_messages)
+        expect(list(columns.keys())).to(equal([
+            'message_id', 'date', 'from', 'to', 'cc', 'subject', 'is_reply',
+            'is_forwarded', 'is_auto_generated'
+        ]))
+        expect(columns['subject']).to(equal([m.subject for m in self.mails]))
+        expect(columns['from']).to(
+            equal([m.from_.address for m in self.mails]))
+        expect(columns['to']).to(
+            equal([', '.join(m.to.addresses) for m in self.mails]))
+        expect(columns['is_reply']).to(
+            equal([m.is_reply for m in self.mails]))
+        expect(columns['is_forwarded']).to(
+            equal([m.is_forwarded for m in self.mails]))
+        expect(columns['is_auto_generated']).to(
+            equal([m.is_auto_generated for m in self.mails]))
+
+    with it('must only return the requested fields'):
+        columns = extract_columns(
+            self.raw_messages, fields=['from_name', 'references'])
+        expect(list(columns.keys())).to(equal(['from_name', 'references']))
+        expect(columns['from_name']).to(
+            equal([m.from_.display_name for m in self.mails]))
+        expect(columns['references']).to(
+            equal([m.references for m in self.mails]))
+
+    with it('must return the flags as arrays'):
+        columns = extract_columns(
+            self.raw_messages, fields=['is_forwarded'], array_type='array')
+        expect(columns['is_forwarded']).to(be_an(array))
+        expect(list(columns['is_forwarded'])).to(
+            equal([int(m.is_forwarded) for m in self.mails]))
+
+    with it('must raise ValueError with unknown fields or array types'):
+        expect(lambda: extract_columns([], fields=['body'])).to(
+            raise_error(ValueError))
+        expect(lambda: extract_columns([], array_type='pandas')).to(
+            raise_error(ValueError))
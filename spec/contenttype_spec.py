@@ -0,0 +1,47 @@
+# coding=utf-8
+from io import BytesIO
+
+from qreu import Email
+from qreu.contenttype import (
+    extension_content_type, guess_content_type, sniff_content_type
+)
+from expects import *
+
+PDF = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+
+
+with description('Content type resolution'):
+    with it('must resolve types from the extension ignoring case'):
+        expect(extension_content_type('report.PDF')).to(
+            equal('application/pdf'))
+        expect(extension_content_type('data.xlsx')).to(equal(
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        ))
+        expect(extension_content_type('README')).to(be_none)
+        expect(extension_content_type('file.klaslkdlkadlk')).to(be_none)
+
+    with it('must sniff the type from the first bytes'):
+        expect(sniff_content_type(PDF)).to(equal(('application/pdf', True)))
+        expect(sniff_content_type(b'PK\x03\x04rest')).to(
+            equal(('application/zip', False)))
+        expect(sniff_content_type(b'plain text')).to(equal((None, False)))
+
+    with it('must sniff extensionless files'):
+        expect(guess_content_type('scan', PNG)).to(equal('image/png'))
+        expect(guess_content_type('archive', b'PK\x03\x04')).to(
+            equal('application/zip'))
+        expect(guess_content_type('unknown', b'data')).to(
+            equal('application/octet-stream'))
+
+    with it('must prefer trusted signatures over misleading names'):
+        expect(guess_content_type('invoice.txt', PDF)).to(
+            equal('application/pdf'))
+        expect(guess_content_type('document.docx', b'PK\x03\x04')).to(equal(
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        ))
+
+    with it('must sniff the attachments added to an email'):
+        e = Email()
+        e.add_attachment(BytesIO(PDF), attname='invoice')
+        expect(next(e.attachments)['type']).to(equal('application/pdf'))
@@ -0,0 +1,71 @@
+# coding=utf-8
+from datetime import datetime, timedelta
+from email.utils import formatdate
+
+from qreu import Email
+from qreu.dates import FixedOffset, UTC, format_date, parse_date
+import qreu.dates
+from expects import *
+
+
+with description('Date headers'):
+    with context('parsing'):
+        with it('must return aware datetimes'):
+            d = parse_date('Thu, 01 Mar 2018 12:30:03 +0100')
+            expect(d).to(equal(datetime(2018, 3, 1, 11, 30, 3, tzinfo=UTC)))
+            expect(d.utcoffset()).to(equal(timedelta(hours=1)))
+
+        with it('must tolerate malformed dates'):
+            expected = datetime(2018, 3, 1, 12, 30, 3, tzinfo=UTC)
+            for value in [
+                    'Thu, 01 Mar 2018 12:30:03 +0000 (UTC)',
+                    '01 Mar 2018 12:30:03',
+                    'Thu,01-Mar-2018 12:30:03 GMT',
+                    'Thu, 01 Mar 2018 14:30:03 CEST',
+                    '2018-03-01T12:30:03Z',
+                    '2018-03-01 14:30:03 +02:00']:
+                expect(parse_date(value)).to(equal(expected))
+
+        with it('must name the zones with native strings'):
+            d = parse_date('Thu, 01 Mar 2018 12:30:03 -0230')
+            expect(d.tzname()).to(equal('-0230'))
+            expect(type(d.tzname())).to(be(str))
+
+        with it('must return None if it can not be parsed'):
+            expect(parse_date('garbage')).to(be_none)
+            expect(parse_date('')).to(be_none)
+            expect(parse_date(None)).to(be_none)
+
+    with context('formatting'):
+        with it('must format like formatdate'):
+            d = datetime(2018, 3, 1, 12, 30, 3, 500, tzinfo=FixedOffset(3600))
+            expect(format_date(d)).to(equal(formatdate(1519903803.0005)))
+            expect(format_date('Thu, 01 Mar 2018')).to(
+                equal('Thu, 01 Mar 2018'))
+
+        with it('must reuse the formatting of the same second'):
+            d = datetime(2018, 3, 1, 12, 30, 3, tzinfo=UTC)
+            first = format_date(d)
+            second = format_date(d.replace(microsecond=999))
+            expect(second is first).to(be_true)
+            expect(len(qreu.dates._FORMAT_CACHE)).to(
+                be_below_or_equal(qreu.dates.FORMAT_CACHE_SIZE))
+
+    with context('on emails'):
+        with it('must return the Date as a datetime'):
+            e = Email.parse('Date: Thu, 01 Mar 2018 12:30:03 +0000\n\nBody')
+            expect(e.date).to(equal(datetime(2018, 3, 1, 12, 30, 3, tzinfo=UTC)))
+            expect(e.date is e.date).to(be_true)
+
+        with it('must format aware datetimes'):
+            e = Email(date=datetime(2018, 3, 1, 13, 30, 3,
+                                    tzinfo=FixedOffset(7200)))
+            expect(e.date).to(equal(datetime(2018, 3, 1, 11, 30, 3, tzinfo=UTC)))
+
+        with it('must follow the changes of the Date header'):
+            e = Email(date='Thu, 01 Mar 2018 12:30:03 +0000')
+            expect(e.date.year).to(equal(2018))
+            e.email.replace_header('Date', 'Fri, 01 Mar 2019 12:30:03 +0000')
+            expect(e.date.year).to(equal(2019))
+            del e.email['Date']
+            expect(e.date).to(be_none)
@@ -0,0 +1,32 @@
+# coding=utf-8
+from qreu.envelope import dedup_recipients, group_by_domain, plan_envelope
+from expects import *
+
+
+with description('envelope module'):
+    with it('must deduplicate recipients ignoring case'):
+        r = dedup_recipients([
+            'a@example.com', 'A@Example.com', ' b@example.com', ''
+        ])
+        expect(r).to(equal(['a@example.com', 'b@example.com']))
+
+    with it('must group recipients by domain'):
+        r = group_by_domain(['a@one.com', 'b@two.com', 'c@ONE.com'])
+        expect(list(r.keys())).to(equal(['one.com', 'two.com']))
+        expect(r['one.com']).to(equal(['a@one.com', 'c@ONE.com']))
+
+    with it('must split batches by domain and max recipients'):
+        addresses = ['u{}@one.com'.format(i) for i in range(5)]
+        addresses += ['u@two.com']
+        batches = plan_envelope(addresses, max_recipients=2)
+        expect([len(b) for b in batches]).to(equal([2, 2, 1, 1]))
+        expect([b.domain for b in batches]).to(equal(
+            ['one.com', 'one.com', 'one.com', 'two.com']))
+
+    with it('must mix domains in a batch if not grouping domains'):
+        batches = plan_envelope(
+            ['a@one.com', 'b@two.com', 'c@one.com'], max_recipients=2,
+            group_domains=False
+        )
+        expect([b.recipients for b in batches]).to(equal(
+            [['a@one.com', 'c@one.com'], ['b@two.com']]))
@@ -0,0 +1,52 @@
+# coding=utf-8
+from html2text import html2text
+
+from qreu import Email
+from qreu.html import HTMLTextCache, get_html_text_cache, set_html_converter
+from expects import *
+
+
+with description('HTML to text conversion'):
+    with it('must convert each different HTML only once'):
+        calls = []
+
+        def converter(html):
+            calls.append(html)
+            return html2text(html)
+
+        cache = HTMLTextCache(maxsize=2, converter=converter)
+        expect(cache.convert('<p>One</p>')).to(equal(html2text('<p>One</p>')))
+        cache.convert('<p>One</p>')
+        cache.convert(u'<p>Dós</p>')
+        expect(calls).to(equal(['<p>One</p>', u'<p>Dós</p>']))
+        expect(cache.stats).to(have_keys(
+            size=2, maxsize=2, hits=1, misses=2))
+
+    with it('must discard the least recently used conversions'):
+        cache = HTMLTextCache(maxsize=2)
+        cache.convert('<p>1</p>')
+        cache.convert('<p>2</p>')
+        cache.convert('<p>1</p>')
+        cache.convert('<p>3</p>')
+        cache.convert('<p>1</p>')
+        expect(cache.hits).to(equal(2))
+        cache.convert('<p>2</p>')
+        expect(cache.misses).to(equal(4))
+        cache.resize(1)
+        expect(len(cache)).to(equal(1))
+
+    with it('must not cache with a size of 0'):
+        cache = HTMLTextCache(maxsize=0)
+        cache.convert('<p>1</p>')
+        cache.convert('<p>1</p>')
+        expect(cache.hit_rate).to(equal(0.0))
+        expect(len(cache)).to(equal(0))
+
+    with it('must use the converter hook on emails'):
+        try:
+            set_html_converter(lambda html: 'converted')
+            e = Email(body_html='<p>Hook</p>')
+            expect(e.body_parts['plain']).to(equal('converted'))
+            expect(get_html_text_cache().misses).to(equal(1))
+        finally:
+            set_html_converter(None)
@@ -0,0 +1,89 @@
+# coding=utf-8
+import gc
+import threading
+import time
+
+from mamba import *
+from expects import *
+
+from qreu.local import Local, LocalManager, LocalStack
+
+
+def run_in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def wait_released(local, contexts=0, timeout=1.0):
+    # Python 2 clears the thread state (and its thread locals) after join
+    deadline = time.time() + timeout
+    gc.collect()
+    while len(local) > contexts and time.time() < deadline:
+        time.sleep(0.001)
+        gc.collect()
+
+
+with description('Context locals'):
+    with it('must release the storage of finished threads'):
+        loc = Local()
+
+        def set_value():
+            loc.value = 42
+        for _ in range(10):
+            run_in_thread(set_value)
+        wait_released(loc)
+        expect(len(loc)).to(equal(0))
+
+    with it('must release the stacks not popped by finished threads'):
+        stack = LocalStack()
+        stack.push('main')
+        stats = []
+
+        def push():
+            stack.push(1)
+            stack.push(2)
+            stats.append(stack.stats())
+        for _ in range(10):
+            run_in_thread(push)
+        wait_released(stack, contexts=1)
+        expect(stats[-1]).to(equal({'contexts': 2, 'items': 3}))
+        expect(len(stack)).to(equal(1))
+        expect(stack.stats()).to(equal({'contexts': 1, 'items': 1}))
+        expect(stack.top).to(equal('main'))
+        stack.pop()
+        expect(len(stack)).to(equal(0))
+
+    with it('must sweep the storage of dead owners'):
+        loc = Local()
+        loc.value = 1
+        expect(loc.sweep()).to(equal(0))
+        expect(LocalManager([loc]).sweep()).to(equal(0))
+        expect(loc.value).to(equal(1))
+
+    with it('must keep working with custom ident functions'):
+        stack = LocalStack()
+        stack.__ident_func__ = lambda: 'custom'
+        stack.push(1)
+        seen = []
+        run_in_thread(lambda: seen.append(stack.top))
+        expect(seen).to(equal([1]))
+        expect(stack.sweep()).to(equal(0))
+        expect(stack.pop()).to(equal(1))
+        expect(len(stack)).to(equal(0))
+
+    with it('must resolve proxies to the current object'):
+        loc = Local()
+        proxy = loc('value')
+        expect(lambda: proxy.real).to(raise_error(RuntimeError))
+        loc.value = 3
+        expect(proxy.real).to(equal(3))
+        expect(proxy + 1).to(equal(4))
+
+        stack = LocalStack()
+        top = stack()
+        expect(lambda: top.real).to(raise_error(RuntimeError))
+        stack.push(5)
+        expect(top.real).to(equal(5))
+        stack.pop()
+        expect(repr(top)).to(equal('<LocalProxy unbound>'))
@@ -0,0 +1,88 @@
+# coding=utf-8
+from mamba import *
+from expects import *
+from mock import patch, Mock
+
+from qreu import Email
+from qreu.metrics import MetricsCollector, SendHook
+from qreu.sendcontext import Sender, SMTPSender
+from smtplib import SMTPRecipientsRefused
+
+
+with description('Send metrics'):
+    with before.each:
+        self.mail = Email(**{
+            'from': 'me@example.com',
+            'to': ['a@example.com', 'b@example.com'],
+            'subject': 'Metrics',
+            'body_text': 'Body',
+        })
+
+    with it('must call the hooks around each send'):
+        calls = []
+
+        class Recorder(SendHook):
+            def pre_send(self, sender, mail):
+                calls.append('pre')
+
+            def post_send(self, sender, mail, result, error, elapsed):
+                calls.append(('post', result, error))
+
+        sender = Sender().add_hook(Recorder())
+        with sender:
+            result = self.mail.send()
+        expect(calls).to(equal(['pre', ('post', result, None)]))
+
+    with it('must collect counters and phase timers of SMTPSender'):
+        metrics = MetricsCollector()
+        with patch('qreu.sendcontext.SMTP') as mocked_conn:
+            connection = Mock()
+            connection.esmtp_features = {}
+            connection.sendmail.return_value = {}
+            mocked_conn.return_value = connection
+            sender = SMTPSender(host='host').add_hook(metrics)
+            with sender:
+                self.mail.send()
+                self.mail.send()
+        snapshot = metrics.snapshot()
+        size = len(self.mail.mime_string.replace('\n', '\r\n'))
+        expect(snapshot['counters']).to(equal({
+            'connections_opened': 1, 'connections_reused': 1,
+            'messages_sent': 2, 'recipients': 4, 'transactions': 2,
+            'bytes_sent': 2 * size,
+        }))
+        expect(snapshot['timers']).to(have_keys(
+            'connect', 'render', 'recipients', 'transaction', 'send'))
+        expect(snapshot['timers']['send']['count']).to(equal(2))
+        expect(snapshot['timers']['connect']['count']).to(equal(1))
+
+    with it('must count the failed messages'):
+        metrics = MetricsCollector()
+        with patch('qreu.sendcontext.SMTP') as mocked_conn:
+            connection = Mock()
+            connection.esmtp_features = {}
+            connection.sendmail.side_effect = SMTPRecipientsRefused({
+                'a@example.com': (550, 'No'), 'b@example.com': (550, 'No')
+            })
+            mocked_conn.return_value = connection
+            sender = SMTPSender(host='host').add_hook(metrics)
+            with sender:
+                expect(self.mail.send).to(raise_error(SMTPRecipientsRefused))
+        counters = metrics.snapshot()['counters']
+        expect(counters['messages_failed']).to(equal(1))
+        expect(counters).not_to(have_key('messages_sent'))
+
+    with it('must export the metrics in Prometheus text format'):
+        metrics = MetricsCollector(prefix='mail')
+        metrics.increment('messages_sent', 3)
+        metrics.observe('send', 0.5)
+        metrics.observe('send', 0.25)
+        expect(metrics.to_prometheus()).to(equal(
+            '# TYPE mail_messages_sent_total counter\n'
+            'mail_messages_sent_total 3\n'
+            '# TYPE mail_phase_seconds summary\n'
+            'mail_phase_seconds_count{phase="send"} 2\n'
+            'mail_phase_seconds_sum{phase="send"} 0.75\n'
+        ))
+        metrics.reset()
+        expect(metrics.snapshot()).to(equal({'counters': {}, 'timers': {}}))
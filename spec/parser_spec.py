@@ -0,0 +1,160 @@
+# coding=utf-8
+from io import BytesIO
+
+from mamba import *
+from expects import *
+
+from qreu import Email
+from qreu.spool import SpooledMessage
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+with description('Feed parser'):
+    with before.all:
+        mail = Email(**{
+            'from': 'me@example.com',
+            'to': ['you@example.com'],
+            'subject': 'Fed in chunks',
+            'body_text': 'Hello',
+        })
+        mail.add_attachment(BytesIO(b'x' * 20000), attname='big.pdf')
+        mail.add_attachment(BytesIO(b'small'), attname='small.txt')
+        self.mail = mail
+        self.raw = mail.mime_string.encode('ascii')
+
+    with it('must parse a message fed in chunks'):
+        parser = Email.feed_parser()
+        for chunk in chunks(self.raw, 7):
+            parser.feed(chunk)
+        parsed = parser.close()
+        expect(parsed.subject).to(equal('Fed in chunks'))
+        expect(list(parsed.attachments)).to(
+            equal(list(self.mail.attachments)))
+        expect(parsed.body_parts['plain']).to(equal('Hello'))
+
+    with it('must expose the headers once the header block is complete'):
+        parser = Email.feed_parser()
+        header_end = self.raw.index(b'\n\n')
+        parser.feed(self.raw[:header_end])
+        expect(parser.headers).to(be_none)
+        parser.feed(self.raw[header_end:header_end + 2])
+        expect(parser.headers_complete).to(be_true)
+        expect(parser.headers['To']).to(equal('you@example.com'))
+        parser.feed(self.raw[header_end + 2:])
+        expect(parser.close().to).to(equal(['you@example.com']))
+
+    with it('must spool the payloads bigger than the threshold'):
+        parser = Email.feed_parser(spool_threshold=1024)
+        for chunk in chunks(self.raw, 4096):
+            parser.feed(chunk)
+        parsed = parser.close()
+        parts = [part for part in parsed.email.walk() if part.get_filename()]
+        expect([part.spooled for part in parts]).to(equal([True, False]))
+        expect(parts[0].__dict__).not_to(have_key('_payload'))
+        expect(list(parsed.attachments)).to(
+            equal(list(self.mail.attachments)))
+        expect(list(Email.parse(parsed.mime_string).attachments)).to(
+            equal(list(self.mail.attachments)))
+
+    with it('must not spool without threshold'):
+        parser = Email.feed_parser(spool_threshold=None)
+        parser.feed(self.raw)
+        parsed = parser.close()
+        expect(any(
+            isinstance(part, SpooledMessage) and part.spooled
+            for part in parsed.email.walk())).to(be_false)
+
+    with it('must not accept chunks once closed'):
+        parser = Email.feed_parser()
+        parser.feed(self.raw)
+        parser.close()
+        expect(lambda: parser.feed(b'more')).to(raise_error(ValueError))
+
+with description('Spooled messages'):
+    with it('must keep the payload when copied'):
+        import copy
+        part = SpooledMessage(spool_threshold=4)
+        part.set_payload('payload')
+        expect(part.spooled).to(be_true)
+        duplicate = copy.deepcopy(part)
+        expect(duplicate.spooled).to(be_false)
+        expect(duplicate.__dict__).not_to(have_key('_payload'))
+        expect(duplicate.get_payload()).to(equal('payload'))
+        part.set_payload('abc')
+        expect(part.spooled).to(be_false)
+        expect(part.get_payload()).to(equal('abc'))
+
+with description('Parsing with spooled parts'):
+    with before.all:
+        mail = Email(**{
+            'from': 'me@example.com',
+            'to': ['you@example.com'],
+            'subject': 'Spooled',
+            'body_text': 'Hello',
+        })
+        self.content = bytes(bytearray(range(256))) * 400
+        mail.add_attachment(BytesIO(self.content), attname='big.bin')
+        self.mail = mail
+        self.raw = mail.mime_string
+
+    with it('must spool big parts when parsing with a threshold'):
+        parsed = Email.parse(self.raw, spool_threshold=4096)
+        attachment = list(parsed.attachment_parts)[0]
+        expect(attachment.spooled).to(be_true)
+        expect(attachment.part.__dict__).not_to(have_key('_payload'))
+        expect(attachment.size).to(equal(len(self.content)))
+        expect(attachment.encoded_size).to(
+            equal(list(self.mail.attachment_parts)[0].encoded_size))
+        expect(attachment.read()).to(equal(self.content))
+        expect(parsed.body_parts['plain']).to(equal('Hello'))
+        expect(parsed.mime_string).to(equal(Email.parse(self.raw).mime_string))
+
+    with it('must keep the default parse in memory'):
+        parsed = Email.parse(self.raw)
+        expect(list(parsed.attachment_parts)[0].spooled).to(be_false)
+
+    with it('must parse files in chunks'):
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix='.eml') as eml:
+            eml.write(self.raw.encode('ascii'))
+            eml.flush()
+            parsed = Email.parse_file(eml.name, spool_threshold=4096)
+            eml.seek(0)
+            from_object = Email.parse_file(eml)
+        expect(parsed.subject).to(equal('Spooled'))
+        attachment = list(parsed.attachment_parts)[0]
+        expect(attachment.spooled).to(be_true)
+        expect(attachment.part.__dict__).not_to(have_key('_payload'))
+        expect(attachment.read()).to(equal(self.content))
+        expect(list(from_object.attachment_parts)[0].spooled).to(be_false)
+
+    with it('must not keep file descriptors open for spooled parts'):
+        import os
+        fds = '/proc/self/fd'
+        before = len(os.listdir(fds)) if os.path.isdir(fds) else None
+        mails = [Email.parse(self.raw, spool_threshold=4096)
+                 for _ in range(20)]
+        expect(list(mails[0].attachment_parts)[0].read()).to(
+            equal(self.content))
+        if before is not None:
+            expect(len(os.listdir(fds))).to(equal(before))
+
+    with it('must remove the spool files when closed or discarded'):
+        import gc
+        import os
+        parsed = Email.parse(self.raw, spool_threshold=4096)
+        part = list(parsed.attachment_parts)[0].part
+        path = part.__dict__['_spool'].path
+        expect(os.path.exists(path)).to(be_true)
+        with parsed:
+            expect(parsed.subject).to(equal('Spooled'))
+        expect(os.path.exists(path)).to(be_false)
+        expect(lambda: part.get_payload()).to(raise_error(ValueError))
+        parsed = Email.parse(self.raw, spool_threshold=4096)
+        path = list(parsed.attachment_parts)[0].part.__dict__['_spool'].path
+        del parsed
+        gc.collect()
+        expect(os.path.exists(path)).to(be_false)
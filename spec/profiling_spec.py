@@ -0,0 +1,106 @@
+# coding=utf-8
+from io import BytesIO
+
+from mamba import *
+from expects import *
+
+import qreu.email
+from qreu import Email
+from qreu.profiling import Profiler, enable_from_env
+from qreu.sendcontext import Sender
+
+
+with description('Profiling'):
+    with it('must break down the cost of each message'):
+        with Profiler() as profiler:
+            mail = Email(**{
+                'from': 'me@example.com',
+                'to': ['you@example.com'],
+                'subject': 'Profiled',
+                'body_html': '<p>Hola</p>',
+            })
+            mail.add_attachment(BytesIO(b'x' * 1024), attname='file.pdf')
+            with Sender():
+                mail.send()
+        records = list(profiler.messages.values())
+        expect(len(records)).to(equal(1))
+        record = records[0]
+        expect(record.label).to(equal('Profiled'))
+        expect(record.costs).to(have_keys(
+            'build', 'headers', 'body', 'html2text', 'attachments', 'base64',
+            'serialization', 'network'))
+        expect(profiler.totals['headers'][0]).to(equal(3))
+        expect(profiler.stats()).not_to(be_none)
+        expect(profiler.report()).to(contain('Profiled: '))
+
+    with it('must attribute parsed messages to the parsed email'):
+        raw = Email(subject='Parsed').mime_string
+        with Profiler(cprofile=False) as profiler:
+            Email.parse(raw)
+        record = list(profiler.messages.values())[0]
+        expect(record.label).to(equal('Parsed'))
+        expect(record.costs).to(have_key('parse'))
+
+    with it('must restore the original methods when stopped'):
+        original = Email.__dict__['add_header']
+        html_to_text = qreu.email.html_to_text
+        profiler = Profiler().start()
+        expect(Email.__dict__['add_header']).not_to(be(original))
+        profiler.stop()
+        expect(Email.__dict__['add_header']).to(be(original))
+        expect(qreu.email.html_to_text).to(be(html_to_text))
+
+    with it('must only profile the sampled messages'):
+        with Profiler(sample=0) as profiler:
+            Email(subject='Not sampled')
+        expect(profiler.messages).to(be_empty)
+
+    with it('must only be enabled from the environment if requested'):
+        expect(enable_from_env({})).to(be_none)
+        expect(enable_from_env({'QREU_PROFILE': '0'})).to(be_none)
+
+    with it('must profile the calls of concurrent threads'):
+        import threading
+        errors = []
+
+        def build(number):
+            try:
+                for _ in range(20):
+                    Email(subject='Thread {}'.format(number)).mime_string
+            except Exception as err:
+                errors.append(err)
+
+        with Profiler() as profiler:
+            threads = [
+                threading.Thread(target=build, args=(number,))
+                for number in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        expect(errors).to(be_empty)
+        expect(profiler.totals['serialization'][0]).to(equal(80))
+        expect(profiler.stats()).not_to(be_none)
+
+    with it('must keep timing if another profiler is active'):
+        from mock import patch
+        with patch('qreu.profiling.cProfile.Profile') as profile_class:
+            profile_class.return_value.enable.side_effect = ValueError(
+                'Another profiling tool is already active')
+            with Profiler() as profiler:
+                mail = Email(subject='Busy profiler')
+        expect(mail.subject).to(equal('Busy profiler'))
+        expect(profiler.totals['build'][0]).to(equal(1))
+        expect(profile_class.return_value.disable.called).to(be_false)
+
+    with it('must not patch the standard library'):
+        import base64
+        encode = base64.encodebytes if hasattr(base64, 'encodebytes') \
+            else base64.encodestring
+        with Profiler(cprofile=False) as profiler:
+            mail = Email(subject='Attached')
+            mail.add_attachment(BytesIO(b'x' * 1024), attname='file.pdf')
+            expect(base64.encodebytes if hasattr(base64, 'encodebytes')
+                   else base64.encodestring).to(be(encode))
+        expect(profiler.totals).to(have_key('base64'))
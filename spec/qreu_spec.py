@@ -104,6 +104,12 @@ with description('Parsing an Email'):
             'theboss@example.com'
         ))
 
+    with it('must not repeat recipients differing only on case'):
+        c = Email(to='User <User@Example.com>', cc=['user@example.com', 'other@example.com'])
+        expect(c.recipients_addresses).to(equal(
+            ['User@Example.com', 'other@example.com']
+        ))
+
     with it('must to decode headers'):
         c = Email.parse("Subject: =?iso-8859-1?Q?ERROR_A_L'OBRIR_EL_LOT_DE_PERFILACI=D3_JUNY?=")
         expect(c.subject).to(equal(u"ERROR A L'OBRIR EL LOT DE PERFILACIÓ JUNY"))
@@ -521,6 +527,24 @@ with description('Parsing HTML'):
                         </body>
                       </html>"""
             expect(get_body_html(html)).to(equal("<p>This is the <strong>body</strong>!</p>"))
+    with context('if the tags are uppercase or have attributes'):
+        with it('should return the body too'):
+            html = """<HTML><BODY class="mail" bgcolor="#fff"><p>Hi</p></BODY></HTML>"""
+            expect(get_body_html(html)).to(equal("<p>Hi</p>"))
+            html = "<Html><Body><p>Hi</p></body><p>Bye</p></Body></Html>"
+            expect(get_body_html(html)).to(equal("<p>Hi</p></body><p>Bye</p>"))
+            html = "<html><body><p>Hi</p></Body ></html>"
+            expect(get_body_html(html)).to(equal("<p>Hi</p>"))
+    with context('if the body has new lines'):
+        with it('should keep them'):
+            html = "<html><body>\n<p>One</p>\n<p>Two</p>\n</body></html>"
+            expect(get_body_html(html)).to(equal("<p>One</p>\n<p>Two</p>"))
+    with context('if there is no closing body'):
+        with it('should return until the end of the html'):
+            html = "<html><body><p>Unclosed</p></html>"
+            expect(get_body_html(html)).to(equal("<p>Unclosed</p>"))
+            html = "<html><body><p>Unclosed</p>"
+            expect(get_body_html(html)).to(equal("<p>Unclosed</p>"))
     with context('if there is no body'):
         with it('should return the complete text'):
             html = "<p>This is the <strong>body</strong>!</p>"
@@ -575,3 +599,166 @@ with description('Filename without accents'):
         expected_file_name_2 = u"hola.pdf"
         new_filename_2 = e.remove_accent(basename(original_filename_2))
         expect(new_filename_2).to(equal(expected_file_name_2))
+
+
+with description('Encoding headers'):
+    with it('must not encode ASCII values'):
+        e = Email()
+        expect(e.add_header('Subject', 'Hello world')).to(equal('Hello world'))
+        expect(e.add_header('Message-ID', '<id@example.com>')).to(
+            equal('<id@example.com>'))
+        expect(e.add_header('to', 'John Doe <john@example.com>')).to(
+            equal('John Doe <john@example.com>'))
+
+    with it('must fold long ASCII values'):
+        e = Email()
+        subject = ' '.join('word{}'.format(i) for i in range(60))
+        references = ' '.join(
+            '<{}.1234567890@mail.example.com>'.format(i) for i in range(60))
+        e.add_header('Subject', subject)
+        e.add_header('References', references)
+        e.add_header('X-Token', 'x' * 150)
+        lines = e.mime_string.split('\n')
+        expect(max(len(line) for line in lines)).to(be_below_or_equal(78))
+        parsed = Email.parse(e.mime_string)
+        expect(parsed.subject).to(equal(subject))
+        expect(parsed.header('References')).to(equal(references))
+        expect(parsed.header('X-Token')).to(equal('x' * 150))
+        expect(e.subject).to(equal(subject))
+
+    with it('must encode values that look like encoded words'):
+        e = Email()
+        value = 'x =?utf-8?q?y?= z'
+        expect(e.add_header('Subject', value)).not_to(equal(value))
+        expect(e.subject).to(equal(value))
+
+    with it('must quote ASCII display names with specials'):
+        e = Email()
+        e.add_header('to', '"Doe, John" <john@example.com>')
+        expect(e.header('To')).to(equal('"Doe, John" <john@example.com>'))
+        expect(e.recipients_addresses).to(equal(['john@example.com']))
+
+    with it('must encode non ASCII display names in short words'):
+        from qreu.email import decode_header_value, encode_words
+        for text in [u'spécial', u'Ñandú Pérez', u'José Ramón ' * 10,
+                     u'電気料金のお知らせ' * 5]:
+            encoded = encode_words(text)
+            expect(max(len(word) for word in encoded.split())).to(
+                be_below_or_equal(75))
+            expect(decode_header_value(encoded).replace(' ', '')).to(
+                equal(text.replace(' ', '')))
+        expect(encode_words(u'spécial')).to(equal('=?utf-8?q?sp=C3=A9cial?='))
+
+    with it('must keep Bcc decoded'):
+        e = Email()
+        e.add_header('bcc', [u'spécial <special@example.com>', 'b@example.com'])
+        expect(e.bccs).to(equal(u'spécial <special@example.com>,b@example.com'))
+
+
+with description('Adding recipients in bulk'):
+    with it('must accept addresses, pairs and strings'):
+        e = Email()
+        e.add_recipients('to', [
+            Address('Doe, John', 'john@example.com'),
+            ('Jane', 'jane@example.com'),
+            'plain@example.com',
+        ])
+        expect(e.header('To')).to(equal(
+            '"Doe, John" <john@example.com>,Jane <jane@example.com>,'
+            'plain@example.com'))
+        expect(e.recipients_addresses).to(equal(
+            ['john@example.com', 'jane@example.com', 'plain@example.com']))
+
+    with it('must fold the header'):
+        e = Email()
+        recipients = [(u'Destinatària {}'.format(i),
+                       'user{}@example.com'.format(i)) for i in range(100)]
+        e.add_recipients('cc', recipients)
+        lines = e.email['Cc'].split('\n')
+        expect(len(lines)).to(equal(100))
+        expect(max(len(line) for line in lines)).to(be_below_or_equal(78))
+        expect(e.cc.address_objects).to(equal(
+            [Address(*pair) for pair in recipients]))
+
+    with it('must fold the header with long non ASCII names'):
+        e = Email()
+        recipients = [
+            (name, 'destinatari.{}@exemple-de-domini.cat'.format(i))
+            for i, name in enumerate(
+                [u'José Ramón Pérez Ñandú García de la Serra'] * 20 +
+                [u'電気料金のお知らせ' * 4] * 20)
+        ]
+        e.add_recipients('to', recipients)
+        e.add_header('cc', [u'{} <{}>'.format(*pair) for pair in recipients])
+        lines = e.mime_string.split('\n')
+        expect(max(len(line) for line in lines)).to(be_below_or_equal(78))
+        parsed = Email.parse(e.mime_string)
+        for header in (parsed.to, parsed.cc):
+            expect([(a.display_name, a.address)
+                    for a in header.address_objects]).to(equal(recipients))
+
+    with it('must fold long recipient lists of add_header'):
+        e = Email()
+        e.add_header('to', ['user{}@example.com'.format(i) for i in range(50)])
+        lines = e.email['To'].split('\n ')
+        expect(len(lines)).to(be_above(1))
+        expect(max(len(line) for line in lines)).to(be_below_or_equal(78))
+        expect(len(e.recipients_addresses)).to(equal(50))
+
+    with it('must keep the recipients over max_visible in the envelope only'):
+        e = Email()
+        recipients = [('User {}'.format(i), 'user{}@example.com'.format(i))
+                      for i in range(10)]
+        e.add_recipients('to', recipients, max_visible=3)
+        expect(e.to.addresses).to(equal(
+            ['user0@example.com', 'user1@example.com', 'user2@example.com']))
+        expect(e.envelope_recipients).to(equal(
+            ['user{}@example.com'.format(i) for i in range(3, 10)]))
+        expect(e.recipients_addresses).to(equal(
+            [addr for _, addr in recipients]))
+        expect(e.mime_string).not_to(contain('user3@example.com'))
+
+    with it('must keep Bcc recipients decoded'):
+        e = Email()
+        e.add_recipients('bcc', [(u'Pérez', 'perez@example.com')])
+        expect(e.bccs).to(equal(u'Pérez <perez@example.com>'))
+        expect(e.email['Bcc']).to(be_none)
+
+    with it('must raise ValueError with invalid recipients'):
+        e = Email()
+        expect(lambda: e.add_recipients('to', [('Name', 'bad')])).to(
+            raise_error(ValueError))
+        expect(lambda: e.add_recipients('subject', ['a@example.com'])).to(
+            raise_error(ValueError))
+        expect(lambda: e.add_recipients('to', [])).to(raise_error(ValueError))
+
+
+with description('Encoding the body'):
+    with it('must not use base64 for ASCII and mostly ASCII bodies'):
+        e = Email(body_text='Hello', body_html=u'<p>Factura elèctrica</p>')
+        parts = [p for p in e.email.walk() if not p.is_multipart()]
+        expect([p['Content-Transfer-Encoding'] for p in parts]).to(
+            equal(['7bit', 'quoted-printable']))
+        expect(e.body_parts['html']).to(equal(u'<p>Factura elèctrica</p>'))
+
+    with it('must keep 8bit parts only in mime_bytes'):
+        e = Email(**{'from': 'a@example.com', 'to': ['b@example.com']})
+        e.add_body_text(u'Factura elèctrica', allow_8bit=True)
+        expect(e.has_8bit).to(be_true)
+        expect(e.mime_string).not_to(contain('8bit'))
+        expect(e.mime_bytes).to(contain(u'elèctrica'.encode('utf-8')))
+        expect(Email.parse(e.mime_bytes).body_parts['plain']).to(
+            equal(u'Factura elèctrica'))
+        expect(Email.parse(e.mime_string).body_parts['plain']).to(
+            equal(u'Factura elèctrica'))
+
+    with it('must encode the forwarded body'):
+        original = Email(**{
+            'from': 'a@example.com', 'to': ['b@example.com'],
+            'subject': 'Original', 'body_text': 'Original text'
+        })
+        original.add_header('Message-ID', '<original@example.com>')
+        forward = original.forward(
+            to='c@example.com', body_text=u'Reenviat per Núria: {original}')
+        expect(forward.body_parts['plain']).to(
+            equal(u'Reenviat per Núria: Original text'))
@@ -0,0 +1,180 @@
+# coding=utf-8
+import threading
+from smtplib import SMTPDataError, SMTPRecipientsRefused
+
+from qreu import Email
+from qreu.ratelimit import RateLimiter, TokenBucket, throttle_code
+from qreu.sendcontext import GraphError, Sender
+from qreu.testing import FakeClock
+from expects import *
+
+
+class FailingSender(Sender):
+    error = None
+
+    def sendmail(self, mail):
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+with description('ratelimit module'):
+    with before.each:
+        self.clock = FakeClock()
+
+    with it('must tell the throttling errors'):
+        expect(throttle_code(SMTPDataError(421, 'Slow down'))).to(equal(421))
+        expect(throttle_code(SMTPDataError(554, 'Rejected'))).to(be_none)
+        expect(throttle_code(SMTPRecipientsRefused({
+            'a@example.com': (550, 'Unknown'),
+            'b@example.com': (451, 'Rate limited'),
+        }))).to(equal(451))
+        expect(throttle_code(GraphError('Busy', status_code=429))).to(
+            equal(429))
+        expect(throttle_code(ValueError())).to(be_none)
+
+    with context('a token bucket'):
+        with it('must space the reservations by the rate'):
+            bucket = TokenBucket(rate=120, period=60, clock=self.clock)
+            delays = [bucket.reserve() for _ in range(4)]
+            expect(delays).to(equal([0, 0.5, 1.0, 1.5]))
+            self.clock.now = 10
+            expect(bucket.reserve()).to(equal(0))
+
+        with it('must allow bursts up to the burst size'):
+            bucket = TokenBucket(rate=1, burst=3, clock=self.clock)
+            self.clock.now = 100
+            delays = [bucket.reserve() for _ in range(4)]
+            expect(delays).to(equal([0, 0, 0, 1.0]))
+
+        with it('must only take available tokens with try_acquire'):
+            bucket = TokenBucket(rate=1, clock=self.clock)
+            expect(bucket.try_acquire()).to(be_true)
+            expect(bucket.try_acquire()).to(be_false)
+            self.clock.now = 1
+            expect(bucket.try_acquire()).to(be_true)
+
+        with it('must wait for the tokens with acquire'):
+            bucket = TokenBucket(rate=2, clock=self.clock)
+            bucket.acquire(sleep=self.clock.sleep)
+            bucket.acquire(sleep=self.clock.sleep)
+            bucket.acquire(sleep=self.clock.sleep)
+            expect(self.clock.now).to(equal(1.0))
+
+        with it('must decrease the rate on throttling and recover it'):
+            bucket = TokenBucket(
+                rate=10, min_rate=2, increase=0.1, clock=self.clock)
+            bucket.throttle()
+            expect(bucket.rate).to(equal(5))
+            # Concurrent failures of the same burst count once
+            bucket.throttle()
+            expect(bucket.rate).to(equal(5))
+            for _ in range(3):
+                self.clock.now += 1
+                bucket.throttle()
+            expect(bucket.rate).to(equal(2))
+            for _ in range(3):
+                bucket.recover()
+            expect(bucket.rate).to(be_within(4.99, 5.01))
+            for _ in range(10):
+                bucket.recover()
+            expect(bucket.rate).to(equal(10))
+
+        with it('must stop giving tokens during the retry after'):
+            bucket = TokenBucket(rate=10, clock=self.clock)
+            bucket.throttle(retry_after=30)
+            expect(bucket.reserve()).to(be_within(30, 30.3))
+            expect(bucket.try_acquire()).to(be_false)
+
+        with it('must be safe across threads'):
+            bucket = TokenBucket(rate=100, clock=self.clock)
+            delays = []
+
+            def worker():
+                for _ in range(50):
+                    delays.append(bucket.reserve())
+
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            expect(len(set(round(d, 6) for d in delays))).to(equal(200))
+            expect(max(delays)).to(be_within(1.98, 2.0))
+
+    with context('a rate limiter'):
+        with before.each:
+            self.mail = Email(**{
+                'from': 'Me <me@example.com>',
+                'to': ['a@one.com', 'b@two.com', 'c@ONE.com'],
+                'subject': 'Limited',
+                'body_text': 'Body',
+            })
+            self.other = Email(**{
+                'from': 'other@example.com',
+                'to': ['a@three.com'],
+                'subject': 'Limited',
+                'body_text': 'Body',
+            })
+
+        with it('must limit by from address and recipient domain'):
+            limiter = RateLimiter(
+                per_from=1, per_domain=2, domains={'Three.com': 1},
+                clock=self.clock)
+            buckets = limiter.buckets(self.mail)
+            expect(len(buckets)).to(equal(3))
+            expect([b.max_rate for b in buckets]).to(equal([1, 2, 2]))
+            expect(limiter.reserve(self.mail)).to(equal(0))
+            expect(limiter.reserve(self.mail)).to(equal(1))
+            expect(limiter.reserve(self.other)).to(equal(0))
+            expect(limiter.reserve(self.other)).to(equal(1))
+            expect(limiter.buckets(self.mail)).to(equal(buckets))
+
+        with it('must drop the idle buckets'):
+            limiter = RateLimiter(per_domain=1, max_idle=4, clock=self.clock)
+            throttled = limiter.buckets(self.other)[0]
+            throttled.throttle()
+            for domain in range(100):
+                mail = Email(**{
+                    'from': 'me@example.com',
+                    'to': ['a@{}.com'.format(domain)],
+                })
+                limiter.reserve(mail)
+                self.clock.now += 1
+            expect(len(limiter._domain_buckets)).to(be_below(8))
+            expect(limiter.buckets(self.other)[0]).to(be(throttled))
+
+        with it('must limit all the messages with a rate'):
+            limiter = RateLimiter(rate=60, period=60, clock=self.clock)
+            expect(limiter.reserve(self.mail)).to(equal(0))
+            expect(limiter.reserve(self.other)).to(equal(1))
+
+        with it('must wait before sending as a send hook'):
+            limiter = RateLimiter(
+                per_from=2, clock=self.clock, sleep=self.clock.sleep)
+            sender = FailingSender().add_hook(limiter)
+            for _ in range(3):
+                expect(sender.deliver(self.mail)).to(be_true)
+            expect(self.clock.now).to(equal(1.0))
+
+        with it('must slow down when the server throttles'):
+            limiter = RateLimiter(
+                rate=10, clock=self.clock, sleep=self.clock.sleep)
+            sender = FailingSender().add_hook(limiter)
+            sender.error = SMTPDataError(421, 'Too many messages')
+            expect(lambda: sender.deliver(self.mail)).to(
+                raise_error(SMTPDataError))
+            expect(limiter.buckets(self.mail)[0].rate).to(equal(5))
+            sender.error = GraphError('Busy', status_code=429, retry_after=5)
+            self.clock.now = 1
+            expect(lambda: sender.deliver(self.mail)).to(
+                raise_error(GraphError))
+            expect(limiter.buckets(self.mail)[0].rate).to(equal(2.5))
+            expect(limiter.reserve(self.mail)).to(be_above(5))
+            sender.error = SMTPDataError(554, 'Rejected')
+            expect(lambda: sender.deliver(self.mail)).to(
+                raise_error(SMTPDataError))
+            expect(limiter.buckets(self.mail)[0].rate).to(equal(2.5))
+            sender.error = None
+            sender.deliver(self.mail)
+            expect(limiter.buckets(self.mail)[0].rate).to(equal(2.7))
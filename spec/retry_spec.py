@@ -0,0 +1,111 @@
+# coding=utf-8
+import socket
+from smtplib import (
+    SMTPConnectError, SMTPDataError, SMTPRecipientsRefused,
+    SMTPServerDisconnected
+)
+
+from qreu.retry import CircuitBreaker, HostPool, RetryPolicy, is_transient
+from qreu.testing import FakeClock
+from expects import *
+
+
+with description('retry module'):
+    with it('must tell the transient errors'):
+        expect(is_transient(SMTPServerDisconnected())).to(be_true)
+        expect(is_transient(socket.error())).to(be_true)
+        expect(is_transient(SMTPDataError(451, 'Try later'))).to(be_true)
+        expect(is_transient(SMTPConnectError(421, 'Busy'))).to(be_true)
+        expect(is_transient(SMTPDataError(554, 'Rejected'))).to(be_false)
+        expect(is_transient(SMTPRecipientsRefused({}))).to(be_false)
+        expect(is_transient(ValueError())).to(be_false)
+
+    with context('a retry policy'):
+        with it('must back off exponentially up to the max'):
+            policy = RetryPolicy(
+                attempts=5, backoff=1, max_backoff=5, jitter=0)
+            expect(list(policy.delays())).to(equal([1, 2, 4, 5]))
+
+        with it('must reduce the delays with the jitter'):
+            policy = RetryPolicy(attempts=20, backoff=1, jitter=0.5)
+            for retry, delay in enumerate(policy.delays()):
+                full = min(2 ** retry, policy.max_backoff)
+                expect(delay).to(be_within(full * 0.5, full))
+
+        with it('must not retry with one attempt'):
+            expect(list(RetryPolicy(attempts=1).delays())).to(equal([]))
+            expect(lambda: RetryPolicy(attempts=0)).to(
+                raise_error(ValueError))
+
+    with context('a circuit breaker'):
+        with before.each:
+            self.clock = FakeClock()
+            self.breaker = CircuitBreaker(
+                failure_threshold=2, reset_timeout=10, clock=self.clock)
+
+        with it('must open after the consecutive failures'):
+            self.breaker.record_failure()
+            self.breaker.record_success()
+            self.breaker.record_failure()
+            expect(self.breaker.allow()).to(be_true)
+            self.breaker.record_failure()
+            expect(self.breaker.state).to(equal(CircuitBreaker.OPEN))
+            expect(self.breaker.allow()).to(be_false)
+
+        with it('must allow one trial after the reset timeout'):
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+            self.clock.now = 10
+            expect(self.breaker.state).to(equal(CircuitBreaker.HALF_OPEN))
+            expect(self.breaker.allow()).to(be_true)
+            expect(self.breaker.allow()).to(be_false)
+            self.breaker.record_failure()
+            expect(self.breaker.state).to(equal(CircuitBreaker.OPEN))
+            self.clock.now = 20
+            expect(self.breaker.allow()).to(be_true)
+            self.breaker.record_success()
+            expect(self.breaker.state).to(equal(CircuitBreaker.CLOSED))
+            expect(self.breaker.allow()).to(be_true)
+
+        with it('must never open without threshold'):
+            breaker = CircuitBreaker(failure_threshold=None)
+            for _ in range(100):
+                breaker.record_failure()
+            expect(breaker.allow()).to(be_true)
+
+    with context('a host pool'):
+        with it('must parse the hosts'):
+            pool = HostPool(['a', 'b:587', ('c', 2525), ('d', 25, 3)])
+            expect(pool.hosts).to(equal([
+                ('a', 25, 1), ('b', 587, 1), ('c', 2525, 1), ('d', 25, 3)]))
+            expect(lambda: HostPool([])).to(raise_error(ValueError))
+            expect(lambda: HostPool(['a'], selection='random')).to(
+                raise_error(ValueError))
+
+        with it('must rotate the hosts with round robin'):
+            pool = HostPool(['a', 'b', 'c'])
+            expect(pool.candidates()).to(
+                equal([('a', 25), ('b', 25), ('c', 25)]))
+            expect(pool.candidates()).to(
+                equal([('b', 25), ('c', 25), ('a', 25)]))
+
+        with it('must prefer the heavier hosts with weighted selection'):
+            pool = HostPool(
+                [('a', 25, 9), ('b', 25, 1), ('c', 25, 0)],
+                selection='weighted')
+            first = [pool.candidates()[0] for _ in range(1000)]
+            expect(first.count(('a', 25))).to(be_above(800))
+            expect(pool.candidates()).not_to(contain(('c', 25)))
+
+        with it('must skip the hosts with an open circuit'):
+            clock = FakeClock()
+            pool = HostPool(
+                ['a', 'b'], failure_threshold=1, reset_timeout=10,
+                clock=clock)
+            pool.record_failure(('a', 25))
+            expect(pool.candidates()).to(equal([('b', 25)]))
+            expect(pool.candidates()).to(equal([('b', 25)]))
+            clock.now = 10
+            expect(pool.candidates()).to(contain(('a', 25)))
+            expect(pool.allow(('a', 25))).to(be_true)
+            expect(pool.allow(('a', 25))).to(be_false)
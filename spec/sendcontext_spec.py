@@ -7,7 +7,7 @@ import tempfile
 
 from qreu.sendcontext import *
 from qreu import Email
-from smtplib import SMTPConnectError
+from smtplib import SMTPConnectError, SMTPDataError, SMTPRecipientsRefused
 
 with description('Senders'):
     with before.all:
@@ -162,3 +162,151 @@ with description('Senders'):
                         ssl_certfile='ssl_certfile'
                 ) as sender:
                     sender.send(self.test_mail)
+
+    with context('SMTP Sender envelope'):
+        with before.each:
+            self.mail = Email(**{
+                'from': 'me@example.com',
+                'to': ['a@one.com', 'A@ONE.com', 'b@one.com', 'c@one.com'],
+                'cc': ['d@two.com'],
+                'body_text': 'Hello'
+            })
+
+        with it('must send deduplicated recipients in batches'):
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {}
+                smtp_mocked.sendmail.return_value = {}
+                mocked_conn.return_value = smtp_mocked
+                with SMTPSender(host='host', max_recipients=2) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+                batches = [c[0][1] for c in smtp_mocked.sendmail.call_args_list]
+                expect(batches).to(equal(
+                    [['a@one.com', 'b@one.com'], ['c@one.com', 'd@two.com']]))
+
+        with it('must send all the recipients at once by default'):
+            recipients = ['user{}@one.com'.format(i) for i in range(150)]
+            mail = Email(**{
+                'from': 'sender@one.com',
+                'to': recipients,
+                'body_text': 'Hello'
+            })
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {}
+                smtp_mocked.sendmail.return_value = {}
+                mocked_conn.return_value = smtp_mocked
+                with SMTPSender(host='host') as sender:
+                    expect(sender.send(mail)).to(be_true)
+                batches = [c[0][1] for c in smtp_mocked.sendmail.call_args_list]
+                expect(batches).to(equal([recipients]))
+
+        with it('must send again the recipients refused with a 452'):
+            def sendmail(from_mail, recipients, message):
+                return dict(
+                    (rcpt, (452, b'Too many recipients'))
+                    for rcpt in recipients[1:]
+                )
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {}
+                smtp_mocked.sendmail.side_effect = sendmail
+                mocked_conn.return_value = smtp_mocked
+                with SMTPSender(host='host') as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+                batches = [c[0][1] for c in smtp_mocked.sendmail.call_args_list]
+                expect(batches).to(equal([
+                    ['a@one.com', 'b@one.com', 'c@one.com', 'd@two.com'],
+                    ['b@one.com'], ['c@one.com'], ['d@two.com']
+                ]))
+
+        with it('must raise if all the recipients are refused'):
+            def call_wrongly():
+                with SMTPSender(host='host') as sender:
+                    sender.send(self.mail)
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {}
+                smtp_mocked.sendmail.side_effect = SMTPRecipientsRefused(dict(
+                    (rcpt, (550, b'No such user')) for rcpt in
+                    ['a@one.com', 'b@one.com', 'c@one.com', 'd@two.com']
+                ))
+                mocked_conn.return_value = smtp_mocked
+                expect(call_wrongly).to(raise_error(SMTPRecipientsRefused))
+
+        with it('must not send a message bigger than the server SIZE'):
+            def call_wrongly():
+                with SMTPSender(host='host') as sender:
+                    sender.send(self.mail)
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {'size': '10'}
+                mocked_conn.return_value = smtp_mocked
+                expect(call_wrongly).to(raise_error(SMTPDataError))
+                expect(smtp_mocked.sendmail.called).to(be_false)
+
+        with it('must count the bytes sent on the wire against the SIZE'):
+            message = self.mail.mime_string
+            wire = message.replace('\n', '\r\n').encode('utf-8')
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                smtp_mocked = Mock()
+                smtp_mocked.esmtp_features = {'size': str(len(wire) - 1)}
+                mocked_conn.return_value = smtp_mocked
+                with SMTPSender(host='host') as sender:
+                    expect(lambda: sender.send(self.mail)).to(
+                        raise_error(SMTPDataError))
+                smtp_mocked.esmtp_features['size'] = str(len(wire))
+                smtp_mocked.sendmail.return_value = {}
+                with SMTPSender(host='host') as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+
+        with it('must use a connection for each domain with split_domains'):
+            with patch('qreu.sendcontext.SMTP') as mocked_conn:
+                connections = []
+
+                def connect(**kwargs):
+                    smtp_mocked = Mock()
+                    smtp_mocked.esmtp_features = {}
+                    smtp_mocked.sendmail.return_value = {}
+                    connections.append(smtp_mocked)
+                    return smtp_mocked
+                mocked_conn.side_effect = connect
+                with SMTPSender(host='host', split_domains=True) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+                sent = sorted(
+                    c[0][1] for conn in connections
+                    for c in conn.sendmail.call_args_list
+                )
+                expect(sent).to(equal(
+                    [['a@one.com', 'b@one.com', 'c@one.com'], ['d@two.com']]))
+                expect(len(connections)).to(equal(3))
+
+    with context('Send context'):
+        with it('must restore the previous sender when leaving a context'):
+            expect(get_current_sender()).to(be_none)
+            with Sender() as outer:
+                with Sender() as inner:
+                    expect(get_current_sender()).to(be(inner))
+                expect(get_current_sender()).to(be(outer))
+            expect(get_current_sender()).to(be_none)
+
+        with it('must not share the sender between threads'):
+            import threading
+            seen = []
+            with Sender():
+                thread = threading.Thread(
+                    target=lambda: seen.append(get_current_sender()))
+                thread.start()
+                thread.join()
+            expect(seen).to(equal([None]))
+
+        with it('must propagate the sender to copied contexts'):
+            try:
+                import contextvars
+            except ImportError:  # Python 2
+                contextvars = None
+            if contextvars is not None:
+                with Sender() as sender:
+                    ctx = contextvars.copy_context()
+                expect(get_current_sender()).to(be_none)
+                expect(ctx.run(get_current_sender)).to(be(sender))
@@ -0,0 +1,73 @@
+# coding=utf-8
+import os
+import pickle
+import shutil
+import tempfile
+from io import BytesIO
+
+from qreu import Email
+from qreu.store import AttachmentStore, StoredPart
+from expects import *
+
+
+with description('Attachment store'):
+    with before.each:
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = AttachmentStore(os.path.join(self.tmpdir, 'store'))
+        self.content = os.urandom(4096)
+
+    with after.each:
+        shutil.rmtree(self.tmpdir)
+
+    with it('must store each content once by its hash'):
+        digest = self.store.put(self.content)
+        expect(self.store.put(self.content)).to(equal(digest))
+        expect(self.store.put_stream(BytesIO(self.content))).to(equal(digest))
+        expect(digest in self.store).to(be_true)
+        expect(self.store.get(digest)).to(equal(self.content))
+        expect(self.store.size(digest)).to(equal(len(self.content)))
+        files = [f for _, _, fs in os.walk(self.store.path) for f in fs]
+        expect(files).to(have_length(1))
+
+    with it('must raise KeyError for unknown contents'):
+        expect(lambda: self.store.get('0' * 64)).to(raise_error(KeyError))
+
+    with it('must render stored attachments like inline ones'):
+        stored = Email()
+        stored.add_attachment(
+            BytesIO(self.content), attname='logo.png', store=self.store)
+        inline = Email()
+        inline.add_attachment(BytesIO(self.content), attname='logo.png')
+        part = stored.email.get_payload()[0]
+        expect(part).to(be_a(StoredPart))
+        expect(part.__dict__.get('_detached_payload')).to(be_none)
+        expect(part.__dict__).not_to(have_key('_payload'))
+        expect(list(stored.attachments)).to(equal(list(inline.attachments)))
+        parsed = Email.parse(stored.mime_string)
+        expect(next(parsed.attachment_parts).read()).to(equal(self.content))
+
+    with it('must only pickle the reference to the content'):
+        mail = Email()
+        mail.add_attachment(
+            BytesIO(self.content), attname='logo.png', store=self.store)
+        data = pickle.dumps(mail)
+        expect(len(data)).to(be_below(len(self.content)))
+        expect(next(pickle.loads(data).attachment_parts).read()).to(
+            equal(self.content))
+
+    with it('must move the attachments of an email to the store'):
+        mail = Email(body_text='Hello')
+        mail.add_attachment(BytesIO(self.content), attname='a.bin')
+        mail.add_attachment(BytesIO(self.content), attname='b.bin')
+        mime_string = mail.mime_string
+        expect(self.store.dedup(mail)).to(equal(2))
+        expect(self.store.dedup(mail)).to(equal(0))
+        expect(mail.mime_string).to(equal(mime_string))
+
+    with it('must detach the part when setting a new payload'):
+        mail = Email()
+        mail.add_attachment(
+            BytesIO(self.content), attname='a.bin', store=self.store)
+        part = mail.email.get_payload()[0]
+        part.set_payload('YQ==\n')
+        expect(next(mail.attachment_parts).read()).to(equal(b'a'))
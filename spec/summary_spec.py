@@ -0,0 +1,64 @@
+# coding=utf-8
+import pickle
+
+from qreu import Email
+from qreu.address import Address
+from qreu.summary import AttachmentInfo, EmailSummary
+from expects import *
+
+
+with description('Email summaries'):
+    with before.all:
+        self.raw_messages = []
+        for fixture in range(0, 9):
+            with open('spec/fixtures/{0}.txt'.format(fixture), 'rb') as f:
+                self.raw_messages.append(f.read())
+
+    with it('must summarize raw messages like parsed emails'):
+        for raw in self.raw_messages:
+            summary = EmailSummary.from_bytes(raw)
+            mail = Email.parse(raw)
+            expect(summary.subject).to(equal(mail.subject))
+            expect(summary.from_).to(equal(mail.from_))
+            expect(summary.from_.display_name).to(
+                equal(mail.from_.display_name))
+            expect([a.address for a in summary.to]).to(
+                equal(mail.to.addresses))
+            expect(summary.references).to(equal(tuple(mail.references)))
+            expect(summary.parent).to(equal(mail.parent))
+            expect(summary.is_reply).to(equal(mail.is_reply))
+            expect(summary.is_forwarded).to(equal(mail.is_forwarded))
+            expect(summary.is_auto_generated).to(
+                equal(mail.is_auto_generated))
+
+    with it('must find the attachments without parsing the body'):
+        summary = EmailSummary.from_bytes(self.raw_messages[4])
+        mail = EmailSummary.from_email(
+            Email.parse(self.raw_messages[4]))
+        expect(summary.attachments).to(equal(mail.attachments))
+        expect(summary.attachments[0]).to(be_an(AttachmentInfo))
+        expect(summary.attachments[0].name).to(equal('image.png'))
+
+    with it('must summarize a created email with its bcc'):
+        mail = Email(**{
+            'from': 'me@example.com', 'to': 'you@example.com',
+            'bcc': 'hidden@example.com', 'subject': 'Re: Hello'
+        })
+        summary = EmailSummary.from_email(mail)
+        expect(summary.is_reply).to(be_true)
+        expect(summary.subject).to(equal('Hello'))
+        expect(summary.recipients_addresses).to(
+            equal(['you@example.com', 'hidden@example.com']))
+        expect(summary.bcc).to(equal((Address('', 'hidden@example.com'),)))
+
+    with it('must be read only, compact and picklable'):
+        summary = EmailSummary.from_bytes(self.raw_messages[3])
+        expect(hasattr(summary, '__dict__')).to(be_false)
+
+        def call_wrongly():
+            summary.raw_subject = 'Other'
+
+        expect(call_wrongly).to(raise_error(AttributeError))
+        copy = pickle.loads(pickle.dumps(summary))
+        expect(copy.references).to(equal(summary.references))
+        expect(copy.is_reply).to(equal(summary.is_reply))
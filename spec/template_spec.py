@@ -0,0 +1,76 @@
+# coding=utf-8
+from io import BytesIO
+
+from qreu import Email
+from qreu.template import EmailTemplate
+from expects import *
+
+
+with description('Email templates'):
+    with before.each:
+        self.template = EmailTemplate(**{
+            'from': 'News <news@example.com>',
+            'subject': u'Notícies per {name}',
+            'bcc': 'archive@example.com',
+            'body_html': '<p>Hello {name}</p>',
+            'headers': {'X-Campaign': 'spring'}
+        })
+        self.template.add_attachment(
+            BytesIO(b'conditions'), attname='conditions.pdf')
+
+    with it('must render emails with the template headers'):
+        mail = self.template.render(to='Bob <bob@example.com>')
+        expect(mail).to(be_a(Email))
+        expect(mail.from_.address).to(equal('news@example.com'))
+        expect(mail.to.addresses).to(equal(['bob@example.com']))
+        expect(mail.header('X-Campaign')).to(equal('spring'))
+        expect(mail.bcc.addresses).to(equal(['archive@example.com']))
+        expect(mail.header('Date')).to_not(be_none)
+
+    with it('must share the body and attachment parts without context'):
+        m1 = self.template.render(to='a@example.com')
+        m2 = self.template.render(to='b@example.com')
+        parts1 = m1.email.get_payload()
+        parts2 = m2.email.get_payload()
+        expect(parts1[0] is parts2[0]).to(be_true)
+        expect(parts1[1] is parts2[1]).to(be_true)
+        expect(m1.body_parts['html']).to(equal('<p>Hello {name}</p>'))
+        expect(m1.body_parts['files']).to(equal(['conditions.pdf']))
+
+    with it('must fill the placeholders with the context'):
+        mail = self.template.render(
+            to='bob@example.com', context={'name': 'Bob'})
+        expect(mail.subject).to(equal(u'Notícies per Bob'))
+        expect(mail.body_parts['html']).to(equal('<p>Hello Bob</p>'))
+        expect(mail.body_parts['files']).to(equal(['conditions.pdf']))
+
+    with it('must keep the CSS, scripts and unknown placeholders'):
+        html = (
+            '<style>p { color: red; }</style>'
+            '<script>function f() {return 1;}</script>'
+            '<p>Hello {name}, {unknown} {0}</p>'
+        )
+        template = EmailTemplate(**{
+            'from': 'news@example.com', 'subject': 'Hi {name} {}',
+            'body_html': html
+        })
+        mail = template.render(to='bob@example.com', context={'name': 'Bob'})
+        expect(mail.subject).to(equal('Hi Bob {}'))
+        expect(mail.body_parts['html']).to(equal(
+            '<style>p { color: red; }</style>'
+            '<script>function f() {return 1;}</script>'
+            '<p>Hello Bob, {unknown} {0}</p>'
+        ))
+
+    with it('must replace the template headers with the given ones'):
+        mail = self.template.render(
+            to='bob@example.com', subject='Other', bcc='other@example.com')
+        expect(mail.subject).to(equal('Other'))
+        expect(mail.email.get_all('Subject')).to(have_length(1))
+        expect(mail.bcc.addresses).to(equal(['other@example.com']))
+
+    with it('must render the same MIME as a parsed message'):
+        mail = self.template.render(to='bob@example.com')
+        expect(
+            Email.parse(mail.mime_string).mime_string
+        ).to(equal(mail.mime_string))
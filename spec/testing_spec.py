@@ -0,0 +1,256 @@
+# coding=utf-8
+from mamba import *
+from expects import *
+
+from qreu import Email
+from qreu.sendcontext import SMTPSender
+from qreu.testing import SMTPSink
+from smtplib import SMTPRecipientsRefused
+from mock import patch
+
+
+with description('SMTP sink'):
+    with before.each:
+        self.mail = Email(**{
+            'from': 'me@example.com',
+            'to': ['a@example.com', 'b@example.org'],
+            'subject': 'Sink',
+            'body_text': 'Body',
+        })
+
+    with it('must receive the messages sent with SMTPSender'):
+        with SMTPSink() as sink:
+            with SMTPSender(host=sink.host, port=sink.port) as sender:
+                expect(sender.send(self.mail)).to(be_true)
+        expect(sink.connections).to(equal(1))
+        expect(len(sink.messages)).to(equal(1))
+        received = sink.messages[0]
+        expect(received.mail_from).to(equal('me@example.com'))
+        expect(received.rcpt_tos).to(equal(['a@example.com', 'b@example.org']))
+        expect(Email.parse(received.data.decode('ascii')).subject).to(
+            equal('Sink'))
+
+    with it('must refuse the configured recipients'):
+        with SMTPSink(refused=['a@example.com']) as sink:
+            with SMTPSender(host=sink.host, port=sink.port) as sender:
+                expect(sender.send(self.mail)).to(be_true)
+            expect(sink.messages[0].rcpt_tos).to(equal(['b@example.org']))
+            sink.refused.add('b@example.org')
+            with SMTPSender(host=sink.host, port=sink.port) as sender:
+                expect(lambda: sender.send(self.mail)).to(
+                    raise_error(SMTPRecipientsRefused))
+            expect(len(sink.messages)).to(equal(1))
+
+    with context('sending 8bit bodies'):
+        with before.each:
+            self.mail = Email(**{
+                'from': 'me@example.com', 'to': ['a@example.com'],
+                'subject': '8bit',
+            })
+            self.mail.add_body_text(u'Factura elèctrica', allow_8bit=True)
+
+        with it('must send them as they are with 8BITMIME'):
+            with SMTPSink() as sink:
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.mail_options).to(contain('BODY=8BITMIME'))
+            expect(received.data).to(contain(u'elèctrica'.encode('utf-8')))
+            expect(received.data.replace(b'\r\n', b'')).not_to(contain(b'\n'))
+            expect(Email.parse(received.data).body_parts['plain']).to(
+                equal(u'Factura elèctrica'))
+
+        with it('must encode them without 8BITMIME'):
+            with SMTPSink(extensions=[]) as sink:
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.mail_options).not_to(contain('BODY=8BITMIME'))
+            expect(received.data).to(contain(b'quoted-printable'))
+            expect(Email.parse(received.data).body_parts['plain']).to(
+                equal(u'Factura elèctrica'))
+
+    with context('using the server extensions'):
+        with before.each:
+            self.mail = Email(**{
+                'from': 'me@example.com',
+                'to': [u'Pérez <pérez@exàmple.com>', u'b@exàmple.com'],
+                'subject': 'Extensions',
+            })
+            self.mail.add_body_text(u'Factura elèctrica\n.\n', allow_8bit=True)
+
+        with it('must send internationalized addresses with SMTPUTF8'):
+            with SMTPSink(extensions=['8BITMIME', 'SMTPUTF8']) as sink:
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.mail_options).to(contain('SMTPUTF8'))
+            expect(received.rcpt_tos).to(
+                equal([u'pérez@exàmple.com', u'b@exàmple.com']))
+            expect(received.data).to(
+                contain(u'<pérez@exàmple.com>'.encode('utf-8')))
+            expect(Email.parse(received.data).recipients_addresses).to(
+                equal([u'pérez@exàmple.com', u'b@exàmple.com']))
+
+        with it('must use IDNA domains without SMTPUTF8'):
+            from qreu.sendcontext import SMTPNotSupportedError
+            with SMTPSink() as sink:
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(lambda: sender.send(self.mail)).to(
+                        raise_error(SMTPNotSupportedError))
+                    del self.mail.email['To']
+                    self.mail.add_header('to', u'b@exàmple.com')
+                    expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.rcpt_tos).to(equal(['b@xn--exmple-jta.com']))
+            expect(received.mail_options).not_to(contain('SMTPUTF8'))
+
+        with it('must send the message in BDAT chunks with CHUNKING'):
+            with SMTPSink(extensions=['8BITMIME', 'SMTPUTF8', 'CHUNKING']) as sink:
+                with patch('qreu.sendcontext.BDAT_CHUNK_SIZE', 100):
+                    with SMTPSender(host=sink.host, port=sink.port) as sender:
+                        expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.chunks).to(be_above(1))
+            expect(received.data).to(contain(b'\r\n.\r\n'))
+            body = Email.parse(received.data).body_parts['plain']
+            expect(body.replace('\r\n', '\n')).to(
+                equal(u'Factura elèctrica\n.\n'))
+
+        with it('must not use BDAT if chunking is disabled'):
+            with SMTPSink(extensions=['8BITMIME', 'SMTPUTF8', 'CHUNKING']) as sink:
+                with SMTPSender(
+                        host=sink.host, port=sink.port, chunking=False
+                ) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            expect(sink.messages[0].chunks).to(equal(0))
+
+        with it('must send binary parts with BINARYMIME'):
+            from qreu.transfer import set_text_payload
+            part = [p for p in self.mail.email.walk()
+                    if p.get_content_type() == 'text/plain'][0]
+            text = u'Línia molt llarga ' * 100
+            set_text_payload(part, text, encoding='binary')
+            extensions = ['8BITMIME', 'SMTPUTF8', 'CHUNKING', 'BINARYMIME']
+            with SMTPSink(extensions=extensions) as sink:
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            with SMTPSink(extensions=extensions[:3]) as downgraded:
+                with SMTPSender(
+                        host=downgraded.host, port=downgraded.port
+                ) as sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            received = sink.messages[0]
+            expect(received.mail_options).to(contain('BODY=BINARYMIME'))
+            expect(received.data).to(contain(b'binary'))
+            received = downgraded.messages[0]
+            expect(received.mail_options).not_to(contain('BODY=BINARYMIME'))
+            expect(received.data).not_to(contain(b'binary'))
+            for message in (sink.messages[0], downgraded.messages[0]):
+                expect(Email.parse(message.data).body_parts['plain']).to(
+                    equal(text))
+
+    with context('with failures'):
+        with before.each:
+            from qreu.metrics import MetricsCollector
+            from qreu.retry import RetryPolicy
+            self.metrics = MetricsCollector()
+            self.retry = RetryPolicy(attempts=3, backoff=0, jitter=0)
+
+        with it('must not retry by default'):
+            from smtplib import SMTPDataError
+            with SMTPSink() as sink:
+                sink.fail('DATA', '451 Try again later')
+                with SMTPSender(host=sink.host, port=sink.port) as sender:
+                    expect(lambda: sender.send(self.mail)).to(
+                        raise_error(SMTPDataError))
+            expect(sink.messages).to(be_empty)
+
+        with it('must retry the transient failures'):
+            with SMTPSink() as sink:
+                sink.fail('DATA', '451 Try again later', times=2)
+                with SMTPSender(
+                        host=sink.host, port=sink.port, retry=self.retry
+                ) as sender:
+                    sender.add_hook(self.metrics)
+                    expect(sender.send(self.mail)).to(be_true)
+            expect(len(sink.messages)).to(equal(1))
+            expect(sink.connections).to(equal(1))
+            expect(self.metrics.counters['retries']).to(equal(2))
+
+        with it('must not retry the permanent failures'):
+            from smtplib import SMTPDataError
+            with SMTPSink() as sink:
+                sink.fail('DATA', '554 Rejected')
+                with SMTPSender(
+                        host=sink.host, port=sink.port, retry=self.retry
+                ) as sender:
+                    expect(lambda: sender.send(self.mail)).to(
+                        raise_error(SMTPDataError))
+
+        with it('must reconnect if the connection is lost'):
+            with SMTPSink() as sink:
+                sink.fail('MAIL', None)
+                with SMTPSender(
+                        host=sink.host, port=sink.port, retry=self.retry
+                ) as sender:
+                    sender.add_hook(self.metrics)
+                    expect(sender.send(self.mail)).to(be_true)
+                    expect(sender.send(self.mail)).to(be_true)
+            expect(len(sink.messages)).to(equal(2))
+            expect(sink.connections).to(equal(2))
+            expect(self.metrics.counters['reconnections']).to(equal(1))
+
+        with it('must fail over to the next host'):
+            import socket
+            dead = socket.socket()
+            dead.bind(('127.0.0.1', 0))
+            dead_port = dead.getsockname()[1]
+            dead.close()
+            from qreu.retry import HostPool
+            with SMTPSink() as sink:
+                pool = HostPool(
+                    [('127.0.0.1', dead_port), (sink.host, sink.port)],
+                    failure_threshold=1)
+                sender = SMTPSender(hosts=pool).add_hook(self.metrics)
+                with sender:
+                    expect(sender.send(self.mail)).to(be_true)
+                # The circuit of the dead host is open: not tried again
+                sender = SMTPSender(hosts=pool).add_hook(self.metrics)
+                with sender:
+                    expect(sender.send(self.mail)).to(be_true)
+            expect(len(sink.messages)).to(equal(2))
+            expect(self.metrics.counters['connection_failures']).to(equal(1))
+            expect(self.metrics.counters['connections_opened']).to(equal(2))
+
+        with it('must fail over if the host is busy'):
+            with SMTPSink() as busy:
+                with SMTPSink() as sink:
+                    busy.fail('CONNECT', '421 Too busy', times=10)
+                    hosts = [(busy.host, busy.port), (sink.host, sink.port)]
+                    with SMTPSender(hosts=hosts) as sender:
+                        expect(sender.send(self.mail)).to(be_true)
+            expect(busy.messages).to(be_empty)
+            expect(len(sink.messages)).to(equal(1))
+
+        with it('must render the message for the host it fails over to'):
+            self.mail = Email(**{
+                'from': 'me@example.com', 'to': ['a@example.com'],
+                'subject': 'Failover',
+            })
+            self.mail.add_body_text(u'Factura elèctrica', allow_8bit=True)
+            extensions = ['8BITMIME', 'SMTPUTF8', 'CHUNKING']
+            with SMTPSink(extensions=extensions) as rich:
+                with SMTPSink(extensions=[]) as plain:
+                    rich.fail('MAIL', None, times=10)
+                    rich.fail('BDAT', None, times=10)
+                    hosts = [(rich.host, rich.port), (plain.host, plain.port)]
+                    with SMTPSender(hosts=hosts, retry=self.retry) as sender:
+                        expect(sender.send(self.mail)).to(be_true)
+            expect(rich.messages).to(be_empty)
+            received = plain.messages[0]
+            expect(received.mail_options).not_to(contain('BODY=8BITMIME'))
+            expect(received.chunks).to(equal(0))
+            expect(received.data).not_to(contain(u'è'.encode('utf-8')))
+            expect(Email.parse(received.data).body_parts['plain']).to(
+                equal(u'Factura elèctrica'))
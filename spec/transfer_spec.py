@@ -0,0 +1,139 @@
+# coding=utf-8
+from email.mime.multipart import MIMEMultipart
+from email.mime.nonmultipart import MIMENonMultipart
+
+from six import PY2
+
+from qreu.transfer import (
+    choose_transfer_encoding, set_text_payload, has_8bit_parts,
+    downgrade_8bit, fix_eols
+)
+from expects import *
+
+
+def text_part(text, **kwargs):
+    part = MIMENonMultipart('text', 'plain')
+    set_text_payload(part, text, **kwargs)
+    return part
+
+
+with description('transfer module'):
+    with context('choosing a transfer encoding'):
+        with it('must use 7bit for ASCII text'):
+            expect(choose_transfer_encoding(b'Hello\nworld')).to(equal('7bit'))
+
+        with it('must use quoted-printable for mostly ASCII text'):
+            data = u'Factura elèctrica del mes de març'.encode('utf-8')
+            expect(choose_transfer_encoding(data)).to(
+                equal('quoted-printable'))
+
+        with it('must use base64 for mostly non ASCII text'):
+            data = u'電気料金のお知らせ'.encode('utf-8')
+            expect(choose_transfer_encoding(data)).to(equal('base64'))
+
+        with it('must use 8bit only if allowed'):
+            data = u'Factura elèctrica'.encode('utf-8')
+            expect(choose_transfer_encoding(data, allow_8bit=True)).to(
+                equal('8bit'))
+
+        with it('must not use 7bit nor 8bit with too long lines'):
+            data = b'a' * 1000
+            expect(choose_transfer_encoding(data, allow_8bit=True)).to(
+                equal('quoted-printable'))
+
+    with context('setting a text payload'):
+        with it('must encode the text with the chosen encoding'):
+            for text in [u'Hello', u'Factura elèctrica', u'電気料金のお知らせ',
+                         u'a' * 2000]:
+                part = text_part(text)
+                expect(part.get_all('Content-Transfer-Encoding')).to(
+                    have_len(1))
+                expect(part.get_payload(decode=True).decode('utf-8')).to(
+                    equal(text))
+                expect(part.get_content_charset()).to(equal('utf-8'))
+
+        with it('must use the given encoding'):
+            part = text_part(u'Hello', encoding='base64')
+            expect(part['Content-Transfer-Encoding']).to(equal('base64'))
+            expect(part.get_payload()).to(equal('SGVsbG8=\n'))
+
+        with it('must not write non ASCII text as 7bit'):
+            part = text_part(u'àé', encoding='7bit')
+            expect(part['Content-Transfer-Encoding']).to(
+                equal('quoted-printable'))
+
+        with it('must raise ValueError with an unknown encoding'):
+            expect(lambda: text_part(u'Hello', encoding='uuencode')).to(
+                raise_error(ValueError))
+
+    with context('downgrading 8bit parts'):
+        with it('must encode the 8bit parts in a copy'):
+            message = MIMEMultipart()
+            eight = text_part(u'Factura elèctrica', allow_8bit=True)
+            seven = text_part(u'Hello')
+            message.attach(eight)
+            message.attach(seven)
+            expect(has_8bit_parts(message)).to(be_true)
+
+            result = downgrade_8bit(message)
+            expect(has_8bit_parts(result)).to(be_false)
+            expect(has_8bit_parts(message)).to(be_true)
+            parts = result.get_payload()
+            expect(parts[0]['Content-Transfer-Encoding']).to(
+                equal('quoted-printable'))
+            expect(parts[0].get_payload(decode=True).decode('utf-8')).to(
+                equal(u'Factura elèctrica'))
+            expect(parts[1]).to(be(seven))
+
+        with it('must return the message without 8bit parts'):
+            message = text_part(u'Hello')
+            expect(downgrade_8bit(message)).to(be(message))
+
+        with it('must keep the text of parsed 8bit parts'):
+            from qreu import Email
+            raw = (
+                u'From: me@example.com\n'
+                u'Subject: 8bit\n'
+                u'MIME-Version: 1.0\n'
+                u'Content-Type: text/plain; charset="utf-8"\n'
+                u'Content-Transfer-Encoding: 8bit\n'
+                u'\n'
+                u'Preu: 10\u20ac, caf\xe8\n'
+            )
+            messages = [raw.encode('utf-8')]
+            if not PY2:
+                # Native strings can only hold 8bit text on Python 3
+                messages.append(raw)
+            for message in messages:
+                rendered = Email.parse(message).mime_string
+                expect(rendered).not_to(
+                    contain('Content-Transfer-Encoding: 8bit'))
+                expect(Email.parse(rendered).body_parts['plain']).to(
+                    equal(u'Preu: 10\u20ac, caf\xe8\n'))
+
+    with it('must fix the line endings'):
+        expect(fix_eols(b'a\nb\r\nc\rd')).to(equal(b'a\r\nb\r\nc\r\nd'))
+
+    with context('sending parts as they are'):
+        with it('must tell the SMTP BODY type of a message'):
+            from qreu.transfer import body_type
+            message = MIMEMultipart()
+            message.attach(text_part(u'Hello'))
+            expect(body_type(message)).to(equal('7BIT'))
+            message.attach(text_part(u'Factura elèctrica', allow_8bit=True))
+            expect(body_type(message)).to(equal('8BITMIME'))
+            message.attach(text_part(u'à' * 1000, allow_binary=True))
+            expect(message.get_payload()[-1]['Content-Transfer-Encoding']).to(
+                equal('binary'))
+            expect(body_type(message)).to(equal('BINARYMIME'))
+
+        with it('must render 8bit parts and UTF-8 headers as bytes'):
+            from qreu.transfer import as_bytes
+            message = text_part(u'Factura elèctrica', allow_8bit=True)
+            message['To'] = u'pérez@exàmple.com'
+            expect(as_bytes(message)).to(
+                contain(u'To: pérez@exàmple.com'.encode('utf-8')))
+            expect(as_bytes(message)).to(
+                contain(u'elèctrica'.encode('utf-8')))
+            expect(as_bytes(message, utf8_headers=False)).not_to(
+                contain(u'pérez'.encode('utf-8')))